@@ -0,0 +1,175 @@
+from collections import deque
+
+# --- SLO-Driven Adaptive Rate ---
+
+# In adaptive mode the open-loop rate is adjusted after every control window
+# so that the service level objective (p99 latency and error rate) stays
+# just satisfied. Each window is scored by its SLO usage: the larger of
+# p99 / target p99 and error rate / target error rate, so 1.0 means exactly
+# at the objective. A window with too few successes for a meaningful p99
+# (a target failing most requests) is scored by its error rate alone.
+# The rate then moves multiplicatively towards the usage setpoint
+# (slightly below 1.0):
+#
+#     rate *= 1 + clamp(gain * (setpoint - usage), -max_step_down, max_step_up)
+#
+# The step bounds keep the loop stable when usage jumps (a p99 that spikes
+# 10x only cuts the rate by max_step_down), and a larger bound downwards
+# than upwards backs off faster than it probes. Near the knee of the latency
+# curve a small rate change moves p99 a lot, so a fixed step would keep
+# overshooting: every time the step changes direction both bounds are
+# halved (down to min_step), and after three steps in the same direction
+# they double again, so the rate settles like a bisection yet still follows
+# a capacity that moves. The rate has converged when the last
+# `converge_windows` windows all met the objective and their target rates
+# are within `converge_tolerance` of each other; their mean achieved rate is
+# the sustainable throughput. Convergence is re-checked every window, so
+# long runs keep tracking capacity as it drifts.
+
+# Control windows kept for the summary (one hour of 5 second windows).
+ADAPTIVE_HISTORY = 720
+
+
+class RateScale:
+    """Multiplier of the scheduler's base rate (see scheduler.arrivals(rate_scale=...))."""
+
+    def __init__(self, value=1.0):
+        self.value = value
+
+
+def slo_usage(p99_ms, error_rate, target_p99_ms, max_error_rate):
+    """How much of the objective a window used: 1.0 is exactly at the limit (p99_ms None: errors only)."""
+    if p99_ms is None:
+        return error_rate / max_error_rate
+    return max(p99_ms / target_p99_ms, error_rate / max_error_rate)
+
+
+class AdaptiveRateController:
+    def __init__(self, start_rps, target_p99_ms, max_error_rate, setpoint=0.9, gain=0.5, max_step_up=0.1,
+                 max_step_down=0.3, min_step=0.005, min_rps=1.0, max_rps=0.0, converge_windows=6,
+                 converge_tolerance=0.05):
+        if target_p99_ms <= 0 or max_error_rate <= 0:
+            raise ValueError("The p99 and error rate objectives must be positive")
+        self.rps = start_rps
+        self.target_p99_ms = target_p99_ms
+        self.max_error_rate = max_error_rate
+        self.setpoint = setpoint
+        self.gain = gain
+        self.max_step_up = max_step_up
+        self.max_step_down = max_step_down
+        self.min_step = min_step
+        self.min_rps = min_rps
+        self.max_rps = max_rps
+        self.converge_windows = converge_windows
+        self.converge_tolerance = converge_tolerance
+        self.windows = deque(maxlen=ADAPTIVE_HISTORY)
+        self.sustainable_rps = None
+        self.converged_at = None
+        self.max_satisfied_rps = 0.0
+        # Fraction of the step bounds currently allowed, and the recent step directions.
+        self._step_scale = 1.0
+        self._direction = 0
+        self._same_direction = 0
+
+    def update(self, elapsed, seconds, requests, failures, p99_ms):
+        """
+        Scores a finished control window and returns the rate for the next
+        one. p99_ms is None when the window had too few successes for it.
+        """
+        error_rate = failures / requests if requests else 0.0
+        usage = slo_usage(p99_ms, error_rate, self.target_p99_ms, self.max_error_rate)
+        satisfied = usage <= 1.0
+        achieved = (requests - failures) / seconds if seconds > 0 else 0.0
+        self.windows.append({
+            "elapsed_s": round(elapsed, 1),
+            "target_rps": round(self.rps, 2),
+            "achieved_rps": round(achieved, 2),
+            "requests": requests,
+            "error_rate": round(error_rate, 5),
+            "tp99_ms": round(p99_ms, 2) if p99_ms is not None else None,
+            "slo_usage": round(usage, 3),
+            "satisfied": satisfied,
+        })
+        if satisfied:
+            self.max_satisfied_rps = max(self.max_satisfied_rps, achieved)
+        self._check_convergence(elapsed)
+
+        step = self._bounded_step(self.gain * (self.setpoint - usage))
+        self.rps = max(self.min_rps, self.rps * (1 + step))
+        if self.max_rps:
+            self.rps = min(self.max_rps, self.rps)
+        return self.rps
+
+    def _bounded_step(self, step):
+        direction = (step > 0) - (step < 0)
+        if direction and direction == -self._direction:
+            self._step_scale = max(self._step_scale / 2, self.min_step / self.max_step_up)
+            self._same_direction = 0
+        elif direction and direction == self._direction:
+            self._same_direction += 1
+            if self._same_direction >= 3:
+                self._step_scale = min(1.0, self._step_scale * 2)
+                self._same_direction = 0
+        if direction:
+            self._direction = direction
+        return min(self.max_step_up * self._step_scale, max(-self.max_step_down * self._step_scale, step))
+
+    def _check_convergence(self, elapsed):
+        if len(self.windows) < self.converge_windows:
+            return
+        recent = list(self.windows)[-self.converge_windows:]
+        if not all(window["satisfied"] for window in recent):
+            return
+        targets = [window["target_rps"] for window in recent]
+        if max(targets) - min(targets) > self.converge_tolerance * max(targets):
+            return
+        if self.sustainable_rps is None:
+            self.converged_at = round(elapsed, 1)
+        self.sustainable_rps = round(sum(window["achieved_rps"] for window in recent) / len(recent), 2)
+
+    def result(self):
+        return {
+            "target_p99_ms": self.target_p99_ms,
+            "max_error_rate": self.max_error_rate,
+            "converged": self.sustainable_rps is not None,
+            "converged_at_s": self.converged_at,
+            "sustainable_rps": self.sustainable_rps,
+            "max_satisfied_rps": round(self.max_satisfied_rps, 2),
+            "final_target_rps": round(self.rps, 2),
+            "windows": list(self.windows),
+        }
+
+
+def merge_adaptive_results(results):
+    """
+    Combines the controllers of several workers: rates add up, and the run
+    has converged only if every worker's controller has.
+    """
+    converged = all(result["converged"] for result in results)
+    return {
+        "target_p99_ms": results[0]["target_p99_ms"],
+        "max_error_rate": results[0]["max_error_rate"],
+        "converged": converged,
+        "converged_at_s": max(result["converged_at_s"] for result in results) if converged else None,
+        "sustainable_rps": round(sum(result["sustainable_rps"] for result in results), 2) if converged else None,
+        "max_satisfied_rps": round(sum(result["max_satisfied_rps"] for result in results), 2),
+        "final_target_rps": round(sum(result["final_target_rps"] for result in results), 2),
+        "workers": len(results),
+    }
+
+
+def print_adaptive_result(adaptive):
+    """Prints the control windows (when present) and the converged throughput."""
+    print(f"\n--- Adaptive Rate (p99 <= {adaptive['target_p99_ms']:g}ms, errors <= {adaptive['max_error_rate'] * 100:g}%) ---")
+    if adaptive.get("windows"):
+        print(f"{'Time s':>7} {'Target RPS':>11} {'Achieved':>10} {'Errors':>8} {'TP99 ms':>9} {'Usage':>6}")
+        for window in adaptive["windows"]:
+            tp99 = f"{window['tp99_ms']:>9.2f}" if window['tp99_ms'] is not None else f"{'-':>9}"
+            print(f"{window['elapsed_s']:>7g} {window['target_rps']:>11.2f} {window['achieved_rps']:>10.2f} "
+                  f"{window['error_rate'] * 100:>7.3f}% {tp99} {window['slo_usage']:>6.2f}"
+                  f"{'' if window['satisfied'] else '  over SLO'}")
+    if adaptive["converged"]:
+        print(f"Sustainable RPS: {adaptive['sustainable_rps']:.2f} (converged after {adaptive['converged_at_s']:g}s)")
+    else:
+        print(f"Did not converge; highest rate that met the SLO: {adaptive['max_satisfied_rps']:.2f} RPS, "
+              f"final target {adaptive['final_target_rps']:.2f} RPS")
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+
+import requests
+
+import load_test
+from request_templates import compile_configs
+from supervisor import Supervisor
+
+# --- Load Generator Agent ---
+
+# A long-lived agent runs on every load generator host. It registers its
+# capacity with the controller (ui/app.py), polls it for its desired state
+# and runs each plan it is given through a Supervisor: its share of the
+# target rate, split across its own worker processes and started at the
+# controller's common start time. Rate changes and stops are applied to the
+# running workers through the supervisor's shared rate scale. The workers
+# register with the controller's dashboard and stream telemetry like any
+# other load_test.py run; the merged result is reported on a heartbeat.
+
+POLL_INTERVAL = float(os.environ.get("AGENT_POLL_INTERVAL", "1.0"))
+# Heartbeats whose round trips are used for the clock offset estimate.
+CLOCK_SAMPLES = 30
+
+
+class Agent:
+    def __init__(self, controller_url, capacity_rps, workers, hostname):
+        self.controller_url = controller_url.rstrip("/")
+        self.capacity_rps = capacity_rps
+        self.workers = workers
+        self.hostname = hostname
+        self.agent_id = None
+        self.version = 0
+        self.run_id = None
+        self.supervisor = None
+        self.thread = None
+        self.result = None
+        self.result_reported = True
+        # (round trip, offset) of recent heartbeats; controller time = local time + offset.
+        self._clock = deque(maxlen=CLOCK_SAMPLES)
+        self._session = requests.Session()
+
+    @property
+    def clock_offset(self):
+        """Offset of the controller's clock from ours, from the heartbeat with the shortest round trip."""
+        return min(self._clock)[1] if self._clock else 0.0
+
+    def _post(self, path, payload):
+        sent = time.time()
+        response = self._session.post(f"{self.controller_url}{path}", json=payload, timeout=5)
+        received = time.time()
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        data = response.json()
+        # The server read its clock roughly halfway through the round trip.
+        self._clock.append((received - sent, data['server_time'] - (sent + received) / 2))
+        return data
+
+    def register(self):
+        data = self._post("/api/agents/register", {"hostname": self.hostname, "capacity_rps": self.capacity_rps,
+                                                   "workers": self.workers})
+        self.agent_id = data['agent_id']
+        self.version = 0
+        print(f"Registered with {self.controller_url} as {self.agent_id} "
+              f"({self.workers} workers, capacity {self.capacity_rps:g} RPS).", flush=True)
+
+    def status(self):
+        if self.thread is not None and self.thread.is_alive():
+            return "running"
+        return "finished" if self.result is not None else "idle"
+
+    def heartbeat(self):
+        """Reports the status (and a new result once); returns the desired state, or None if unregistered."""
+        payload = {"status": self.status(), "run_id": self.run_id}
+        if not self.result_reported:
+            payload["result"] = self.result
+        data = self._post(f"/api/agents/{self.agent_id}/heartbeat", payload)
+        if data is None:
+            return None
+        self.result_reported = True
+        return data['desired']
+
+    def apply(self, desired):
+        """Starts, re-rates or stops the local run to match the controller's desired state."""
+        if desired['version'] == self.version:
+            return
+        self.version = desired['version']
+        running = self.thread is not None and self.thread.is_alive()
+        if desired['action'] == 'run':
+            if running and desired['run_id'] == self.run_id:
+                print(f"Rate changed to {desired['rps']:g} RPS.", flush=True)
+                self.supervisor.set_rate(desired['rps'])
+            elif running:
+                print(f"Ignoring run {desired['run_id']}: run {self.run_id} is still in progress.", flush=True)
+            elif desired['run_id'] != self.run_id:
+                self.start(desired)
+        elif desired['action'] == 'stop' and running and desired['run_id'] == self.run_id:
+            print("Stopping the run early.", flush=True)
+            self.supervisor.stop()
+
+    def start(self, plan):
+        # Convert the controller's start time to our clock; a plan seen late
+        # keeps the common end time instead of running past the others.
+        start_at = plan['start_at'] - self.clock_offset
+        duration = plan['duration'] - max(0.0, time.time() - start_at)
+        if duration <= 0:
+            print(f"Skipping run {plan['run_id']}: it ended before this agent saw it.", flush=True)
+            return
+        try:
+            compile_configs(plan['config'])
+            load_test.validate_connection_policies(plan['config'])
+        except (KeyError, ValueError) as e:
+            print(f"Skipping run {plan['run_id']}: invalid request config: {e}", flush=True)
+            return
+        with tempfile.NamedTemporaryFile("w", suffix=".json", prefix="agent_config_", delete=False) as f:
+            json.dump(plan['config'], f)
+        self.run_id = plan['run_id']
+        self.result = None
+        self.supervisor = Supervisor(duration, f.name, plan['rps'], plan['workers'], start_at=max(start_at, time.time()))
+        print(f"Run {self.run_id}: {plan['rps']:g} RPS on {plan['workers']} workers for {duration:g}s, "
+              f"starting in {start_at - time.time():.2f}s (clock offset {self.clock_offset * 1000:+.1f}ms).", flush=True)
+        self.thread = threading.Thread(target=self._run, args=(self.supervisor, f.name), daemon=True)
+        self.thread.start()
+
+    def _run(self, supervisor, config_path):
+        try:
+            result = supervisor.run()
+            load_test.print_summary(result)
+        except Exception as e:
+            print(f"Run failed: {e}", flush=True)
+            result = {"error": str(e)}
+        finally:
+            os.remove(config_path)
+        self.result = result
+        self.result_reported = False
+
+    def serve_forever(self):
+        while True:
+            try:
+                if self.agent_id is None:
+                    self.register()
+                desired = self.heartbeat()
+                if desired is None:
+                    print("Controller does not know this agent (restarted?); registering again.", flush=True)
+                    self.agent_id = None
+                    continue
+                self.apply(desired)
+            except requests.exceptions.RequestException as e:
+                print(f"Controller unreachable: {e}", flush=True)
+            time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived load generator agent driven by the controller (ui/app.py).")
+    parser.add_argument("controller_url", help="controller/dashboard URL, e.g. http://controller:5000")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)")
+    parser.add_argument("--capacity-rps", type=float, default=0.0,
+                        help="highest rate this host sustains (e.g. from benchmark.py); 0 = split by worker count")
+    parser.add_argument("--name", default=socket.gethostname(), help="name shown by the controller")
+    args = parser.parse_args()
+
+    # Workers inherit the environment: they register with and report to the controller.
+    os.environ["SERVER_URL"] = args.controller_url.rstrip("/")
+    agent = Agent(args.controller_url, args.capacity_rps, args.workers, args.name)
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        if agent.thread is not None and agent.thread.is_alive():
+            print("\nStopping the run; workers drain and print their results.", flush=True)
+            agent.supervisor.stop()
+            agent.thread.join()
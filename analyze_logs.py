@@ -1,52 +1,241 @@
+import argparse
+import heapq
 import json
+import math
+import mmap
 import sys
 import os
 import glob
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 
-def calculate_percentile(latencies_list, percentile_value):
-    """Compute latency percentile from a list of latencies.
-    Assumes latencies_list contains values in milliseconds."""
-    if not latencies_list:
-        return 0.0 # Return float for consistency
-    sorted_latencies = sorted(latencies_list) # latencies are already in ms
-    index = int(len(sorted_latencies) * percentile_value) - 1
-    index = max(0, min(index, len(sorted_latencies) - 1))  # Ensure index is within bounds
-    return float(sorted_latencies[index]) # returns latency in ms
-
-def aggregate_logs(log_file_paths):
+from histogram import LatencyHistogram
+from labels import LabeledLatency, print_label_rows
+from phases import PhaseLatency, print_phase_rows
+from recordlog import read_records
+
+# Result files ending in this suffix are per-request record logs (RECORD_LOG);
+# anything else is read as a JSON summary (WRITE_LOGS).
+RECORD_LOG_SUFFIX = ".bin"
+# With --exact, successful latencies are sorted in runs of this many values,
+# each written to a temporary file as float32 and merged from there, so
+# memory stays bounded (~32 MB per worker while sorting a run) however long
+# the record logs are, and no latencies are sent between processes.
+EXACT_RUN_LENGTH = 1_000_000
+
+def load_latency_histogram(data):
+    """Returns the latency histogram stored in a log file's data.
+    Older logs stored a raw list of latencies (ms); those are converted."""
+    if "latency_histogram" in data:
+        return LatencyHistogram.from_dict(data["latency_histogram"])
+    return LatencyHistogram.from_values(data.get("latencies_ms", data.get("latencies", [])))
+
+def load_summary_file(file_path):
+    """Reads one JSON summary into a partial result (see load_result_file())."""
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+    return {
+        "successful_requests": data.get("successful_requests", 0),
+        "attempted_requests": data.get("total_attempted_requests", 0),
+        "actual_rps": data.get("actual_rps_instance", 0.0),
+        "latency": load_latency_histogram(data),
+        "labels": data.get("labels", []),
+        "phases": data.get("phases") or {},
+        "windows": {},
+        "sorted_runs": None,
+    }
+
+def write_sorted_run(values, run_dir):
+    """Sorts a run of latencies into a temporary float32 file; returns its path."""
+    with tempfile.NamedTemporaryFile(dir=run_dir, suffix=".run", delete=False) as f:
+        array('f', sorted(values)).tofile(f)
+        return f.name
+
+def load_record_file(file_path, windows=False, exact=False, run_dir=None):
     """
-    Aggregates data from multiple JSON log files.
+    Reads one per-request record log into a partial result. Per-second
+    windows are keyed by the Unix second of each request's intended send
+    time; with `exact` the successful latencies are also written to sorted
+    run files in `run_dir` (see EXACT_RUN_LENGTH).
+    """
+    latency = LatencyHistogram()
+    latencies = array('f') if exact else None
+    sorted_runs = [] if exact else None
+    window_counts = {}
+    attempted = successful = 0
+    first_time = last_time = None
+    for intended_time, _, latency_ms, _, status, _, _ in read_records(file_path):
+        attempted += 1
+        success = 200 <= status < 300
+        if success:
+            successful += 1
+            latency.record(latency_ms)
+            if exact:
+                latencies.append(latency_ms)
+                if len(latencies) >= EXACT_RUN_LENGTH:
+                    sorted_runs.append(write_sorted_run(latencies, run_dir))
+                    latencies = array('f')
+        if first_time is None or intended_time < first_time:
+            first_time = intended_time
+        if last_time is None or intended_time > last_time:
+            last_time = intended_time
+        if windows:
+            second = int(intended_time)
+            window = window_counts.get(second)
+            if window is None:
+                window = window_counts[second] = [0, 0, LatencyHistogram()]
+            window[0] += 1
+            if success:
+                window[1] += 1
+                window[2].record(latency_ms)
+    if exact and latencies:
+        sorted_runs.append(write_sorted_run(latencies, run_dir))
+    span = last_time - first_time if attempted > 1 else 0.0
+    return {
+        "successful_requests": successful,
+        "attempted_requests": attempted,
+        "actual_rps": successful / span if span > 0 else 0.0,
+        "latency": latency,
+        "labels": [],
+        "phases": {},
+        # Window histograms travel back to the parent in their sparse form.
+        "windows": {second: (total, success, histogram.to_dict())
+                    for second, (total, success, histogram) in window_counts.items()},
+        "sorted_runs": sorted_runs,
+    }
+
+def load_result_file(task):
+    """
+    Worker-process entry point: parses one result file.
+    Returns (file_path, partial_result, error_message).
+    """
+    file_path, windows, exact, run_dir = task
+    try:
+        if file_path.endswith(RECORD_LOG_SUFFIX):
+            return file_path, load_record_file(file_path, windows, exact, run_dir), None
+        return file_path, load_summary_file(file_path), None
+    except FileNotFoundError:
+        return file_path, None, f"Error: Log file not found: {file_path}"
+    except json.JSONDecodeError:
+        return file_path, None, f"Error: Could not decode JSON from file: {file_path}"
+    except Exception as e:
+        return file_path, None, f"An unexpected error occurred while processing {file_path}: {e}"
+
+def exact_percentiles(sorted_arrays, fractions):
+    """
+    Exact percentiles over several individually sorted arrays, computed by a
+    streaming k-way merge: only one value per array is held at a time.
+    """
+    total = sum(len(values) for values in sorted_arrays)
+    if not total:
+        return [0.0 for _ in fractions]
+    targets = sorted((max(1, math.ceil(q * total)), i) for i, q in enumerate(fractions))
+    results = [0.0] * len(fractions)
+    position = 0
+    rank = 0
+    for rank, value in enumerate(heapq.merge(*sorted_arrays), 1):
+        while position < len(targets) and targets[position][0] == rank:
+            results[targets[position][1]] = value
+            position += 1
+        if position == len(targets):
+            break
+    return results
+
+def merged_run_percentiles(run_paths, fractions):
+    """Exact percentiles over sorted run files, memory-mapped so they are read, not loaded."""
+    files = [open(path, 'rb') for path in run_paths]
+    maps = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) for f in files]
+    views = [memoryview(data).cast('f') for data in maps]
+    try:
+        return exact_percentiles(views, fractions)
+    finally:
+        for view, data, f in zip(views, maps, files):
+            view.release()
+            data.close()
+            f.close()
+
+def window_rows(windows):
+    """Per-second rows (offset from the first second, counts and percentiles)."""
+    rows = []
+    if not windows:
+        return rows
+    first = min(windows)
+    for second in sorted(windows):
+        total, success, histogram = windows[second]
+        tp50, tp99 = histogram.percentiles([0.50, 0.99])
+        rows.append({
+            "second": second - first,
+            "total": total,
+            "success": success,
+            "failure": total - success,
+            "tp50_ms": round(tp50, 2),
+            "tp99_ms": round(tp99, 2),
+        })
+    return rows
+
+def aggregate_logs(log_file_paths, jobs=None, windows=False, exact=False):
+    """
+    Aggregates data from multiple result files (JSON summaries and/or
+    per-request record logs), parsing them in parallel worker processes.
 
     Args:
-        log_file_paths (list): A list of paths to the JSON log files.
+        log_file_paths (list): A list of paths to the result files.
+        jobs (int): Worker processes (default: one per core, at most one per file).
+        windows (bool): Also compute per-second windows from record logs.
+        exact (bool): Compute exact percentiles from record logs.
 
     Returns:
         dict: Aggregated results or None if errors occur.
     """
+    if not exact:
+        return _aggregate_logs(log_file_paths, jobs, windows, None)
+    # Sorted latency runs are spilled here and removed once merged.
+    with tempfile.TemporaryDirectory(prefix="analyze_logs_") as run_dir:
+        return _aggregate_logs(log_file_paths, jobs, windows, run_dir)
+
+def _aggregate_logs(log_file_paths, jobs, windows, run_dir):
+    exact = run_dir is not None
     total_successful_requests = 0
     total_attempted_requests = 0
-    all_latencies = []
+    combined_latency = LatencyHistogram()
+    combined_labels = LabeledLatency()
+    combined_phases = PhaseLatency()
+    combined_windows = {}
+    sorted_runs = []
+    record_logs = 0
     sum_of_individual_actual_rps = 0.0
 
-    for file_path in log_file_paths:
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                total_successful_requests += data.get("successful_requests", 0)
-                total_attempted_requests += data.get("total_attempted_requests", 0)
-                all_latencies.extend(data.get("latencies", []))
-                sum_of_individual_actual_rps += data.get("actual_rps_instance", 0.0)
-        except FileNotFoundError:
-            print(f"Error: Log file not found: {file_path}", file=sys.stderr)
-            return None
-        except json.JSONDecodeError:
-            print(f"Error: Could not decode JSON from file: {file_path}", file=sys.stderr)
-            return None
-        except Exception as e:
-            print(f"An unexpected error occurred while processing {file_path}: {e}", file=sys.stderr)
+    tasks = [(file_path, windows, exact, run_dir) for file_path in log_file_paths]
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(load_result_file, tasks))
+    else:
+        results = [load_result_file(task) for task in tasks]
+
+    for file_path, partial, error in results:
+        if error:
+            print(error, file=sys.stderr)
             return None
+        total_successful_requests += partial["successful_requests"]
+        total_attempted_requests += partial["attempted_requests"]
+        combined_latency.merge(partial["latency"])
+        combined_labels.merge_list(partial["labels"])
+        combined_phases.merge_dict(partial["phases"])
+        sum_of_individual_actual_rps += partial["actual_rps"]
+        for second, (total, success, histogram) in partial["windows"].items():
+            window = combined_windows.get(second)
+            if window is None:
+                window = combined_windows[second] = [0, 0, LatencyHistogram()]
+            window[0] += total
+            window[1] += success
+            window[2].merge(LatencyHistogram.from_dict(histogram))
+        if partial["sorted_runs"] is not None:
+            sorted_runs.extend(partial["sorted_runs"])
+            record_logs += 1
 
-    if not all_latencies:
+    if not combined_latency.count:
         print("No latency data found in the provided log files.", file=sys.stderr)
         # Still return totals if they exist, even if latencies are empty
         return {
@@ -54,42 +243,89 @@ def aggregate_logs(log_file_paths):
             "total_attempted_requests": total_attempted_requests,
             "final_rps_sum_of_instances": float(f"{sum_of_individual_actual_rps:.2f}"),
             "combined_latencies_count": 0,
+            "percentile_source": "histogram",
             "tp50": 0,
             "tp90": 0,
             "tp95": 0,
             "tp99": 0,
+            "labels": combined_labels.rows(),
+            "phases": combined_phases.rows(),
+            "windows": window_rows(combined_windows),
         }
 
-    tp50 = calculate_percentile(all_latencies, 0.50)
-    tp90 = calculate_percentile(all_latencies, 0.90)
-    tp95 = calculate_percentile(all_latencies, 0.95)
-    tp99 = calculate_percentile(all_latencies, 0.99)
+    # Exact percentiles are only possible when every file is a record log.
+    if exact and record_logs == len(log_file_paths):
+        tp50, tp90, tp95, tp99 = merged_run_percentiles(sorted_runs, [0.50, 0.90, 0.95, 0.99])
+        percentile_source = "exact"
+    else:
+        tp50, tp90, tp95, tp99 = combined_latency.percentiles([0.50, 0.90, 0.95, 0.99])
+        percentile_source = "histogram"
 
     return {
         "total_successful_requests": total_successful_requests,
         "total_attempted_requests": total_attempted_requests,
         "final_rps_sum_of_instances": float(f"{sum_of_individual_actual_rps:.2f}"),
-        "combined_latencies_count": len(all_latencies),
+        "combined_latencies_count": combined_latency.count,
+        "percentile_source": percentile_source,
         "tp50": tp50,
         "tp90": tp90,
         "tp95": tp95,
         "tp99": tp99,
+        "labels": combined_labels.rows(),
+        "phases": combined_phases.rows(),
+        "windows": window_rows(combined_windows),
     }
 
+# Metrics compared between runs, and whether a higher value is an improvement.
+COMPARED_METRICS = (
+    ("total_attempted_requests", "Attempted Requests", True),
+    ("total_successful_requests", "Successful Requests", True),
+    ("final_rps_sum_of_instances", "RPS", True),
+    ("tp50", "TP50 (ms)", False),
+    ("tp90", "TP90 (ms)", False),
+    ("tp95", "TP95 (ms)", False),
+    ("tp99", "TP99 (ms)", False),
+)
+
+def print_comparison(baseline, current):
+    """Prints a baseline vs. current table with the relative change of each metric."""
+    print("\n=== Run Comparison (baseline -> current) ===")
+    print(f"{'Metric':<20} {'Baseline':>12} {'Current':>12} {'Change':>16}")
+    for key, title, higher_is_better in COMPARED_METRICS:
+        before, after = baseline[key], current[key]
+        if before:
+            change = (after - before) / before * 100
+            verdict = "" if abs(change) < 1 else (" better" if (change > 0) == higher_is_better else " worse")
+            change_text = f"{change:+.1f}%{verdict}"
+        else:
+            change_text = "-"
+        print(f"{title:<20} {before:>12.2f} {after:>12.2f} {change_text:>16}")
+    print("===================================")
+
+def print_window_rows(rows):
+    """Prints the per-second table from window_rows()."""
+    print(f"{'Second':>6} {'Total':>8} {'Success':>8} {'Failure':>8} {'TP50 ms':>9} {'TP99 ms':>9}")
+    for row in rows:
+        print(f"{row['second']:>6} {row['total']:>8} {row['success']:>8} {row['failure']:>8} "
+              f"{row['tp50_ms']:>9.2f} {row['tp99_ms']:>9.2f}")
+
 if __name__ == "__main__":
-    log_files = []
-    if len(sys.argv) > 1:
-        # If log files are provided as arguments, use them
-        log_files = sys.argv[1:]
-    else:
-        # Otherwise, find all log_*.json files in the current directory
-        log_files = glob.glob("log_*.json")
+    parser = argparse.ArgumentParser(description="Aggregates load test result files (log_*.json summaries or RECORD_LOG .bin files).")
+    parser.add_argument("log_files", nargs="*", help="result files (default: log_*.json in the current directory)")
+    parser.add_argument("--baseline", nargs="+", metavar="FILE", help="result files of an earlier run to compare against")
+    parser.add_argument("--windows", action="store_true", help="print per-second windows (record logs only)")
+    parser.add_argument("--exact", action="store_true", help="exact percentiles by k-way merge (record logs only)")
+    parser.add_argument("--jobs", type=int, default=None, help="parser processes (default: one per core)")
+    args = parser.parse_args()
+
+    # If no log files are provided, find all log_*.json files in the current directory
+    log_files = args.log_files or glob.glob("log_*.json")
 
     if not log_files:
         print("No log files found or provided to analyze.", file=sys.stderr)
         sys.exit(1)
 
-    aggregated_data = aggregate_logs(log_files)
+    aggregated_data = aggregate_logs(log_files, args.jobs, args.windows, args.exact)
 
     if aggregated_data:
         print("\n=== Aggregated Load Test Analysis ===")
@@ -100,10 +336,26 @@ if __name__ == "__main__":
         print(f"Total Latencies Recorded: {aggregated_data['combined_latencies_count']}")
         if aggregated_data['combined_latencies_count'] > 0:
             # Values are already in ms, format to 2 decimal places
+            print(f"Percentiles: {aggregated_data['percentile_source']}")
             print(f"Overall TP50 Latency: {aggregated_data['tp50']:.2f}ms")
             print(f"Overall TP90 Latency: {aggregated_data['tp90']:.2f}ms")
             print(f"Overall TP95 Latency: {aggregated_data['tp95']:.2f}ms")
             print(f"Overall TP99 Latency: {aggregated_data['tp99']:.2f}ms")
         else:
             print("No latency data to calculate percentiles.")
+        if aggregated_data['labels']:
+            print("\nPer endpoint / outcome:")
+            print_label_rows(aggregated_data['labels'])
+        if any(row['count'] for row in aggregated_data['phases']):
+            print("\nRequest phases:")
+            print_phase_rows(aggregated_data['phases'])
+        if aggregated_data['windows']:
+            print("\nPer second:")
+            print_window_rows(aggregated_data['windows'])
         print("===================================")
+
+        if args.baseline:
+            baseline_data = aggregate_logs(args.baseline, args.jobs, exact=args.exact)
+            if baseline_data is None:
+                sys.exit(1)
+            print_comparison(baseline_data, aggregated_data)
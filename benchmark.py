@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from histogram import LatencyHistogram
+from recordlog import read_records
+from stub_server import LATENCY_DISTRIBUTIONS, latency_sampler
+
+# --- Generator Self-Benchmark ---
+
+# Drives the real load_test.py pipeline against a local stub_server.py at
+# increasing rates, fully offline, and reports for every rate how much of
+# the target the generator achieved, how late it sent requests (scheduling
+# error, from the per-request record log), its CPU and memory use, and how
+# much latency it added on top of the latency the stub injected.
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RATES = "500,1000,2000,4000,8000"
+# A rate counts as sustained when at least this fraction of it was achieved.
+DEFAULT_MIN_RATIO = 0.95
+# Draws used to estimate the injected latency percentiles.
+INJECTED_SAMPLES = 200000
+
+
+def start_stub(args):
+    """Starts the stub server on a free port; returns (process, port)."""
+    command = [sys.executable, os.path.join(ROOT_DIR, "stub_server.py"), "--port", "0",
+               "--latency-ms", str(args.latency_ms), "--distribution", args.distribution,
+               "--error-rate", str(args.error_rate)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError("Stub server did not start")
+    return process, int(line.rsplit(":", 1)[1])
+
+
+def write_config(directory, port):
+    """Benchmark request config: one POST with a templated body over an unlimited keep-alive pool."""
+    path = os.path.join(directory, "benchmark_config.json")
+    with open(path, "w") as f:
+        json.dump([{
+            "url": f"http://127.0.0.1:{port}/benchmark",
+            "method": "POST",
+            "headers": {"x-request-id": "{{request_id}}"},
+            "body": {"seq": "{{seq}}"},
+            "connection": {"keep_alive": True, "pool_size": 0},
+        }], f)
+    return path
+
+
+def injected_percentiles(args):
+    """TP50/TP99 of the stub's latency distribution, estimated by sampling it."""
+    sample = latency_sampler(args.distribution, args.latency_ms)
+    histogram = LatencyHistogram.from_values(sample() for _ in range(INJECTED_SAMPLES))
+    return histogram.percentiles([0.50, 0.99])
+
+
+def run_rate(rps, config_path, directory, duration, engine):
+    """Runs one load_test.py process at `rps`; returns (summary, record log path, rusage, wall seconds)."""
+    log_path = os.path.join(directory, f"benchmark_{rps}.json")
+    record_path = os.path.join(directory, f"benchmark_{rps}.bin")
+    env = dict(os.environ, SERVER_URL="", WRITE_LOGS="true", RECORD_LOG=record_path, LOAD_MODE="open", ENGINE=engine)
+    command = [sys.executable, os.path.join(ROOT_DIR, "load_test.py"), str(duration), log_path, config_path, str(rps)]
+    started = time.time()
+    process = subprocess.Popen(command, env=env, cwd=ROOT_DIR, stdout=subprocess.DEVNULL)
+    # wait4 returns the resource usage of this one child.
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.time() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"load_test.py exited with code {process.returncode} at {rps} RPS")
+    with open(log_path) as f:
+        return json.load(f), record_path, usage, wall
+
+
+def scheduling_error(record_path):
+    """Histogram of how late each request was sent relative to its intended time (ms)."""
+    lateness = LatencyHistogram()
+    for intended_time, sent_time, *_ in read_records(record_path):
+        lateness.record(max(0.0, sent_time - intended_time) * 1000)
+    return lateness
+
+
+def benchmark(args):
+    rates = [int(rate) for rate in args.rates.split(",")]
+    injected_p50, injected_p99 = injected_percentiles(args)
+    stub, port = start_stub(args)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            config_path = write_config(directory, port)
+            for rps in rates:
+                summary, record_path, usage, wall = run_rate(rps, config_path, directory, args.duration, args.engine)
+                lateness = scheduling_error(record_path)
+                duration = summary["actual_duration_instance"]
+                attempted = summary["total_attempted_requests"]
+                achieved = attempted / duration if duration > 0 else 0.0
+                late_p50, late_p99 = lateness.percentiles([0.50, 0.99])
+                cpu_seconds = usage.ru_utime + usage.ru_stime
+                results.append({
+                    "target_rps": rps,
+                    "achieved_rps": round(achieved, 2),
+                    "achieved_ratio": round(achieved / rps, 4),
+                    "sustained": achieved / rps >= args.min_ratio,
+                    "error_rate": round(summary["failed_requests"] / attempted, 4) if attempted else 0.0,
+                    "injected_error_rate": args.error_rate,
+                    "schedule_lag_p50_ms": round(late_p50, 3),
+                    "schedule_lag_p99_ms": round(late_p99, 3),
+                    "schedule_lag_max_ms": round(lateness.max if lateness.count else 0.0, 3),
+                    # CPU over the whole process lifetime, including start-up.
+                    "cpu_percent": round(cpu_seconds / wall * 100, 1),
+                    "cpu_us_per_request": round(cpu_seconds / attempted * 1e6, 1) if attempted else 0.0,
+                    # ru_maxrss is in KiB on Linux.
+                    "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+                    "tp50_ms": summary["tp50_ms"],
+                    "tp99_ms": summary["tp99_ms"],
+                    "injected_tp50_ms": round(injected_p50, 2),
+                    "injected_tp99_ms": round(injected_p99, 2),
+                    "added_tp50_ms": round(summary["tp50_ms"] - injected_p50, 2),
+                    "added_tp99_ms": round(summary["tp99_ms"] - injected_p99, 2),
+                })
+                print_result(results[-1])
+    finally:
+        stub.terminate()
+        stub.wait(5)
+
+    sustained = [result["target_rps"] for result in results if result["sustained"]]
+    return {
+        "engine": args.engine,
+        "latency_ms": args.latency_ms,
+        "distribution": args.distribution,
+        "error_rate": args.error_rate,
+        "duration": args.duration,
+        "min_ratio": args.min_ratio,
+        "cpu_count": os.cpu_count(),
+        "max_sustained_rps": max(sustained) if sustained else 0,
+        "rates": results,
+    }
+
+
+def print_header():
+    print(f"{'Target':>7} {'Achieved':>9} {'Errors':>7} {'Lag p50':>8} {'Lag p99':>8} {'CPU %':>6} "
+          f"{'us/req':>7} {'RSS MB':>7} {'TP50':>7} {'TP99':>7} {'+TP50':>7} {'+TP99':>7}")
+
+
+def print_result(result):
+    print(f"{result['target_rps']:>7} {result['achieved_rps']:>9.1f} {result['error_rate'] * 100:>6.2f}% "
+          f"{result['schedule_lag_p50_ms']:>8.2f} {result['schedule_lag_p99_ms']:>8.2f} {result['cpu_percent']:>6.1f} "
+          f"{result['cpu_us_per_request']:>7.1f} {result['max_rss_mb']:>7.1f} {result['tp50_ms']:>7.2f} "
+          f"{result['tp99_ms']:>7.2f} {result['added_tp50_ms']:>7.2f} {result['added_tp99_ms']:>7.2f}"
+          f"{'' if result['sustained'] else '  (not sustained)'}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks load_test.py against a local stub server.")
+    parser.add_argument("--rates", default=DEFAULT_RATES, help="comma-separated target rates (RPS)")
+    parser.add_argument("--duration", type=int, default=10, help="seconds per rate")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="mean latency injected by the stub")
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub responses that are 503")
+    parser.add_argument("--engine", choices=("aiohttp", "fast"), default="aiohttp", help="load_test.py ENGINE")
+    parser.add_argument("--min-ratio", type=float, default=DEFAULT_MIN_RATIO,
+                        help="achieved/target ratio for a rate to count as sustained")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--expect-rps", type=float, default=None,
+                        help="exit with status 1 if the highest sustained rate is below this (regression check)")
+    args = parser.parse_args()
+
+    print(f"Benchmarking load_test.py ({args.engine} engine): stub latency {args.latency_ms:g}ms ({args.distribution}), "
+          f"error rate {args.error_rate:g}, {args.duration}s per rate. Latencies in ms.", flush=True)
+    print_header()
+    report = benchmark(args)
+    print(f"Highest sustained rate: {report['max_sustained_rps']} RPS "
+          f"(achieved >= {args.min_ratio:.0%} of target)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Results written to {args.output}")
+    if args.expect_rps is not None and report["max_sustained_rps"] < args.expect_rps:
+        print(f"Regression: expected at least {args.expect_rps:g} sustained RPS.", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,164 @@
+import asyncio
+
+import aiohttp
+
+from fastclient import FastClient
+from phases import add_phase_hooks
+
+# --- Connection Policies ---
+
+# Counters maintained by ConnectionManager.
+CONNECTION_STATS = ('connections_opened', 'connections_reused', 'connections_queued')
+
+# HTTP client engines:
+#   "aiohttp" - aiohttp.ClientSession for every request
+#   "fast"    - the lean protocol-based client in fastclient.py, falling back
+#               to aiohttp for requests it does not support
+ENGINES = ("aiohttp", "fast")
+
+# Defaults for the optional "connection" object of a config entry:
+#   keep_alive          reuse connections (False opens a new one per request)
+#   pool_size           max open connections for the policy (0 = unlimited)
+#   pool_size_per_host  max open connections per host (0 = unlimited)
+#   keepalive_timeout   seconds an idle keep-alive connection is kept
+#   dns_cache_ttl       seconds resolved addresses are cached (0 disables the cache)
+#   warmup_connections  connections opened before the measured phase
+# aiohttp never pipelines requests on a connection, so concurrency per
+# connection is always one; pool_size_per_host is the knob that limits how
+# many requests are in flight to a host at once.
+DEFAULT_POLICY = {
+    "keep_alive": True,
+    "pool_size": 100,
+    "pool_size_per_host": 0,
+    "keepalive_timeout": 15.0,
+    "dns_cache_ttl": 10,
+    "warmup_connections": 0,
+}
+
+
+def connection_policy(config):
+    """Returns the full connection policy for a config entry."""
+    policy = dict(DEFAULT_POLICY)
+    overrides = config.get("connection", {})
+    if not isinstance(overrides, dict):
+        raise ValueError("The connection options must be an object")
+    unknown = set(overrides) - set(DEFAULT_POLICY)
+    if unknown:
+        raise ValueError(f"Unknown connection options: {', '.join(sorted(unknown))}")
+    policy.update(overrides)
+    return policy
+
+
+def make_connector(policy):
+    """Builds an aiohttp connector implementing a connection policy."""
+    dns_cache_ttl = policy["dns_cache_ttl"]
+    options = {
+        "limit": policy["pool_size"],
+        "limit_per_host": policy["pool_size_per_host"],
+        "use_dns_cache": dns_cache_ttl != 0,
+        "ttl_dns_cache": dns_cache_ttl or None,
+    }
+    if policy["keep_alive"]:
+        options["keepalive_timeout"] = policy["keepalive_timeout"]
+    else:
+        options["force_close"] = True
+    return aiohttp.TCPConnector(**options)
+
+
+class ConnectionManager:
+    """
+    Owns one aiohttp session per distinct connection policy found in the
+    configs and counts how many connections were opened vs. reused (and how
+    often a request had to wait for a free pool slot) in the `stats` dict.
+    With phase_timing=True the sessions also carry the phase timing hooks
+    (see phases.py). With engine="fast", session_for() returns a
+    FastClient with the same request() interface, backed by the aiohttp
+    session for anything it does not handle.
+    """
+
+    def __init__(self, configs, stats, phase_timing=False, engine="aiohttp"):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine} (expected one of {', '.join(ENGINES)})")
+        self.engine = engine
+        self.stats = stats
+        for key in CONNECTION_STATS:
+            self.stats[key] = 0
+        self._trace_config = aiohttp.TraceConfig()
+        self._trace_config.on_connection_create_end.append(self._on_create)
+        self._trace_config.on_connection_reuseconn.append(self._on_reuse)
+        self._trace_config.on_connection_queued_start.append(self._on_queued)
+        if phase_timing:
+            add_phase_hooks(self._trace_config)
+        self._policies = []
+        self._sessions = []
+        # Session index per config entry, in config order.
+        self._config_sessions = []
+        for config in configs:
+            policy = connection_policy(config)
+            if policy not in self._policies:
+                self._policies.append(policy)
+                self._sessions.append(None)
+            self._config_sessions.append(self._policies.index(policy))
+
+    async def _on_create(self, session, context, params):
+        self.stats['connections_opened'] += 1
+
+    async def _on_reuse(self, session, context, params):
+        self.stats['connections_reused'] += 1
+
+    async def _on_queued(self, session, context, params):
+        self.stats['connections_queued'] += 1
+
+    async def __aenter__(self):
+        self._clients = []
+        for index, policy in enumerate(self._policies):
+            self._sessions[index] = aiohttp.ClientSession(
+                connector=make_connector(policy), trace_configs=[self._trace_config],
+            )
+            if self.engine == "fast":
+                self._clients.append(FastClient(policy, self.stats, fallback=self._sessions[index]))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for client in self._clients:
+            await client.close()
+        for session in self._sessions:
+            if session is not None:
+                await session.close()
+
+    def session_for(self, config_index):
+        """Returns the session (or fast client) to use for CONFIGS[config_index]."""
+        if self._clients:
+            return self._clients[self._config_sessions[config_index]]
+        return self._sessions[self._config_sessions[config_index]]
+
+    async def warm_up(self, templates, construct_request):
+        """
+        Opens each keep-alive policy's warmup_connections before the measured
+        phase by sending that many concurrent requests with the first request
+        template using the policy. Responses are discarded and the counters reset.
+        """
+        warmups = []
+        for config_index, template in enumerate(templates):
+            session_index = self._config_sessions[config_index]
+            policy = self._policies[session_index]
+            if policy["keep_alive"] and policy["warmup_connections"] and \
+                    self._config_sessions.index(session_index) == config_index:
+                session = self.session_for(config_index)
+                warmups.extend(self._warm_request(session, template, construct_request)
+                               for _ in range(policy["warmup_connections"]))
+        if warmups:
+            results = await asyncio.gather(*warmups)
+            print(f"Warm-up: {sum(results)}/{len(results)} connections established.", flush=True)
+        for key in CONNECTION_STATS:
+            self.stats[key] = 0
+
+    @staticmethod
+    async def _warm_request(session, template, construct_request):
+        try:
+            # Warm-up requests use sequence number -1 so they stand out in target logs.
+            async with construct_request(session, template, -1) as response:
+                await response.read()
+            return 1
+        except Exception:
+            return 0
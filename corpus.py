@@ -0,0 +1,186 @@
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+from request_templates import RequestTemplate
+
+# --- Request Corpus ---
+
+# A corpus is a JSONL file with one request per line. Each line is a config
+# entry (url, headers, body, method, ...); fields it leaves out are taken
+# from the first entry of the config file, so a corpus may hold only bodies.
+#
+# Next to the corpus an offset index "<corpus>.idx" is kept: a header
+# followed by one native-endian uint64 per request giving the byte offset of
+# its line. Both files are memory-mapped, so a corpus with millions of
+# entries is never loaded into RAM and any entry can be read in O(1).
+
+CORPUS_ORDERS = ("sequential", "shuffle")
+
+INDEX_MAGIC = b"LTIDX001"
+# magic, corpus size in bytes, corpus mtime (ns), number of entries
+INDEX_HEADER = struct.Struct("<8sQQQ")
+
+
+def index_path(corpus_path):
+    return corpus_path + ".idx"
+
+
+def _source_stamp(corpus_path):
+    stat = os.stat(corpus_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_index(corpus_path):
+    """
+    Scans the corpus once and writes its offset index. Returns the entry
+    count. Every line is parsed on the way, so a malformed line raises
+    ValueError here (and no index is written) instead of in the middle of
+    a run.
+    """
+    size, mtime_ns = _source_stamp(corpus_path)
+    offsets = array('Q')
+    bad_lines = []
+    if size:
+        with open(corpus_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            line_number = 0
+            while position < size:
+                line_number += 1
+                end = data.find(b"\n", position)
+                if end == -1:
+                    end = size
+                line = data[position:end]
+                if line.strip():
+                    try:
+                        valid = isinstance(json.loads(line), dict)
+                    except ValueError:
+                        valid = False
+                    if valid:
+                        offsets.append(position)
+                    else:
+                        bad_lines.append(line_number)
+                position = end + 1
+    if bad_lines:
+        more = f" (and {len(bad_lines) - 1} more)" if len(bad_lines) > 1 else ""
+        raise ValueError(f"Corpus file {corpus_path}: line {bad_lines[0]} is not a JSON object{more}")
+
+    # Write to a temporary file first so concurrent readers never see a partial index.
+    temporary_path = f"{index_path(corpus_path)}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, size, mtime_ns, len(offsets)))
+        offsets.tofile(f)
+    os.replace(temporary_path, index_path(corpus_path))
+    return len(offsets)
+
+
+def ensure_index(corpus_path):
+    """Builds the offset index unless an up-to-date one already exists."""
+    try:
+        with open(index_path(corpus_path), 'rb') as f:
+            magic, size, mtime_ns, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic == INDEX_MAGIC and (size, mtime_ns) == _source_stamp(corpus_path):
+            return count
+    except (OSError, struct.error):
+        pass
+    return build_index(corpus_path)
+
+
+def check_corpus(corpus_path):
+    """
+    Raises ValueError unless the corpus exists and holds at least one
+    request (an empty file cannot be memory-mapped). Returns the entry count.
+    """
+    if not os.path.isfile(corpus_path):
+        raise ValueError(f"Corpus file not found: {corpus_path}")
+    count = ensure_index(corpus_path)
+    if not count:
+        raise ValueError(f"Corpus file {corpus_path} holds no requests")
+    return count
+
+
+class Corpus:
+    """Memory-mapped, indexed view of a JSONL request corpus."""
+
+    def __init__(self, corpus_path, base_config=None):
+        check_corpus(corpus_path)
+        self.path = corpus_path
+        self.base_config = base_config or {}
+        self._data_file = open(corpus_path, 'rb')
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index_file = open(index_path(corpus_path), 'rb')
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = INDEX_HEADER.unpack_from(self._index)[3]
+        self._offsets = memoryview(self._index)[INDEX_HEADER.size:].cast('Q')
+        self._size = len(self._data)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._offsets.release()
+        self._index.close()
+        self._index_file.close()
+        self._data.close()
+        self._data_file.close()
+
+    def line(self, index):
+        """Raw bytes of entry `index` (without the newline)."""
+        start = self._offsets[index]
+        end = self._data.find(b"\n", start)
+        return self._data[start:end if end != -1 else self._size]
+
+    def entry(self, index):
+        """Entry `index` merged over the base config."""
+        entry = json.loads(self.line(index))
+        config = dict(self.base_config)
+        config.update(entry)
+        if "headers" in entry and "headers" in self.base_config:
+            config["headers"] = dict(self.base_config["headers"], **entry["headers"])
+        return config
+
+    def shard(self, worker_id=0, num_workers=1):
+        """Entry indices owned by one worker: every num_workers-th entry."""
+        return range(worker_id, self.count, num_workers)
+
+    def requests(self, worker_id=0, num_workers=1, order="sequential", loop=True, rng=None):
+        """
+        Yields a RequestTemplate for each entry of this worker's shard, in
+        file order or shuffled (a new permutation on every pass). With
+        loop=True the shard is replayed indefinitely, otherwise the
+        generator stops after one pass.
+        """
+        if order not in CORPUS_ORDERS:
+            raise ValueError(f"Unknown corpus order: {order} (expected one of {', '.join(CORPUS_ORDERS)})")
+        indices = self.shard(worker_id, num_workers)
+        if not indices:
+            return
+        rng = rng or random.Random()
+        while True:
+            if order == "shuffle":
+                # Only the shard's indices are materialised (8 bytes each), never the entries.
+                indices = array('Q', self.shard(worker_id, num_workers))
+                rng.shuffle(indices)
+            for index in indices:
+                yield RequestTemplate(self.entry(index), index)
+            if not loop:
+                return
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python corpus.py <corpus.jsonl>")
+        sys.exit(1)
+    if not os.path.isfile(sys.argv[1]):
+        print(f"Error: Corpus file not found: {sys.argv[1]}")
+        sys.exit(1)
+    try:
+        count = build_index(sys.argv[1])
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Indexed {count} requests in {sys.argv[1]} -> {index_path(sys.argv[1])}")
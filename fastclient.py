@@ -0,0 +1,465 @@
+import asyncio
+import ipaddress
+import socket
+import ssl
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+# --- Lean HTTP/1.1 Client ---
+
+# A minimal keep-alive HTTP/1.1 client built directly on asyncio protocols,
+# used by the "fast" engine. It implements just the part of aiohttp's
+# session.request() interface that load_test.py uses: an async context
+# manager yielding a response with .status, .headers and read()/text().
+# Requests it cannot handle (other URL schemes or methods) are passed to the
+# fallback aiohttp session. Redirects are not followed and requests are never
+# pipelined: a connection carries one request at a time. Host names are
+# resolved by the client itself and cached for the policy's dns_cache_ttl,
+# like aiohttp's connector does, so the "dns" phase is reported separately
+# from "connect".
+
+SUPPORTED_SCHEMES = ("http", "https")
+SUPPORTED_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Sent with every request unless the config sets them.
+DEFAULT_HEADERS = b"User-Agent: load_test\r\nAccept: */*\r\n"
+
+
+class ConnectError(OSError):
+    """A connection to the target could not be established."""
+
+
+class _Connection(asyncio.Protocol):
+    """One HTTP/1.1 connection with an incremental response parser."""
+
+    def __init__(self, key):
+        self.key = key
+        self.transport = None
+        self.closed = False
+        self.idle_since = 0.0
+        self._buffer = bytearray()
+        self._state = 'idle'
+        self.head_future = None
+        self.body_future = None
+
+    # Protocol callbacks
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self._buffer += data
+        self._parse()
+
+    def eof_received(self):
+        return False
+
+    def connection_lost(self, exc):
+        self.closed = True
+        if self._state == 'until_close':
+            self._finish(bytes(self._buffer))
+        else:
+            self.fail(exc or ConnectionResetError("Connection closed by the server"))
+
+    # Request side
+
+    def send(self, data, expect_body=True):
+        loop = asyncio.get_running_loop()
+        self.head_future = loop.create_future()
+        self.body_future = loop.create_future()
+        self._expect_body = expect_body
+        self._state = 'head'
+        self._buffer.clear()
+        self.transport.write(data)
+
+    def fail(self, error):
+        """Fails whichever future the request is waiting for."""
+        head = self.head_future
+        if head is None:
+            return
+        if not head.done():
+            head.set_exception(error)
+        elif not head.cancelled() and head.exception() is None and not self.body_future.done():
+            # The body of a failed head is never awaited, so it is only failed after a good head.
+            self.body_future.set_exception(error)
+
+    def cancel(self):
+        """Cancels futures nobody is waiting for any more (nothing to report)."""
+        for future in (self.head_future, self.body_future):
+            if future is not None and not future.done():
+                future.cancel()
+
+    def close(self):
+        self.closed = True
+        if self.transport is not None:
+            self.transport.close()
+
+    # Response parser
+
+    def _finish(self, body):
+        self._state = 'idle'
+        if self.body_future is not None and not self.body_future.done():
+            self.body_future.set_result(body)
+
+    def _parse_head(self, end):
+        head = bytes(self._buffer[:end]).decode('latin-1')
+        del self._buffer[:end + 4]
+        lines = head.split("\r\n")
+        version, status = lines[0].split(" ", 2)[:2]
+        status = int(status)
+        if 100 <= status < 200:
+            # Interim response (100 Continue); the real one follows.
+            return
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        self.keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        self.status = status
+        self.headers = headers
+
+        if not self._expect_body or status in (204, 304):
+            self._state = 'done'
+        elif "chunked" in headers.get("transfer-encoding", "").lower():
+            self._chunks = []
+            self._state = 'chunk_size'
+        elif "content-length" in headers:
+            self._remaining = int(headers["content-length"])
+            self._state = 'body'
+        else:
+            self.keep_alive = False
+            self._state = 'until_close'
+        if not self.head_future.done():
+            self.head_future.set_result(None)
+        if self._state == 'done':
+            self._finish(b"")
+
+    def _parse(self):
+        buffer = self._buffer
+        while True:
+            state = self._state
+            if state == 'head':
+                end = buffer.find(b"\r\n\r\n")
+                if end == -1:
+                    return
+                try:
+                    self._parse_head(end)
+                except (ValueError, IndexError) as e:
+                    self.fail(ValueError(f"Invalid HTTP response: {e}"))
+                    self.close()
+                    return
+            elif state == 'body':
+                if len(buffer) < self._remaining:
+                    return
+                body = bytes(buffer[:self._remaining])
+                del buffer[:self._remaining]
+                self._finish(body)
+            elif state == 'chunk_size':
+                end = buffer.find(b"\r\n")
+                if end == -1:
+                    return
+                size = int(bytes(buffer[:end]).split(b";", 1)[0], 16)
+                del buffer[:end + 2]
+                if size:
+                    self._remaining = size
+                    self._state = 'chunk'
+                else:
+                    self._state = 'trailers'
+            elif state == 'chunk':
+                if len(buffer) < self._remaining + 2:
+                    return
+                self._chunks.append(bytes(buffer[:self._remaining]))
+                del buffer[:self._remaining + 2]
+                self._state = 'chunk_size'
+            elif state == 'trailers':
+                end = buffer.find(b"\r\n")
+                if end == -1:
+                    return
+                del buffer[:end + 2]
+                if end == 0:
+                    self._finish(b"".join(self._chunks))
+            else:
+                # 'until_close' keeps buffering; nothing is expected when idle.
+                return
+
+
+class _Response:
+    """The subset of aiohttp.ClientResponse used by load_test.py."""
+
+    def __init__(self, context):
+        self._context = context
+        connection = context.connection
+        self.status = connection.status
+        self.headers = connection.headers
+        self._body = None
+
+    async def read(self):
+        if self._body is None:
+            context = self._context
+            context.waiting = context.connection.body_future
+            self._body = await context.waiting
+            context.body_read = True
+        return self._body
+
+    async def text(self, encoding="utf-8", errors="replace"):
+        return (await self.read()).decode(encoding, errors)
+
+
+class _RequestContext:
+    """Async context manager returned by FastClient.request()."""
+
+    def __init__(self, client, method, parts, body, headers, timeout, timing):
+        self.client = client
+        self.method = method
+        self.parts = parts
+        self.body = body
+        self.headers = headers
+        self.timeout = timeout
+        self.timing = timing
+        self.connection = None
+        self.waiting = None
+        self.body_read = False
+        self._timer = None
+        self.timed_out = False
+
+    def _on_timeout(self):
+        self.timed_out = True
+        waiting = self.waiting
+        if waiting is not None and not waiting.done():
+            if isinstance(waiting, asyncio.Task):
+                # A connection attempt; _connect turns the cancellation into a timeout.
+                waiting.cancel()
+            else:
+                waiting.set_exception(asyncio.TimeoutError())
+        if self.connection is not None:
+            self.connection.close()
+
+    async def __aenter__(self):
+        if self.timeout:
+            self._timer = asyncio.get_running_loop().call_later(self.timeout, self._on_timeout)
+        try:
+            return await self._start()
+        except BaseException:
+            self._release()
+            raise
+
+    async def _start(self):
+        client = self.client
+        request = client.encode_request(self.method, self.parts, self.body, self.headers)
+        for attempt in range(2):
+            self.connection, reused = await client.acquire(self, self.parts)
+            if self.timing is not None:
+                self.timing.ready = time.perf_counter()
+            self.connection.send(request, self.method != "HEAD")
+            self.waiting = self.connection.head_future
+            try:
+                await self.waiting
+            except ConnectionError:
+                # A reused keep-alive connection may have been closed by the
+                # server in the meantime; retry once on a new connection.
+                if reused and attempt == 0 and not self.timed_out:
+                    client.discard(self.connection)
+                    self.connection = None
+                    continue
+                raise
+            break
+        if self.timing is not None:
+            self.timing.headers_at = time.perf_counter()
+            self.timing.ttfb = self.timing.headers_at - self.timing.ready
+        return _Response(self)
+
+    def _release(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        connection = self.connection
+        if connection is None:
+            return
+        self.connection = None
+        if self.body_read and connection.keep_alive and self.client.policy["keep_alive"] and \
+                not connection.closed and not self.timed_out:
+            self.client.release(connection)
+        else:
+            self.client.discard(connection)
+
+    async def __aexit__(self, *exc_info):
+        self._release()
+
+
+class FastClient:
+    """
+    Connection pool and request entry point of the lean client, configured
+    by a connection policy (see connections.py) and counting connections
+    opened, reused and queued in `stats` like ConnectionManager does.
+    """
+
+    def __init__(self, policy, stats, fallback=None):
+        self.policy = policy
+        self.stats = stats
+        self.fallback = fallback
+        # Like aiohttp, pool limits count connections in use, not idle ones.
+        self._idle = {}
+        self._in_use = {}
+        self._total_in_use = 0
+        self._waiters = deque()
+        self._ssl_context = None
+        # (host, port) -> (getaddrinfo results, monotonic expiry time)
+        self._resolved = {}
+
+    def request(self, method, url, data=None, headers=None, timeout=None, trace_request_ctx=None):
+        """Same call shape as aiohttp.ClientSession.request() for the arguments load_test.py passes."""
+        parts = urlsplit(url)
+        if parts.scheme not in SUPPORTED_SCHEMES or not parts.hostname or method not in SUPPORTED_METHODS:
+            if self.fallback is None:
+                raise ValueError(f"Unsupported request for the fast engine: {method} {url}")
+            return self.fallback.request(method, url, data=data, headers=headers, timeout=timeout,
+                                         trace_request_ctx=trace_request_ctx)
+        total = timeout.total if timeout is not None else None
+        return _RequestContext(self, method, parts, data, headers or {}, total, trace_request_ctx)
+
+    def encode_request(self, method, parts, body, headers):
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        lines = [f"{method} {path} HTTP/1.1\r\n"]
+        names = set()
+        for name, value in headers.items():
+            names.add(name.lower())
+            lines.append(f"{name}: {value}\r\n")
+        if "host" not in names:
+            lines.append(f"Host: {parts.netloc}\r\n")
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body) if body else 0}\r\n")
+        if not self.policy["keep_alive"]:
+            lines.append("Connection: close\r\n")
+        head = "".join(lines).encode("latin-1")
+        if "user-agent" not in names:
+            head += DEFAULT_HEADERS
+        return head + b"\r\n" + (body or b"")
+
+    # Pool
+
+    def _has_slot(self, key):
+        limit, per_host = self.policy["pool_size"], self.policy["pool_size_per_host"]
+        return (not limit or self._total_in_use < limit) and (not per_host or self._in_use.get(key, 0) < per_host)
+
+    async def acquire(self, context, parts):
+        """Returns (connection, reused) for the URL's host, waiting for a pool slot if needed."""
+        scheme = parts.scheme
+        key = (scheme, parts.hostname, parts.port or DEFAULT_PORTS[scheme])
+        queued = False
+        while True:
+            if self._has_slot(key):
+                self._total_in_use += 1
+                self._in_use[key] = self._in_use.get(key, 0) + 1
+                idle = self._idle.get(key)
+                now = time.monotonic()
+                while idle:
+                    connection = idle.pop()
+                    if not connection.closed and now - connection.idle_since < self.policy["keepalive_timeout"]:
+                        self.stats['connections_reused'] += 1
+                        return connection, True
+                    connection.close()
+                return await self._connect(context, key), False
+            if not queued:
+                self.stats['connections_queued'] += 1
+                queued = True
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            context.waiting = waiter
+            await waiter
+
+    async def _connect(self, context, key):
+        scheme, host, port = key
+        started = time.perf_counter()
+        ssl_context = None
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_context = self._ssl_context
+        connect = asyncio.ensure_future(self._open(key, ssl_context, context.timing))
+        context.waiting = connect
+        try:
+            connection = await connect
+        except asyncio.CancelledError:
+            self._closed(key)
+            if context.timed_out:
+                raise asyncio.TimeoutError() from None
+            raise
+        except OSError as e:
+            self._closed(key)
+            raise ConnectError(e.errno, f"Cannot connect to {host}:{port}: {e.strerror or e}") from e
+        except BaseException:
+            self._closed(key)
+            raise
+        self.stats['connections_opened'] += 1
+        if context.timing is not None:
+            context.timing.connect = time.perf_counter() - started - (context.timing.dns or 0.0)
+        return connection
+
+    async def _resolve(self, host, port, timing):
+        """
+        Addresses of a host, from the cache while its dns_cache_ttl lasts
+        (0 disables the cache). Only real lookups are timed as the "dns" phase.
+        """
+        try:
+            ipaddress.ip_address(host)
+            return [(socket.AF_INET6 if ':' in host else socket.AF_INET, (host, port))]
+        except ValueError:
+            pass
+        ttl = self.policy["dns_cache_ttl"]
+        cached = self._resolved.get((host, port))
+        if ttl and cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        started = time.perf_counter()
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        if timing is not None:
+            timing.dns = time.perf_counter() - started
+        addresses = [(family, sockaddr) for family, _, _, _, sockaddr in infos]
+        if ttl:
+            self._resolved[(host, port)] = (addresses, time.monotonic() + ttl)
+        return addresses
+
+    async def _open(self, key, ssl_context, timing):
+        """Opens a connection to the first resolved address that accepts it."""
+        scheme, host, port = key
+        loop = asyncio.get_running_loop()
+        error = None
+        for family, sockaddr in await self._resolve(host, port, timing):
+            try:
+                _, connection = await loop.create_connection(
+                    lambda: _Connection(key), sockaddr[0], sockaddr[1], family=family, ssl=ssl_context,
+                    server_hostname=host if ssl_context is not None else None)
+                return connection
+            except OSError as e:
+                error = e
+        raise error or OSError(f"No addresses found for {host}")
+
+    def _closed(self, key):
+        """Frees the pool slot of a connection that is no longer in use."""
+        self._total_in_use -= 1
+        self._in_use[key] -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def release(self, connection):
+        """Returns a connection whose response was fully read to the idle pool."""
+        connection.idle_since = time.monotonic()
+        self._idle.setdefault(connection.key, []).append(connection)
+        self._closed(connection.key)
+
+    def discard(self, connection):
+        """Closes a connection that was in use."""
+        connection.cancel()
+        connection.close()
+        self._closed(connection.key)
+
+    async def close(self):
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+        self._idle.clear()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import resource
+import time
+
+from histogram import LatencyHistogram
+
+# --- Generator Self-Health ---
+
+# The generator watches its own ability to produce the load it reports:
+#   loop lag   how late a short periodic sleep wakes up; a busy event loop
+#              delays every timer, including the request scheduler
+#   send skew  how late each request actually started relative to its
+#              intended send time
+#   in-flight  requests sent and not yet completed
+#   CPU, RSS   of the generator process
+# An interval in which loop lag or send skew p99, or CPU, exceeds its
+# threshold is flagged as saturated: the latencies measured in it include
+# the generator's own queueing and do not describe the target.
+
+# Seconds between loop lag probes.
+PROBE_INTERVAL = 0.05
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class GeneratorHealth:
+    """Collects the generator's health signals per telemetry interval and for the whole run."""
+
+    def __init__(self, lag_threshold_ms, skew_threshold_ms, cpu_threshold_percent):
+        self.lag_threshold_ms = lag_threshold_ms
+        self.skew_threshold_ms = skew_threshold_ms
+        self.cpu_threshold_percent = cpu_threshold_percent
+        self.in_flight = 0
+        self.lag = LatencyHistogram()
+        self.skew = LatencyHistogram()
+        self.peak_in_flight = 0
+        self.peak_rss_mb = 0.0
+        self.intervals = 0
+        self.saturated_intervals = 0
+        self._interval_lag = LatencyHistogram()
+        self._interval_skew = LatencyHistogram()
+        self._interval_peak_in_flight = 0
+        self._cpu_start = self._cpu_mark = time.process_time()
+        self._wall_start = self._wall_mark = time.monotonic()
+
+    def request_started(self, skew_seconds):
+        self.in_flight += 1
+        if self.in_flight > self._interval_peak_in_flight:
+            self._interval_peak_in_flight = self.in_flight
+        skew_ms = max(0.0, skew_seconds * 1000)
+        self._interval_skew.record(skew_ms)
+        self.skew.record(skew_ms)
+
+    def request_finished(self):
+        self.in_flight -= 1
+
+    async def probe(self, stop_event):
+        """Measures event loop lag until `stop_event` is set."""
+        loop = asyncio.get_running_loop()
+        while not stop_event.is_set():
+            expected = loop.time() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            lag_ms = max(0.0, loop.time() - expected) * 1000
+            self._interval_lag.record(lag_ms)
+            self.lag.record(lag_ms)
+
+    def sample(self):
+        """Returns the health of the interval since the previous call and starts a new one."""
+        cpu, wall = time.process_time(), time.monotonic()
+        cpu_percent = (cpu - self._cpu_mark) / (wall - self._wall_mark) * 100 if wall > self._wall_mark else 0.0
+        self._cpu_mark, self._wall_mark = cpu, wall
+        rss_mb = current_rss_mb()
+        lag_p99 = self._interval_lag.percentile(0.99)
+        skew_p99 = self._interval_skew.percentile(0.99)
+
+        reasons = []
+        if lag_p99 > self.lag_threshold_ms:
+            reasons.append("loop lag")
+        if skew_p99 > self.skew_threshold_ms:
+            reasons.append("send skew")
+        if cpu_percent > self.cpu_threshold_percent:
+            reasons.append("cpu")
+        sample = {
+            'loop_lag_p99_ms': round(lag_p99, 2),
+            'loop_lag_max_ms': round(self._interval_lag.max if self._interval_lag.count else 0.0, 2),
+            'send_skew_p99_ms': round(skew_p99, 2),
+            'in_flight': self.in_flight,
+            'peak_in_flight': self._interval_peak_in_flight,
+            'cpu_percent': round(cpu_percent, 1),
+            'rss_mb': round(rss_mb, 1),
+            'saturated': bool(reasons),
+            'reasons': reasons,
+        }
+        self.intervals += 1
+        self.saturated_intervals += bool(reasons)
+        self.peak_in_flight = max(self.peak_in_flight, self._interval_peak_in_flight)
+        self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+        self._interval_lag = LatencyHistogram()
+        self._interval_skew = LatencyHistogram()
+        self._interval_peak_in_flight = self.in_flight
+        return sample
+
+    def summary(self):
+        """Whole-run health for the summary."""
+        wall = time.monotonic() - self._wall_start
+        lag_p99, skew_p99 = self.lag.percentile(0.99), self.skew.percentile(0.99)
+        return {
+            'loop_lag_p99_ms': round(lag_p99, 2),
+            'loop_lag_max_ms': round(self.lag.max if self.lag.count else 0.0, 2),
+            'send_skew_p99_ms': round(skew_p99, 2),
+            'send_skew_max_ms': round(self.skew.max if self.skew.count else 0.0, 2),
+            'peak_in_flight': self.peak_in_flight,
+            'cpu_percent': round((time.process_time() - self._cpu_start) / wall * 100, 1) if wall > 0 else 0.0,
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'intervals': self.intervals,
+            'saturated_intervals': self.saturated_intervals,
+            'saturated': self.saturated_intervals > 0,
+        }
+
+
+def merge_health(summaries):
+    """Combines the health summaries of several generators (worst case, in-flight summed)."""
+    summaries = [summary for summary in summaries if summary]
+    if not summaries:
+        return None
+    merged = {key: max(summary[key] for summary in summaries)
+              for key in ('loop_lag_p99_ms', 'loop_lag_max_ms', 'send_skew_p99_ms', 'send_skew_max_ms', 'cpu_percent')}
+    for key in ('peak_in_flight', 'peak_rss_mb', 'intervals', 'saturated_intervals'):
+        merged[key] = round(sum(summary[key] for summary in summaries), 1)
+    merged['saturated'] = any(summary['saturated'] for summary in summaries)
+    return merged
+
+
+def print_health(health):
+    """Prints a run health summary and the saturation warning."""
+    print(f"Generator: loop lag p99 {health['loop_lag_p99_ms']:.2f}ms (max {health['loop_lag_max_ms']:.2f}ms), "
+          f"send skew p99 {health['send_skew_p99_ms']:.2f}ms, peak in-flight {health['peak_in_flight']}, "
+          f"CPU {health['cpu_percent']:.1f}%, peak RSS {health['peak_rss_mb']:.1f}MB")
+    if health['saturated']:
+        print(f"WARNING: generator saturated in {health['saturated_intervals']} of {health['intervals']} intervals; "
+              f"latencies and rates from those intervals are not valid measurements of the target.")
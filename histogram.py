@@ -0,0 +1,157 @@
+import math
+from array import array
+
+# --- Latency Histogram ---
+
+# Default layout: 10 microseconds to 10 minutes at ~1% relative precision.
+# Every histogram built with the defaults has the same bucket boundaries, so
+# histograms from different workers, processes and time windows can be merged
+# by adding their bucket counts.
+LOWEST_MS = 0.01
+HIGHEST_MS = 600000.0
+PRECISION = 0.01
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory, mergeable, log-bucketed histogram of latencies in ms.
+
+    Bucket i (i >= 1) covers [lowest * g^(i-1), lowest * g^i) with
+    g = 1 + 2 * precision, so any value reported from a bucket is within
+    `precision` of the values recorded into it. Bucket 0 holds values below
+    `lowest` and values above `highest` are clamped into the last bucket.
+    Recording is O(1) and percentile queries are O(buckets).
+    """
+
+    def __init__(self, lowest=LOWEST_MS, highest=HIGHEST_MS, precision=PRECISION):
+        if lowest <= 0 or highest <= lowest or precision <= 0:
+            raise ValueError("Invalid histogram layout")
+        self.lowest = lowest
+        self.highest = highest
+        self.precision = precision
+        self._growth = 1.0 + 2.0 * precision
+        self._inv_log_growth = 1.0 / math.log(self._growth)
+        self._num_buckets = int(math.log(highest / lowest) * self._inv_log_growth) + 2
+        self.counts = array('q', bytes(8 * self._num_buckets))
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value):
+        if value < self.lowest:
+            return 0
+        index = int(math.log(value / self.lowest) * self._inv_log_growth) + 1
+        return index if index < self._num_buckets else self._num_buckets - 1
+
+    def _bucket_value(self, index):
+        """Representative (geometric midpoint) value of a bucket."""
+        if index == 0:
+            return self.lowest / 2
+        return self.lowest * self._growth ** (index - 0.5)
+
+    def same_layout(self, other):
+        return (self.lowest, self.highest, self.precision) == (other.lowest, other.highest, other.precision)
+
+    def record(self, value, count=1):
+        """Records a latency value (ms)."""
+        self.counts[self._index(value)] += count
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Adds another histogram with the same layout into this one."""
+        if not self.same_layout(other):
+            raise ValueError("Cannot merge histograms with different layouts")
+        if not other.count:
+            return self
+        counts = self.counts
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                counts[index] += bucket_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def reset(self):
+        self.counts = array('q', bytes(8 * self._num_buckets))
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def copy(self):
+        clone = LatencyHistogram(self.lowest, self.highest, self.precision)
+        return clone.merge(self)
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def percentiles(self, values):
+        """
+        Calculates several percentiles (given as fractions, e.g. 0.99) in a
+        single pass over the buckets. Returns a list in the order requested.
+        """
+        if not self.count:
+            return [0.0 for _ in values]
+        targets = sorted((max(1, math.ceil(q * self.count)), i) for i, q in enumerate(values))
+        results = [0.0] * len(values)
+        position = 0
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            cumulative += bucket_count
+            while position < len(targets) and targets[position][0] <= cumulative:
+                value = self._bucket_value(index)
+                results[targets[position][1]] = min(max(value, self.min), self.max)
+                position += 1
+            if position == len(targets):
+                break
+        while position < len(targets):
+            results[targets[position][1]] = self.max
+            position += 1
+        return results
+
+    def percentile(self, value):
+        """Calculates a single percentile (given as a fraction, e.g. 0.99)."""
+        return self.percentiles([value])[0]
+
+    def to_dict(self):
+        """Compact JSON-serialisable form: only non-empty buckets are included."""
+        return {
+            'lowest': self.lowest,
+            'highest': self.highest,
+            'precision': self.precision,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else 0.0,
+            'max': self.max if self.count else 0.0,
+            'buckets': [[index, bucket_count] for index, bucket_count in enumerate(self.counts) if bucket_count],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data.get('lowest', LOWEST_MS), data.get('highest', HIGHEST_MS), data.get('precision', PRECISION))
+        for index, bucket_count in data.get('buckets', []):
+            histogram.counts[index] += bucket_count
+        histogram.count = data.get('count', 0)
+        histogram.sum = data.get('sum', 0.0)
+        if histogram.count:
+            histogram.min = data.get('min', 0.0)
+            histogram.max = data.get('max', 0.0)
+        return histogram
+
+    @classmethod
+    def from_values(cls, values):
+        """Builds a histogram from a plain list of latencies (ms)."""
+        histogram = cls()
+        for value in values:
+            histogram.record(value)
+        return histogram
@@ -0,0 +1,88 @@
+from histogram import LatencyHistogram
+
+# --- Labeled Metrics ---
+
+# Every request is counted under an (endpoint, outcome) label with its own
+# latency histogram. The endpoint is the config entry's "name" (or method and
+# URL); the outcome is the HTTP status code ("200", "503", ...) or one of
+# the error classes below. A label's throughput is its histogram count.
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_CONNECT_ERROR = "connect_error"
+OUTCOME_RESET = "reset"
+OUTCOME_ERROR = "error"
+# Not sent because MAX_IN_FLIGHT was reached (OVERLOAD_POLICY=mark).
+OUTCOME_OVERLOAD = "overload"
+# Still in flight when the drain deadline passed.
+OUTCOME_CANCELLED = "cancelled"
+
+# Distinct endpoints tracked before further ones are folded into "other",
+# so a corpus with many distinct URLs cannot grow memory without bound.
+MAX_ENDPOINTS = 100
+OTHER_ENDPOINT = "other"
+
+
+class LabeledLatency:
+    """Latency histograms keyed by (endpoint, outcome)."""
+
+    def __init__(self):
+        self.histograms = {}
+        self._endpoints = set()
+
+    def record(self, endpoint, outcome, latency):
+        histogram = self.histograms.get((endpoint, outcome))
+        if histogram is None:
+            if endpoint not in self._endpoints:
+                if len(self._endpoints) >= MAX_ENDPOINTS:
+                    endpoint = OTHER_ENDPOINT
+                self._endpoints.add(endpoint)
+            histogram = self.histograms.setdefault((endpoint, outcome), LatencyHistogram())
+        histogram.record(latency)
+
+    def merge_list(self, entries):
+        """Merges entries in the to_list() format (histograms as dicts or LatencyHistogram)."""
+        for entry in entries:
+            histogram = entry['latency_histogram']
+            if isinstance(histogram, dict):
+                histogram = LatencyHistogram.from_dict(histogram)
+            key = (entry['endpoint'], entry['outcome'])
+            self._endpoints.add(entry['endpoint'])
+            if key in self.histograms:
+                self.histograms[key].merge(histogram)
+            else:
+                self.histograms[key] = histogram.copy()
+        return self
+
+    def to_list(self):
+        """JSON-serialisable form, one entry per label."""
+        return [{'endpoint': endpoint, 'outcome': outcome, 'latency_histogram': histogram.to_dict()}
+                for (endpoint, outcome), histogram in sorted(self.histograms.items())]
+
+    def rows(self, duration=None):
+        """Per-label summary rows (count, optional rate, percentiles), sorted by endpoint and outcome."""
+        rows = []
+        for (endpoint, outcome), histogram in sorted(self.histograms.items()):
+            tp50, tp90, tp99 = histogram.percentiles([0.50, 0.90, 0.99])
+            row = {
+                'endpoint': endpoint,
+                'outcome': outcome,
+                'count': histogram.count,
+                'tp50_ms': round(tp50, 2),
+                'tp90_ms': round(tp90, 2),
+                'tp99_ms': round(tp99, 2),
+            }
+            if duration:
+                row['rps'] = round(histogram.count / duration, 2)
+            rows.append(row)
+        return rows
+
+
+def print_label_rows(rows):
+    """Prints a per-endpoint/outcome table from LabeledLatency.rows()."""
+    if not rows:
+        return
+    width = max(len("Endpoint"), max(len(row['endpoint']) for row in rows))
+    print(f"{'Endpoint':<{width}} {'Outcome':<14} {'Count':>9} {'RPS':>9} {'TP50 ms':>9} {'TP90 ms':>9} {'TP99 ms':>9}")
+    for row in rows:
+        rps = f"{row['rps']:.2f}" if 'rps' in row else "-"
+        print(f"{row['endpoint']:<{width}} {row['outcome']:<14} {row['count']:>9} {rps:>9} "
+              f"{row['tp50_ms']:>9.2f} {row['tp90_ms']:>9.2f} {row['tp99_ms']:>9.2f}")
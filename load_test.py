@@ -3,37 +3,199 @@ import asyncio
 import sys
 import time
 import json
-import random
 import os
-import threading
+import functools
+import errno
 import requests
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from adaptive import AdaptiveRateController, RateScale, print_adaptive_result
+from connections import ENGINES, ConnectionManager, connection_policy
+from fastclient import ConnectError
+from corpus import CORPUS_ORDERS, Corpus, check_corpus
+from health import GeneratorHealth, print_health
+from histogram import LatencyHistogram
+from labels import (LabeledLatency, OUTCOME_CANCELLED, OUTCOME_CONNECT_ERROR, OUTCOME_ERROR, OUTCOME_OVERLOAD,
+                    OUTCOME_RESET, OUTCOME_TIMEOUT, print_label_rows)
+from phases import PhaseLatency, RequestTiming, print_phase_rows
+from recordlog import RecordWriter, worker_record_path
+from request_templates import compile_configs
+from scheduler import ARRIVAL_MODES, arrivals
+from telemetry import IntervalStats, TelemetryReporter
+from traffic_mix import MIX_MODES, TrafficMix, absolute_rate, mix_rows, print_mix_rows
+
 # --- Configuration & Argument Parsing ---
 
-if len(sys.argv) < 4:
-    print("Usage: python load_test.py <duration_seconds> <log_file_path> <config_file> [requests_per_second]")
-    sys.exit(1)
+USAGE = "Usage: python load_test.py <duration_seconds> <log_file_path> <config_file> [requests_per_second]"
 
-DURATION = int(sys.argv[1])
-LOG_FILE_PATH = sys.argv[2]
-CONFIG_FILE = sys.argv[3]
+# Set by configure(); either from the command line or by a supervisor worker.
+DURATION = None
+LOG_FILE_PATH = None
+CONFIG_FILE = None
 # Default to 5 requests per second if not provided
-REQUESTS_PER_SECOND = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+REQUESTS_PER_SECOND = 5
+CONFIGS = []
+# CONFIGS compiled into ready-to-send requests (request_templates.RequestTemplate).
+TEMPLATES = []
+
+# Set by the supervisor when several workers share one target rate.
+# WORKER_ID identifies the worker in logs and shared counters,
+# START_AT is the wall-clock time (time.time()) at which every worker starts
+# its schedule and PHASE_OFFSET shifts this worker's arrivals so that workers
+# interleave instead of sending in phase.
+WORKER_ID = None
+NUM_WORKERS = 1
+START_AT = None
+PHASE_OFFSET = 0.0
+# multiprocessing.Array of per-worker counters published by the monitor.
+SHARED_COUNTERS = None
+# Shared multiprocessing.Value multiplying the open-loop rate while the run
+# is in progress (set by the supervisor; <= 0 ends the run early).
+RATE_SCALE = None
+# Suppresses the per-interval status line and final summary (supervisor workers).
+QUIET = False
+
+# Dashboard server for registration and telemetry. Set SERVER_URL to an
+# empty string to run standalone (no registration, no telemetry).
 SERVER_URL = os.environ.get("SERVER_URL", "http://localhost:5000")
-        
+# Arrival process for the open-loop scheduler: "constant" or "poisson".
+ARRIVAL_MODE = os.environ.get("ARRIVAL_MODE", "constant").lower()
+if ARRIVAL_MODE not in ARRIVAL_MODES:
+    print(f"Error: ARRIVAL_MODE must be one of {', '.join(ARRIVAL_MODES)}", flush=True)
+    sys.exit(1)
+# Optional JSONL request corpus to replay instead of round-robining CONFIGS.
+# Each worker replays its own shard; CORPUS_ORDER is "sequential" or "shuffle"
+# and with CORPUS_LOOP=false the run ends once the shard has been sent.
+CORPUS_FILE = os.environ.get("CORPUS_FILE")
+CORPUS_ORDER = os.environ.get("CORPUS_ORDER", "sequential").lower()
+CORPUS_LOOP = os.environ.get("CORPUS_LOOP", "true").lower() == "true"
+if CORPUS_ORDER not in CORPUS_ORDERS:
+    print(f"Error: CORPUS_ORDER must be one of {', '.join(CORPUS_ORDERS)}", flush=True)
+    sys.exit(1)
+# How requests are spread over the config entries by their "weight" / "rps"
+# (see traffic_mix.py): "interleave" (deterministic) or "random".
+MIX_MODE = os.environ.get("MIX_MODE", "interleave").lower()
+if MIX_MODE not in MIX_MODES:
+    print(f"Error: MIX_MODE must be one of {', '.join(MIX_MODES)}", flush=True)
+    sys.exit(1)
+# Seconds between monitor prints / telemetry frames sent to the server.
+TELEMETRY_INTERVAL = float(os.environ.get("TELEMETRY_INTERVAL", "1.0"))
+# Per-phase timing (DNS, connect, TTFB, body) from aiohttp's tracing hooks.
+PHASE_TIMING = os.environ.get("PHASE_TIMING", "true").lower() == "true"
+# Optional path of a binary per-request record log (see recordlog.py).
+# Supervisor workers write to their own file, e.g. records_1.bin.
+RECORD_LOG = os.environ.get("RECORD_LOG")
+# Bound on requests in flight (0 = unlimited) and what happens to an arrival
+# while it is reached:
+#   "queue" - wait for a free slot; the request is sent late and its latency
+#             (measured from the intended send time) includes the wait
+#   "drop"  - do not send it; counted in dropped_requests only
+#   "mark"  - do not send it; counted as a failed request with outcome "overload"
+# After the schedule ends, in-flight requests get DRAIN_TIMEOUT seconds to
+# finish before they are cancelled (outcome "cancelled").
+OVERLOAD_POLICIES = ("queue", "drop", "mark")
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "10000"))
+OVERLOAD_POLICY = os.environ.get("OVERLOAD_POLICY", "queue").lower()
+if OVERLOAD_POLICY not in OVERLOAD_POLICIES:
+    print(f"Error: OVERLOAD_POLICY must be one of {', '.join(OVERLOAD_POLICIES)}", flush=True)
+    sys.exit(1)
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", "10"))
+# HTTP client engine ("aiohttp" or "fast", see connections.py) and event
+# loop ("auto" uses uvloop when it is installed, "asyncio" or "uvloop").
+ENGINE = os.environ.get("ENGINE", "aiohttp").lower()
+if ENGINE not in ENGINES:
+    print(f"Error: ENGINE must be one of {', '.join(ENGINES)}", flush=True)
+    sys.exit(1)
+EVENT_LOOPS = ("auto", "asyncio", "uvloop")
+EVENT_LOOP = os.environ.get("EVENT_LOOP", "auto").lower()
+if EVENT_LOOP not in EVENT_LOOPS:
+    print(f"Error: EVENT_LOOP must be one of {', '.join(EVENT_LOOPS)}", flush=True)
+    sys.exit(1)
+if EVENT_LOOP == "uvloop" and uvloop is None:
+    print("Error: EVENT_LOOP=uvloop but uvloop is not installed", flush=True)
+    sys.exit(1)
+# Thresholds above which a telemetry interval is flagged as generator-saturated
+# (p99 event loop lag, p99 send skew behind schedule, process CPU).
+SATURATION_LAG_MS = float(os.environ.get("SATURATION_LAG_MS", "20"))
+SATURATION_SKEW_MS = float(os.environ.get("SATURATION_SKEW_MS", "10"))
+SATURATION_CPU_PERCENT = float(os.environ.get("SATURATION_CPU_PERCENT", "90"))
+
+# Load model:
+#   "open"   - fixed-rate open loop at REQUESTS_PER_SECOND (default)
+#   "closed" - VIRTUAL_USERS users, each sending its next request when the
+#              previous one completes, after THINK_TIME_MS
+#   "search" - open loop stepped up from SEARCH_START_RPS by SEARCH_STEP_RPS
+#              every SEARCH_STEP_DURATION seconds until the error rate exceeds
+#              SEARCH_MAX_ERROR_RATE or p99 exceeds SEARCH_MAX_P99_MS (or
+#              SEARCH_MAX_RPS / the run duration is reached)
+#   "adaptive" - open loop whose rate is adjusted every ADAPTIVE_WINDOW seconds
+#              to keep p99 <= ADAPTIVE_P99_MS and errors <= ADAPTIVE_MAX_ERROR_RATE
+#              just satisfied (see adaptive.py), starting at ADAPTIVE_START_RPS
+LOAD_MODES = ("open", "closed", "search", "adaptive")
+LOAD_MODE = os.environ.get("LOAD_MODE", "open").lower()
+if LOAD_MODE not in LOAD_MODES:
+    print(f"Error: LOAD_MODE must be one of {', '.join(LOAD_MODES)}", flush=True)
+    sys.exit(1)
+VIRTUAL_USERS = int(os.environ.get("VIRTUAL_USERS", "10"))
+THINK_TIME_MS = float(os.environ.get("THINK_TIME_MS", "0"))
+# Start and step default to the requests_per_second argument; 0 = no maximum.
+SEARCH_START_RPS = float(os.environ.get("SEARCH_START_RPS", "0"))
+SEARCH_STEP_RPS = float(os.environ.get("SEARCH_STEP_RPS", "0"))
+SEARCH_MAX_RPS = float(os.environ.get("SEARCH_MAX_RPS", "0"))
+SEARCH_STEP_DURATION = float(os.environ.get("SEARCH_STEP_DURATION", "10"))
+SEARCH_MAX_ERROR_RATE = float(os.environ.get("SEARCH_MAX_ERROR_RATE", "0.01"))
+SEARCH_MAX_P99_MS = float(os.environ.get("SEARCH_MAX_P99_MS", "1000"))
+# Start defaults to the requests_per_second argument; 0 = no maximum.
+ADAPTIVE_P99_MS = float(os.environ.get("ADAPTIVE_P99_MS", "200"))
+ADAPTIVE_MAX_ERROR_RATE = float(os.environ.get("ADAPTIVE_MAX_ERROR_RATE", "0.001"))
+ADAPTIVE_START_RPS = float(os.environ.get("ADAPTIVE_START_RPS", "0"))
+ADAPTIVE_MIN_RPS = float(os.environ.get("ADAPTIVE_MIN_RPS", "1"))
+ADAPTIVE_MAX_RPS = float(os.environ.get("ADAPTIVE_MAX_RPS", "0"))
+ADAPTIVE_WINDOW = float(os.environ.get("ADAPTIVE_WINDOW", "5"))
+# Windows with fewer completed requests are extended; with fewer successes,
+# their p99 means little and the error rate alone scores them.
+ADAPTIVE_MIN_SAMPLES = int(os.environ.get("ADAPTIVE_MIN_SAMPLES", "100"))
+# SLO usage aimed for, and the gain and bounds of each rate step (fractions).
+ADAPTIVE_SETPOINT = float(os.environ.get("ADAPTIVE_SETPOINT", "0.9"))
+ADAPTIVE_GAIN = float(os.environ.get("ADAPTIVE_GAIN", "0.5"))
+ADAPTIVE_MAX_STEP_UP = float(os.environ.get("ADAPTIVE_MAX_STEP_UP", "0.1"))
+ADAPTIVE_MAX_STEP_DOWN = float(os.environ.get("ADAPTIVE_MAX_STEP_DOWN", "0.3"))
 
-# --- Global State ---
 
-# Global flag to signal when the test is complete.
-DONE = False
+# --- Global State ---
 
 # Global dictionary for collecting statistics.
+# 'latency' is a fixed-memory histogram of successful request latencies (ms)
+# for the whole run; 'interval_latency' only covers the current telemetry
+# interval and is swapped out by take_interval_stats(). 'step_latency' is
+# only set while a saturation search step is running. 'labels' and
+# 'interval_labels' hold a latency histogram per (endpoint, outcome) for
+# every request, failed ones included. 'phases' and 'interval_phases' hold
+# a histogram per request phase when PHASE_TIMING is enabled.
 global_data = {
     'total_requests': 0,
     'success_count': 0,
     'failure_count': 0,
-    'latency': []
+    'dropped_count': 0,
+    'drain_cancelled': 0,
+    'latency': LatencyHistogram(),
+    'interval_latency': LatencyHistogram(),
+    'step_latency': None,
+    'labels': LabeledLatency(),
+    'interval_labels': LabeledLatency(),
+    'phases': PhaseLatency(),
+    'interval_phases': PhaseLatency()
 }
+interval_stats = IntervalStats()
+health = GeneratorHealth(SATURATION_LAG_MS, SATURATION_SKEW_MS, SATURATION_CPU_PERCENT)
+# RecordWriter for RECORD_LOG while a test runs, and the offset from the
+# event loop clock to Unix time used for its timestamps.
+record_writer = None
+record_clock_offset = 0.0
 
 def load_config(config_path):
     """Loads the request configuration from a JSON file."""
@@ -47,7 +209,43 @@ def load_config(config_path):
         print(f"Error: Could not decode JSON from {config_path}", flush=True)
         sys.exit(1)
 
-CONFIGS = load_config(CONFIG_FILE)
+def validate_connection_policies(configs):
+    """Raises ValueError for a bad connection block, before any worker registers with the server."""
+    for config in configs:
+        connection_policy(config)
+
+def mix_rate(requests_per_second):
+    """
+    The open-loop rate to run at: the sum of the configs' rps targets when
+    every entry sets one (see traffic_mix.py), otherwise the given rate.
+    """
+    total = absolute_rate(CONFIGS) if LOAD_MODE == "open" and not CORPUS_FILE else None
+    if not total or total == requests_per_second:
+        return requests_per_second
+    print(f"Running at {total:g} RPS, the sum of the rps targets in {CONFIG_FILE} "
+          f"(instead of {requests_per_second:g} RPS).", flush=True)
+    return total
+
+def configure(duration, log_file_path, config_file, requests_per_second=5):
+    """Sets the run parameters and loads the request configuration."""
+    global DURATION, LOG_FILE_PATH, CONFIG_FILE, REQUESTS_PER_SECOND, CONFIGS, TEMPLATES
+    DURATION = duration
+    LOG_FILE_PATH = log_file_path
+    CONFIG_FILE = config_file
+    REQUESTS_PER_SECOND = requests_per_second
+    CONFIGS = load_config(config_file)
+    try:
+        TEMPLATES = compile_configs(CONFIGS)
+        validate_connection_policies(CONFIGS)
+    except (KeyError, ValueError) as e:
+        print(f"Error: Invalid request config in {config_file}: {e}", flush=True)
+        sys.exit(1)
+    if CORPUS_FILE:
+        try:
+            check_corpus(CORPUS_FILE)
+        except (OSError, ValueError) as e:
+            print(f"Error: CORPUS_FILE: {e}", flush=True)
+            sys.exit(1)
 
 
 # --- Statistics Functions ---
@@ -61,50 +259,139 @@ def add_success(latency):
     """Adds a successful request's data."""
     global global_data
     global_data['success_count'] += 1
-    global_data['latency'].append(latency)
+    global_data['latency'].record(latency)
+    global_data['interval_latency'].record(latency)
+    if global_data['step_latency'] is not None:
+        global_data['step_latency'].record(latency)
 
 def add_failure():
     """Increments the failure counter."""
     global global_data
     global_data['failure_count'] += 1
 
-def calculate_percentile(value, latencies):
-    """Calculates a given percentile from a list of latencies."""
-    if not latencies:
-        return 0
-    sorted_latencies = sorted(latencies)
-    index = int(len(sorted_latencies) * value) - 1
-    index = max(0, min(index, len(sorted_latencies) - 1))
-    return sorted_latencies[index]
+def add_dropped():
+    """Counts an arrival that was not sent because MAX_IN_FLIGHT was reached (OVERLOAD_POLICY=drop)."""
+    global_data['dropped_count'] += 1
+
+def add_overload(template, intended_time):
+    """Records an arrival that was not sent because MAX_IN_FLIGHT was reached (OVERLOAD_POLICY=mark)."""
+    add_total()
+    add_failure()
+    add_outcome(template.name, OUTCOME_OVERLOAD, 0.0)
+    if record_writer is not None:
+        add_record(template, intended_time, intended_time, 0.0, 0, OUTCOME_OVERLOAD)
+
+def add_outcome(endpoint, outcome, latency):
+    """Records a request's latency (ms) under its endpoint and outcome labels."""
+    global_data['labels'].record(endpoint, outcome, latency)
+    global_data['interval_labels'].record(endpoint, outcome, latency)
+
+def add_record(template, intended_time, sent_time, latency, status, error=None):
+    """Appends a request to the record log (event loop clock times, latency in ms)."""
+    record_writer.append(intended_time + record_clock_offset, sent_time + record_clock_offset,
+                         latency, template.index, status, error)
+
+def add_phases(timing):
+    """Records the phase breakdown of a request whose body has just been read."""
+    body_end = time.perf_counter()
+    global_data['phases'].record(timing, body_end)
+    global_data['interval_phases'].record(timing, body_end)
+
+def classify_exception(error):
+    """Maps a request exception to an outcome class."""
+    if isinstance(error, asyncio.TimeoutError):
+        return OUTCOME_TIMEOUT
+    if isinstance(error, (aiohttp.ClientConnectorError, ConnectError)):
+        return OUTCOME_CONNECT_ERROR
+    if isinstance(error, (aiohttp.ServerDisconnectedError, ConnectionResetError)) or \
+            (isinstance(error, aiohttp.ClientOSError) and error.errno == errno.ECONNRESET):
+        return OUTCOME_RESET
+    return OUTCOME_ERROR
+
+def take_interval_stats():
+    """
+    Returns a telemetry frame with the counter deltas and latency histogram
+    recorded since the previous call, and starts a new interval.
+    Must be called from the event loop thread so no request is split
+    between two intervals.
+    """
+    frame = interval_stats.delta({
+        'total_requests': global_data['total_requests'],
+        'success_count': global_data['success_count'],
+        'failure_count': global_data['failure_count'],
+        'dropped_count': global_data['dropped_count'],
+    })
+    frame['latency_histogram'] = global_data['interval_latency'].to_dict()
+    frame['labels'] = global_data['interval_labels'].to_list()
+    global_data['interval_latency'] = LatencyHistogram()
+    global_data['interval_labels'] = LabeledLatency()
+    if PHASE_TIMING:
+        frame['phases'] = global_data['interval_phases'].to_dict()
+        global_data['interval_phases'] = PhaseLatency()
+    return frame
 
 
 # --- Core Logic ---
 
-def construct_request(session, config):
-    """Constructs an aiohttp request object based on the config."""
-    headers = config.get("headers", {})
-    timeout = aiohttp.ClientTimeout(total=5)
-    if config.get("body") is not None:
-        return session.post(config["url"], json=config["body"], timeout=timeout, headers=headers)
-    else:
-        return session.get(config["url"], timeout=timeout, headers=headers)
+@functools.lru_cache(maxsize=None)
+def client_timeout(total):
+    """Shared aiohttp timeout object for a given total timeout (seconds)."""
+    return aiohttp.ClientTimeout(total=total)
 
-async def send_request(session, config):
-    """Sends a single async request, records latency, and updates stats."""
-    await asyncio.sleep(random.uniform(0, 0.5))
-    start_time = time.time()
+def construct_request(session, template, seq, timing=None):
+    """
+    Constructs an aiohttp request object from a compiled request template.
+    `timing` (a phases.RequestTiming) is filled in by the phase timing hooks.
+    """
+    url, headers, body = template.render(seq)
+    return session.request(template.method, url, data=body, headers=headers,
+                           timeout=client_timeout(template.timeout), trace_request_ctx=timing)
+
+async def send_request(session, template, seq, intended_time):
+    """
+    Sends a single async request, records latency, and updates stats.
+    Latency is measured from the scheduler's intended send time (event loop
+    clock), not from when the request actually went out, so any queueing in
+    the generator under saturation shows up in the results. The response
+    body is always read, so latency covers the complete response.
+    """
+    loop = asyncio.get_running_loop()
+    sent_time = loop.time()
+    timing = RequestTiming() if PHASE_TIMING else None
     add_total()
+    health.request_started(sent_time - intended_time)
     try:
-        async with construct_request(session, config) as response:
+        async with construct_request(session, template, seq, timing) as response:
+            body = await response.read()
+            latency = (loop.time() - intended_time) * 1000 # Store latency in ms
+            if timing is not None:
+                add_phases(timing)
+            if record_writer is not None:
+                add_record(template, intended_time, sent_time, latency, response.status)
+            add_outcome(template.name, str(response.status), latency)
             if 200 <= response.status < 300:
-                latency = time.time() - start_time
-                add_success(latency * 1000) # Store latency in ms
+                add_success(latency)
                 return 1
             else:
-                response_text = await response.text()
-                print(f"Request failed with status {response.status}: {response_text[:100]}", flush=True)
+                response_text = body[:100].decode(errors="replace")
+                print(f"Request failed with status {response.status}: {response_text}", flush=True)
     except Exception as e:
+        latency = (loop.time() - intended_time) * 1000
+        outcome = classify_exception(e)
+        if record_writer is not None:
+            add_record(template, intended_time, sent_time, latency, 0, outcome)
+        add_outcome(template.name, outcome, latency)
         print(f"Request failed with exception: {e}", flush=True)
+    except asyncio.CancelledError:
+        # Cancelled at the drain deadline: count it as failed so totals add up.
+        latency = (loop.time() - intended_time) * 1000
+        if record_writer is not None:
+            add_record(template, intended_time, sent_time, latency, 0, OUTCOME_CANCELLED)
+        add_outcome(template.name, OUTCOME_CANCELLED, latency)
+        add_failure()
+        raise
+    finally:
+        health.request_finished()
     add_failure()
     return 0
 
@@ -118,15 +405,6 @@ def register_with_server():
         print(f"Could not register with server: {e}", flush=True)
         return None
 
-def send_data_to_server(request_id, data):
-    """Sends a single data point to the server via HTTP POST."""
-    try:
-        data['request_id'] = request_id
-        requests.post(f"{SERVER_URL}/api/test_data", json=data, timeout=0.5)
-    except requests.exceptions.RequestException:
-        # It's okay if some of these fail, we don't want to slow down the load test
-        pass
-
 def shutdown_server(request_id):
     """Sends a shutdown request to the server."""
     try:
@@ -134,28 +412,43 @@ def shutdown_server(request_id):
     except requests.exceptions.RequestException:
         pass
 
-def monitor(request_id):
+# Order of the per-worker counters in SHARED_COUNTERS.
+SHARED_COUNTER_FIELDS = ('total_requests', 'success_count', 'failure_count')
+
+def publish_shared_counters():
+    """Copies this worker's counters into its slot of the shared array."""
+    width = len(SHARED_COUNTER_FIELDS)
+    SHARED_COUNTERS[WORKER_ID * width:(WORKER_ID + 1) * width] = [global_data[field] for field in SHARED_COUNTER_FIELDS]
+
+async def monitor(reporter, stop_event):
     """
-    Prints the current load test status every second.
-    This is a standard synchronous function run in a separate thread.
+    Prints the current load test status every TELEMETRY_INTERVAL seconds and
+    hands the interval's delta to the telemetry reporter (if any).
+    Runs on the event loop; all network I/O happens in the reporter's thread.
     """
-    print("Monitor starting...", flush=True)
+    if not QUIET:
+        print("Monitor starting...", flush=True)
     start_time = time.time()
     
-    while not DONE:
-        # Use standard time.sleep for blocking delay in a thread
-        time.sleep(1)
-        
-        # Accessing global data; for simple monitoring, this is okay.
-        if global_data['total_requests'] > 0:
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(stop_event.wait(), TELEMETRY_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        frame = take_interval_stats()
+        frame['health'] = generator = health.sample()
+        if reporter is not None:
+            reporter.submit(frame)
+        if record_writer is not None:
+            record_writer.flush()
+        if SHARED_COUNTERS is not None:
+            publish_shared_counters()
+
+        if global_data['total_requests'] > 0 and not QUIET:
             success_rate = (global_data['success_count'] / global_data['total_requests']) * 100
             failure_rate = (global_data['failure_count'] / global_data['total_requests']) * 100
             
-            # Make a copy of latencies to avoid race conditions during calculation
-            latencies_copy = global_data['latency'][:]
-            tp50 = calculate_percentile(0.50, latencies_copy)
-            tp90 = calculate_percentile(0.90, latencies_copy)
-            tp99 = calculate_percentile(0.99, latencies_copy)
+            tp50, tp90, tp99 = global_data['latency'].percentiles([0.50, 0.90, 0.99])
 
             elapsed_time = time.time() - start_time
             print(
@@ -165,109 +458,512 @@ def monitor(request_id):
                 f"Failure: {failure_rate:.2f}%, "
                 f"TP50: {tp50:.2f}ms, "
                 f"TP90: {tp90:.2f}ms, "
-                f"TP99: {tp99:.2f}ms",
+                f"TP99: {tp99:.2f}ms, "
+                f"Conns Opened: {global_data['connections_opened']}, "
+                f"Reused: {global_data['connections_reused']}, "
+                f"In-flight: {generator['in_flight']}, "
+                f"Loop Lag p99: {generator['loop_lag_p99_ms']:.1f}ms, "
+                f"Skew p99: {generator['send_skew_p99_ms']:.1f}ms, "
+                f"CPU: {generator['cpu_percent']:.0f}%, "
+                f"RSS: {generator['rss_mb']:.0f}MB"
+                f"{' [GENERATOR SATURATED: ' + ', '.join(generator['reasons']) + ']' if generator['saturated'] else ''}",
                 flush=True
             )
-            send_data_to_server(request_id, global_data)
 
-    print("Monitor finished.", flush=True)
+    if not QUIET:
+        print("Monitor finished.", flush=True)
+
+
+class RequestSource:
+    """
+    Hands out (seq, template, session) for every request: entries of this
+    worker's corpus shard when CORPUS_FILE is set, otherwise TEMPLATES in
+    the proportions of the traffic mix (a round-robin unless the configs
+    set weights or rps targets). `sent` counts the requests per template.
+    """
+
+    def __init__(self, connections, corpus_requests=None, mix=None):
+        self.connections = connections
+        self.corpus_requests = corpus_requests
+        self.mix = mix
+        self.sent = [0] * len(TEMPLATES)
+        self.seq = 0
+
+    def next(self):
+        """Returns the next request, or None once a non-looping corpus is exhausted."""
+        seq = self.seq
+        if self.corpus_requests is not None:
+            template = next(self.corpus_requests, None)
+            if template is None:
+                return None
+            session = self.connections.session_for(0)
+        else:
+            config_index = self.mix.pick(seq)
+            self.sent[config_index] += 1
+            template = TEMPLATES[config_index]
+            session = self.connections.session_for(config_index)
+        self.seq += 1
+        return seq, template, session
+
+
+class InFlight:
+    """
+    The request tasks currently running, at most `limit` of them (0 = no
+    limit). Tasks remove themselves when they finish, so memory depends on
+    the number of requests in flight, not on the length of the run.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.tasks = set()
+        self._slot_waiter = None
+
+    def full(self):
+        return bool(self.limit) and len(self.tasks) >= self.limit
+
+    async def wait_for_slot(self):
+        while self.full():
+            self._slot_waiter = asyncio.get_running_loop().create_future()
+            await self._slot_waiter
+
+    def start(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self.tasks.discard(task)
+        if self._slot_waiter is not None and not self._slot_waiter.done():
+            self._slot_waiter.set_result(None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error in task: {task.exception()}", flush=True)
+
+    async def drain(self, timeout):
+        """
+        Waits up to `timeout` seconds for the running tasks, then cancels the
+        rest. Returns the number of tasks cancelled.
+        """
+        if not self.tasks:
+            return 0
+        _, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            global_data['drain_cancelled'] += len(pending)
+        return len(pending)
+
+
+def stopped():
+    """True once the supervisor has asked this worker to end its run early."""
+    return RATE_SCALE is not None and RATE_SCALE.value <= 0
+
+
+async def run_open_loop(source, rps, duration, phase_offset, in_flight, rate_scale=None):
+    """
+    Sends requests at `rps` (times `rate_scale`, by default the supervisor's
+    RATE_SCALE) for `duration` seconds on the open-loop schedule, starting
+    them in `in_flight` and applying OVERLOAD_POLICY while it is full.
+    Returns False if the source ran out.
+    """
+    async for intended_time, _ in arrivals(rps, duration, ARRIVAL_MODE, phase_offset, rate_scale=rate_scale or RATE_SCALE):
+        if in_flight.full():
+            if OVERLOAD_POLICY == "drop":
+                add_dropped()
+                continue
+            if OVERLOAD_POLICY == "queue":
+                await in_flight.wait_for_slot()
+        request = source.next()
+        if request is None:
+            return False
+        seq, template, session = request
+        if in_flight.full():
+            add_overload(template, intended_time)
+            continue
+        in_flight.start(send_request(session, template, seq, intended_time))
+    return True
+
+
+async def run_closed_loop(source, users, duration, start_delay):
+    """
+    Runs `users` virtual users for `duration` seconds. Each user sends a
+    request, waits for the response, thinks for THINK_TIME_MS and repeats,
+    so the offered rate follows the target's response time.
+    """
+    await asyncio.sleep(start_delay)
+    loop = asyncio.get_running_loop()
+    end_time = loop.time() + duration
+    think_time = THINK_TIME_MS / 1000
+
+    async def virtual_user(user_id):
+        # Spread the users' first requests over one think time so they do not start in lockstep.
+        if think_time:
+            await asyncio.sleep(think_time * user_id / users)
+        while loop.time() < end_time and not stopped():
+            request = source.next()
+            if request is None:
+                return
+            seq, template, session = request
+            await send_request(session, template, seq, loop.time())
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    await asyncio.gather(*(virtual_user(user_id) for user_id in range(users)))
+
+
+async def run_search(source, start_delay):
+    """
+    Saturation search: runs open-loop steps of increasing rate until a step
+    breaks the error-rate or p99 threshold. In-flight requests are drained
+    after every step so each step's statistics only contain its own
+    requests. Returns the per-step results and the knee.
+    """
+    loop = asyncio.get_running_loop()
+    rps = SEARCH_START_RPS or REQUESTS_PER_SECOND
+    step_rps = SEARCH_STEP_RPS or rps
+    deadline = loop.time() + start_delay + DURATION
+    phase_offset = start_delay + PHASE_OFFSET
+    steps = []
+    knee_reason = "duration limit reached"
+    in_flight = InFlight(MAX_IN_FLIGHT)
+
+    while True:
+        if stopped():
+            knee_reason = "stopped"
+            break
+        if SEARCH_MAX_RPS and rps > SEARCH_MAX_RPS:
+            knee_reason = "maximum rate reached"
+            break
+        if loop.time() + phase_offset + SEARCH_STEP_DURATION > deadline:
+            break
+        before = {key: global_data[key] for key in ('total_requests', 'success_count', 'failure_count')}
+        global_data['step_latency'] = LatencyHistogram()
+        has_more = await run_open_loop(source, rps, SEARCH_STEP_DURATION, phase_offset, in_flight)
+        await in_flight.drain(DRAIN_TIMEOUT)
+        step_latency, global_data['step_latency'] = global_data['step_latency'], None
+
+        total = global_data['total_requests'] - before['total_requests']
+        failures = global_data['failure_count'] - before['failure_count']
+        successes = global_data['success_count'] - before['success_count']
+        error_rate = failures / total if total else 0.0
+        p50, p99 = step_latency.percentiles([0.50, 0.99])
+        passed = error_rate <= SEARCH_MAX_ERROR_RATE and p99 <= SEARCH_MAX_P99_MS
+        steps.append({
+            "target_rps": rps,
+            "achieved_rps": round(successes / SEARCH_STEP_DURATION, 2),
+            "requests": total,
+            "error_rate": round(error_rate, 4),
+            "tp50_ms": round(p50, 2),
+            "tp99_ms": round(p99, 2),
+            "passed": passed,
+        })
+        if not QUIET:
+            print(f"Step {len(steps)}: target {rps:g} RPS, achieved {steps[-1]['achieved_rps']:.2f} RPS, "
+                  f"errors {error_rate * 100:.2f}%, TP50 {p50:.2f}ms, TP99 {p99:.2f}ms -> "
+                  f"{'ok' if passed else 'threshold exceeded'}", flush=True)
+        if not passed:
+            knee_reason = "error rate threshold exceeded" if error_rate > SEARCH_MAX_ERROR_RATE else "p99 threshold exceeded"
+            break
+        if not has_more:
+            knee_reason = "corpus exhausted"
+            break
+        rps += step_rps
+        phase_offset = PHASE_OFFSET
+
+    passing = [step for step in steps if step["passed"]]
+    return {
+        "steps": steps,
+        "max_sustainable_rps": passing[-1]["achieved_rps"] if passing else 0.0,
+        "max_sustainable_target_rps": passing[-1]["target_rps"] if passing else 0.0,
+        "knee_reason": knee_reason,
+    }
+
+
+async def run_adaptive(source, start_delay, in_flight):
+    """
+    SLO-driven open loop: the scheduler runs for the whole duration while a
+    controller re-rates it after every ADAPTIVE_WINDOW seconds of results.
+    Returns the controller's result (see adaptive.py).
+    """
+    loop = asyncio.get_running_loop()
+    base_rps = ADAPTIVE_START_RPS or REQUESTS_PER_SECOND
+    controller = AdaptiveRateController(
+        base_rps, ADAPTIVE_P99_MS, ADAPTIVE_MAX_ERROR_RATE, ADAPTIVE_SETPOINT, ADAPTIVE_GAIN,
+        ADAPTIVE_MAX_STEP_UP, ADAPTIVE_MAX_STEP_DOWN, min_rps=ADAPTIVE_MIN_RPS, max_rps=ADAPTIVE_MAX_RPS)
+    scale = RateScale()
+    schedule = asyncio.create_task(
+        run_open_loop(source, base_rps, DURATION, start_delay + PHASE_OFFSET, in_flight, scale))
+
+    await asyncio.sleep(start_delay)
+    started = window_start = loop.time()
+    before = {key: global_data[key] for key in ('success_count', 'failure_count')}
+    global_data['step_latency'] = LatencyHistogram()
+    try:
+        while not schedule.done():
+            await asyncio.wait({schedule}, timeout=ADAPTIVE_WINDOW)
+            if stopped():
+                scale.value = 0.0
+            # Windows are extended until enough requests have completed; failures count
+            # too, so a target that fails most requests still backs the rate off.
+            failures = global_data['failure_count'] - before['failure_count']
+            requests = global_data['success_count'] - before['success_count'] + failures
+            if schedule.done() or requests < ADAPTIVE_MIN_SAMPLES:
+                continue
+            now = loop.time()
+            step_latency = global_data['step_latency']
+            # Too few successes for a meaningful p99: the error rate alone scores the window.
+            p99 = step_latency.percentile(0.99) if step_latency.count >= ADAPTIVE_MIN_SAMPLES else None
+            rps = controller.update(now - started, now - window_start, requests, failures, p99)
+            window = controller.windows[-1]
+            scale.value = rps / base_rps
+            if not QUIET:
+                p99_text = f"{window['tp99_ms']:.2f}ms" if window['tp99_ms'] is not None else "n/a"
+                print(f"Adaptive: {window['target_rps']:g} RPS -> p99 {p99_text}, "
+                      f"errors {window['error_rate'] * 100:.3f}%, SLO usage {window['slo_usage']:.2f}; "
+                      f"next {rps:.2f} RPS", flush=True)
+            window_start = now
+            before = {key: global_data[key] for key in ('success_count', 'failure_count')}
+            global_data['step_latency'] = LatencyHistogram()
+        has_more = schedule.result()
+    finally:
+        global_data['step_latency'] = None
+    if not has_more:
+        print("Corpus exhausted.", flush=True)
+    return controller.result()
 
 
 async def load_test():
-    """Main function to orchestrate the load test."""
-    request_id = register_with_server()
-    if not request_id:
-        return
+    """
+    Main function to orchestrate the load test.
+    Returns the run summary (see build_summary()), or None if the test could not start.
+    """
+    request_id = None
+    if SERVER_URL:
+        request_id = register_with_server()
+        if not request_id:
+            return None
 
     if not CONFIGS:
         print("Error: No configurations found in the config file.", flush=True)
-        return
+        return None
 
-    num_configs = len(CONFIGS)
-    print(f"Starting load test: {REQUESTS_PER_SECOND} RPS for {DURATION} seconds.", flush=True)
+    worker_label = f"[worker {WORKER_ID}] " if WORKER_ID is not None else ""
+    if LOAD_MODE == "closed":
+        print(f"{worker_label}Starting closed-loop load test: {VIRTUAL_USERS} virtual users "
+              f"({THINK_TIME_MS:g}ms think time) for {DURATION} seconds.", flush=True)
+    elif LOAD_MODE == "adaptive":
+        print(f"{worker_label}Starting adaptive load test from {ADAPTIVE_START_RPS or REQUESTS_PER_SECOND:g} RPS "
+              f"(p99 <= {ADAPTIVE_P99_MS:g}ms, errors <= {ADAPTIVE_MAX_ERROR_RATE * 100:g}%) for {DURATION} seconds.", flush=True)
+    elif LOAD_MODE == "search":
+        print(f"{worker_label}Starting saturation search from {SEARCH_START_RPS or REQUESTS_PER_SECOND:g} RPS "
+              f"(p99 <= {SEARCH_MAX_P99_MS:g}ms, errors <= {SEARCH_MAX_ERROR_RATE * 100:g}%) for up to {DURATION} seconds.", flush=True)
+    else:
+        print(f"{worker_label}Starting load test: {REQUESTS_PER_SECOND:g} RPS ({ARRIVAL_MODE} arrivals) for {DURATION} seconds.", flush=True)
+    if not QUIET:
+        print(f"Engine: {ENGINE}, event loop: {type(asyncio.get_running_loop()).__module__.split('.')[0]}", flush=True)
     
-    # KEY CHANGE: Run the monitor in a separate thread.
-    # daemon=True ensures the thread will not block program exit.
-    monitor_thread = threading.Thread(target=monitor, args=(request_id,), daemon=True)
-    monitor_thread.start()
-
-    test_start_time = time.time()
-    all_tasks = []
-    async with aiohttp.ClientSession() as session:
-        for _ in range(DURATION):
-            second_start_time = time.time()
-            for i in range(REQUESTS_PER_SECOND):
-                config = CONFIGS[i % num_configs]
-                task = asyncio.create_task(send_request(session, config))
-                all_tasks.append(task)
-            
-            elapsed_this_second = time.time() - second_start_time
-            if elapsed_this_second < 1.0:
-                await asyncio.sleep(1.0 - elapsed_this_second)
-
-    # Wait for all the request-sending tasks to complete
-    # await asyncio.gather(*all_tasks)
-    for task in all_tasks:
+    # Telemetry is sent from the reporter's own thread; the monitor task only
+    # builds the per-interval frames.
+    reporter = None
+    if request_id:
+        reporter = TelemetryReporter(SERVER_URL, request_id)
+        reporter.start()
+    global record_writer, record_clock_offset
+    if RECORD_LOG:
+        # Workers append, so a restarted worker continues its predecessor's file.
+        path = worker_record_path(RECORD_LOG, WORKER_ID) if WORKER_ID is not None else RECORD_LOG
+        record_writer = RecordWriter(path, WORKER_ID or 0, append=WORKER_ID is not None)
+        record_writer.start()
+        record_clock_offset = time.time() - asyncio.get_running_loop().time()
+    stop_monitor = asyncio.Event()
+    monitor_task = asyncio.create_task(monitor(reporter, stop_monitor))
+    probe_task = asyncio.create_task(health.probe(stop_monitor))
+
+    corpus = None
+    corpus_requests = None
+    mix = None
+    if CORPUS_FILE:
+        # Corpus entries inherit missing fields (url, headers, connection) from the first config.
+        corpus = Corpus(CORPUS_FILE, CONFIGS[0])
+        corpus_requests = corpus.requests(WORKER_ID or 0, NUM_WORKERS, CORPUS_ORDER, CORPUS_LOOP)
+        print(f"{worker_label}Replaying {len(corpus.shard(WORKER_ID or 0, NUM_WORKERS))} of {len(corpus)} "
+              f"corpus requests from {CORPUS_FILE} ({CORPUS_ORDER}{', looping' if CORPUS_LOOP else ''}).", flush=True)
+    else:
+        # "rps" targets in the configs are global, like the requests_per_second argument.
         try:
-            await task
-        except Exception as e:
-            print(f"Error in task: {e}", flush=True)
-        except asyncio.exceptions.CancelledError as e:
-            print(f"Error in task: {e}", flush=True)
+            mix = TrafficMix(CONFIGS, REQUESTS_PER_SECOND * NUM_WORKERS, MIX_MODE)
+        except ValueError as e:
+            print(f"Error: Invalid traffic mix in {CONFIG_FILE}: {e}", flush=True)
+            return None
+        if mix.warning and WORKER_ID in (None, 0):
+            print(f"Warning: {mix.warning}", flush=True)
+
+    in_flight = InFlight(MAX_IN_FLIGHT)
+    search_result = None
+    adaptive_result = None
+    async with ConnectionManager(CONFIGS, global_data, PHASE_TIMING, ENGINE) as connections:
+        await connections.warm_up(TEMPLATES, construct_request)
+        source = RequestSource(connections, corpus_requests, mix)
+
+        start_delay = max(0.0, START_AT - time.time()) if START_AT is not None else 0.0
+        test_start_time = time.time() + start_delay
+        if LOAD_MODE == "closed":
+            await run_closed_loop(source, VIRTUAL_USERS, DURATION, start_delay)
+        elif LOAD_MODE == "search":
+            search_result = await run_search(source, start_delay)
+        elif LOAD_MODE == "adaptive":
+            adaptive_result = await run_adaptive(source, start_delay, in_flight)
+        elif not await run_open_loop(source, REQUESTS_PER_SECOND, DURATION, start_delay + PHASE_OFFSET, in_flight):
+            print(f"{worker_label}Corpus exhausted after {source.seq} requests.", flush=True)
+
+        # Drain the in-flight requests before the sessions (and their pooled
+        # connections) are closed; whatever outlives the deadline is cancelled
+        cancelled = await in_flight.drain(DRAIN_TIMEOUT)
+        if cancelled:
+            print(f"{worker_label}Cancelled {cancelled} requests still in flight after the {DRAIN_TIMEOUT:g}s drain.", flush=True)
+    if corpus is not None:
+        corpus.close()
     
-    # Signal the monitor thread to stop
-    global DONE
-    DONE = True
-    # Wait for the monitor thread to finish its final print and exit
-    monitor_thread.join()
-
-    shutdown_server(request_id)
+    # Signal the monitor to stop; it sends the final interval before exiting
+    stop_monitor.set()
+    await monitor_task
+    await probe_task
+    if reporter is not None:
+        # Flush telemetry off the event loop before telling the server we are done
+        await asyncio.get_running_loop().run_in_executor(None, reporter.stop)
+        if reporter.dropped_frames:
+            print(f"Telemetry frames dropped: {reporter.dropped_frames}", flush=True)
+    if record_writer is not None:
+        await asyncio.get_running_loop().run_in_executor(None, record_writer.close)
+        print(f"{worker_label}Wrote {record_writer.written_records} request records to {record_writer.path}"
+              f"{f' ({record_writer.dropped_records} dropped)' if record_writer.dropped_records else ''}.", flush=True)
+
+    if request_id:
+        shutdown_server(request_id)
 
     total_duration = time.time() - test_start_time
-
-    # --- Final Summary ---
-    print("\n=== Load Test Summary ===")
-    print(f"Target RPS: {REQUESTS_PER_SECOND}")
-    print(f"Target Duration: {DURATION}s")
-    print(f"Actual Duration: {total_duration:.2f}s")
-    print(f"Total Successful Requests: {global_data['success_count']}")
-    print(f"Total Failed Requests: {global_data['failure_count']}")
-    
-    actual_rps = global_data['success_count'] / total_duration if total_duration > 0 else 0
-    print(f"Actual Successful RPS: {actual_rps:.2f}")
-
-    final_tp50 = calculate_percentile(0.50, global_data['latency'])
-    final_tp90 = calculate_percentile(0.90, global_data['latency'])
-    final_tp95 = calculate_percentile(0.95, global_data['latency'])
-    final_tp99 = calculate_percentile(0.99, global_data['latency'])
-
-    print(f"Final TP50 Latency: {final_tp50:.2f}ms")
-    print(f"Final TP90 Latency: {final_tp90:.2f}ms")
-    print(f"Final TP95 Latency: {final_tp95:.2f}ms")
-    print(f"Final TP99 Latency: {final_tp99:.2f}ms")
+    summary = build_summary(total_duration)
+    if LOAD_MODE == "closed":
+        summary["virtual_users"] = VIRTUAL_USERS
+        summary["think_time_ms"] = THINK_TIME_MS
+    if search_result is not None:
+        summary["search"] = search_result
+    if adaptive_result is not None:
+        summary["adaptive"] = adaptive_result
+    if mix is not None:
+        summary["mix_mode"] = MIX_MODE
+        # Only the open loop has a fixed total rate to take the targets from.
+        summary["mix"] = mix_rows([template.name for template in TEMPLATES], mix.shares, source.sent, total_duration,
+                                  REQUESTS_PER_SECOND * NUM_WORKERS if LOAD_MODE == "open" else None)
+    if not QUIET:
+        print_summary(summary)
 
     # Log results to file if enabled
     if os.environ.get("WRITE_LOGS", "false").lower() == "true":
-        log_data = {
-            "target_rps_instance": REQUESTS_PER_SECOND,
-            "target_duration_instance": DURATION,
-            "actual_duration_instance": float(f"{total_duration:.2f}"),
-            "successful_requests": global_data['success_count'],
-            "failed_requests": global_data['failure_count'],
-            "total_attempted_requests": global_data['total_requests'],
-            "actual_rps_instance": float(f"{actual_rps:.2f}"),
-            "latencies_ms": sorted([float(f"{l:.2f}") for l in global_data['latency']])
-        }
         with open(LOG_FILE_PATH, "w") as f:
-            json.dump(log_data, f, indent=4)
-        print(f"\nLog data written in JSON format to {LOG_FILE_PATH}")
+            json.dump(summary, f, indent=4)
+        print(f"\n{worker_label}Log data written in JSON format to {LOG_FILE_PATH}")
+
+    return summary
+
+
+def build_summary(total_duration):
+    """Builds the JSON-serialisable run summary that is also written to the log file."""
+    actual_rps = global_data['success_count'] / total_duration if total_duration > 0 else 0
+    tp50, tp90, tp95, tp99 = global_data['latency'].percentiles([0.50, 0.90, 0.95, 0.99])
+    return {
+        "target_rps_instance": REQUESTS_PER_SECOND,
+        "load_mode": LOAD_MODE,
+        "arrival_mode": ARRIVAL_MODE,
+        "target_duration_instance": DURATION,
+        "actual_duration_instance": float(f"{total_duration:.2f}"),
+        "successful_requests": global_data['success_count'],
+        "failed_requests": global_data['failure_count'],
+        "total_attempted_requests": global_data['total_requests'],
+        "actual_rps_instance": float(f"{actual_rps:.2f}"),
+        "tp50_ms": float(f"{tp50:.2f}"),
+        "tp90_ms": float(f"{tp90:.2f}"),
+        "tp95_ms": float(f"{tp95:.2f}"),
+        "tp99_ms": float(f"{tp99:.2f}"),
+        "connections_opened": global_data['connections_opened'],
+        "connections_reused": global_data['connections_reused'],
+        "connections_queued": global_data['connections_queued'],
+        "max_in_flight": MAX_IN_FLIGHT,
+        "overload_policy": OVERLOAD_POLICY,
+        "dropped_requests": global_data['dropped_count'],
+        "drain_cancelled": global_data['drain_cancelled'],
+        "labels": global_data['labels'].to_list(),
+        "phases": global_data['phases'].to_dict() if PHASE_TIMING else None,
+        "health": health.summary(),
+        "latency_histogram": global_data['latency'].to_dict()
+    }
+
+
+def print_summary(summary):
+    """Prints a run summary produced by build_summary()."""
+    print("\n=== Load Test Summary ===")
+    if summary.get('load_mode') == "closed":
+        print(f"Virtual Users: {summary['virtual_users']} ({summary['think_time_ms']:g}ms think time)")
+    elif summary.get('load_mode') not in ("search", "adaptive"):
+        print(f"Target RPS: {summary['target_rps_instance']:g} ({summary['arrival_mode']} arrivals)")
+    print(f"Target Duration: {summary['target_duration_instance']}s")
+    print(f"Actual Duration: {summary['actual_duration_instance']:.2f}s")
+    print(f"Total Successful Requests: {summary['successful_requests']}")
+    print(f"Total Failed Requests: {summary['failed_requests']}")
+    print(f"Actual Successful RPS: {summary['actual_rps_instance']:.2f}")
+    print(f"Final TP50 Latency: {summary['tp50_ms']:.2f}ms")
+    print(f"Final TP90 Latency: {summary['tp90_ms']:.2f}ms")
+    print(f"Final TP95 Latency: {summary['tp95_ms']:.2f}ms")
+    print(f"Final TP99 Latency: {summary['tp99_ms']:.2f}ms")
+    print(f"Connections Opened: {summary['connections_opened']}, Reused: {summary['connections_reused']}, "
+          f"Waited For Pool Slot: {summary['connections_queued']}")
+    if summary.get('dropped_requests') or summary.get('drain_cancelled'):
+        print(f"Dropped At In-Flight Limit ({summary['max_in_flight']}): {summary['dropped_requests']}, "
+              f"Cancelled At Drain Deadline: {summary['drain_cancelled']}")
+    if summary.get('health'):
+        print_health(summary['health'])
+    if summary.get('labels'):
+        print("\n--- By Endpoint and Outcome ---")
+        duration = summary['actual_duration_instance']
+        print_label_rows(LabeledLatency().merge_list(summary['labels']).rows(duration))
+    if summary.get('phases'):
+        print("\n--- Request Phases ---")
+        print_phase_rows(PhaseLatency().merge_dict(summary['phases']).rows())
+    if len(summary.get('mix') or []) > 1:
+        print_mix_rows(summary['mix'])
+    if 'search' in summary:
+        print_search_result(summary['search'])
+    if 'adaptive' in summary:
+        print_adaptive_result(summary['adaptive'])
+
+
+def print_search_result(search):
+    """Prints the step table and knee of a saturation search."""
+    print("\n--- Saturation Search ---")
+    print(f"{'Step':>4} {'Target RPS':>11} {'Achieved':>10} {'Errors':>8} {'TP50 ms':>9} {'TP99 ms':>9}  Result")
+    for number, step in enumerate(search['steps'], 1):
+        print(f"{number:>4} {step['target_rps']:>11g} {step['achieved_rps']:>10.2f} {step['error_rate'] * 100:>7.2f}% "
+              f"{step['tp50_ms']:>9.2f} {step['tp99_ms']:>9.2f}  {'ok' if step['passed'] else 'FAIL'}")
+    print(f"Max Sustainable RPS: {search['max_sustainable_rps']:.2f} "
+          f"(target {search['max_sustainable_target_rps']:g}; stopped: {search['knee_reason']})")
+
+
+def run(main):
+    """Runs a coroutine on the configured event loop (uvloop when selected or, with "auto", installed)."""
+    if uvloop is not None and EVENT_LOOP != "asyncio":
+        if hasattr(uvloop, "run"):
+            return uvloop.run(main)
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(main)
 
 
 if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print(USAGE)
+        sys.exit(1)
+    configure(int(sys.argv[1]), sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else 5)
+    REQUESTS_PER_SECOND = mix_rate(REQUESTS_PER_SECOND)
     try:
-        asyncio.run(load_test())
+        run(load_test())
     except KeyboardInterrupt:
         print("\nLoad test interrupted by user.", flush=True)
-    finally:
-        # Ensure the DONE flag is set so the monitor can exit.
-        DONE = True
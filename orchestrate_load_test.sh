@@ -3,7 +3,7 @@
 # Ensure all child processes are killed on exit
 trap 'echo "--- Cleaning up child processes ---"; kill $(jobs -p) &>/dev/null' EXIT
 
-# Script to run multiple instances of load_test.py in parallel
+# Script to run multiple load_test.py workers in parallel via supervisor.py
 
 # Check for minimum number of arguments
 if [ "$#" -lt 3 ]; then
@@ -23,6 +23,7 @@ echo "Starting $NUM_PROCESSES load test instance(s)..."
 echo "Duration per instance: ${DURATION}s"
 echo "Base log name: ${BASE_LOG_NAME} (hardcoded)"
 echo "Requests per second per instance: ${REQUESTS_PER_SECOND}"
+echo "Total requests per second: $((NUM_PROCESSES * REQUESTS_PER_SECOND))"
 echo "----------------------------------------------------"
 
 pwd
@@ -41,27 +42,24 @@ if [ ! -f "load_test.py" ]; then
     exit 1
 fi
 
+# Check if supervisor.py exists
+if [ ! -f "supervisor.py" ]; then
+    echo "Error: supervisor.py not found in the current directory."
+    exit 1
+fi
+
 # Check if analyze_logs.py exists
 if [ ! -f "analyze_logs.py" ]; then
     echo "Error: analyze_logs.py not found in the current directory."
     exit 1
 fi
 
-declare -a LOG_FILES_ARRAY=() # Array to store log file names
-
-for i in $(seq 1 "$NUM_PROCESSES"); do
-    LOG_FILE_NAME="${BASE_LOG_NAME}_${i}.json"
-    LOG_FILES_ARRAY+=("$LOG_FILE_NAME") # Add to array
-    # echo "Starting instance $i: python3 load_test.py $DURATION \"$LOG_FILE_NAME\" $CONFIG_FILE $REQUESTS_PER_SECOND"
-    # Run the python script in the background
-    python3 load_test.py "$DURATION" "$LOG_FILE_NAME" "$CONFIG_FILE" "$REQUESTS_PER_SECOND" &
-done
-
-# Wait for all background processes to complete
-wait
+# The supervisor starts one worker per instance, splits the total rate between
+# them, staggers their schedules and writes ${BASE_LOG_NAME}_<i>.json per worker
+# when WRITE_LOGS=true.
+python3 supervisor.py "$DURATION" "$CONFIG_FILE" "$((NUM_PROCESSES * REQUESTS_PER_SECOND))" "$NUM_PROCESSES"
 echo "----------------------------------------------------"
 echo "All load test instances have completed."
-# echo "Generated log files: ${LOG_FILES_ARRAY[*]}"
 
 # Call the analysis script if ANALYZE_LOGS is set to true
 if [ "${ANALYZE_LOGS}" = "true" ]; then
@@ -0,0 +1,123 @@
+import time
+
+from histogram import LatencyHistogram
+
+# --- Request Phase Timing ---
+
+# Each request's time is split into phases measured with aiohttp's tracing
+# hooks:
+#   dns      resolving the host name (only when not answered from the DNS cache)
+#   connect  TCP connect plus the TLS handshake for https (only for new connections;
+#            aiohttp has no separate TLS hook, so both are reported together)
+#   ttfb     from having a connection to receiving the response headers
+#            (request upload plus server processing)
+#   body     reading the response body
+# A phase that did not happen for a request is not recorded, so each phase's
+# histogram has its own count.
+PHASES = ("dns", "connect", "ttfb", "body")
+
+
+class RequestTiming:
+    """Per-request timestamps filled in by the trace hooks (time.perf_counter())."""
+
+    __slots__ = ('start', 'dns_start', 'dns', 'connect_start', 'connect', 'ready', 'ttfb', 'headers_at')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.dns_start = self.connect_start = self.ready = self.headers_at = None
+        self.dns = self.connect = self.ttfb = None
+
+
+async def _on_dns_start(session, context, params):
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx.dns_start = time.perf_counter()
+
+async def _on_dns_end(session, context, params):
+    timing = context.trace_request_ctx
+    if timing is not None and timing.dns_start is not None:
+        timing.dns = time.perf_counter() - timing.dns_start
+
+async def _on_connect_start(session, context, params):
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx.connect_start = time.perf_counter()
+
+async def _on_connect_end(session, context, params):
+    timing = context.trace_request_ctx
+    if timing is not None and timing.connect_start is not None:
+        timing.ready = time.perf_counter()
+        # Connection creation includes the DNS lookup; report it separately.
+        timing.connect = timing.ready - timing.connect_start - (timing.dns or 0.0)
+
+async def _on_reuse(session, context, params):
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx.ready = time.perf_counter()
+
+async def _on_request_end(session, context, params):
+    # Fired once the response headers have been received.
+    timing = context.trace_request_ctx
+    if timing is not None:
+        timing.headers_at = time.perf_counter()
+        timing.ttfb = timing.headers_at - (timing.ready or timing.start)
+
+
+def add_phase_hooks(trace_config):
+    """Registers the phase timing hooks; requests opt in by passing a RequestTiming as trace_request_ctx."""
+    trace_config.on_dns_resolvehost_start.append(_on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_end)
+    trace_config.on_connection_create_start.append(_on_connect_start)
+    trace_config.on_connection_create_end.append(_on_connect_end)
+    trace_config.on_connection_reuseconn.append(_on_reuse)
+    trace_config.on_request_end.append(_on_request_end)
+
+
+class PhaseLatency:
+    """One latency histogram (ms) per request phase."""
+
+    def __init__(self):
+        self.histograms = {phase: LatencyHistogram() for phase in PHASES}
+
+    def record(self, timing, body_end):
+        """Records a finished request; `body_end` is when its body was read (time.perf_counter())."""
+        if timing.dns is not None:
+            self.histograms['dns'].record(timing.dns * 1000)
+        if timing.connect is not None:
+            self.histograms['connect'].record(timing.connect * 1000)
+        if timing.ttfb is not None:
+            self.histograms['ttfb'].record(timing.ttfb * 1000)
+            self.histograms['body'].record((body_end - timing.headers_at) * 1000)
+
+    def merge_dict(self, data):
+        """Merges the to_dict() form (histograms as dicts or LatencyHistogram)."""
+        for phase, histogram in data.items():
+            if isinstance(histogram, dict):
+                histogram = LatencyHistogram.from_dict(histogram)
+            if phase in self.histograms:
+                self.histograms[phase].merge(histogram)
+        return self
+
+    def to_dict(self):
+        """JSON-serialisable form: phase name -> histogram dict."""
+        return {phase: histogram.to_dict() for phase, histogram in self.histograms.items()}
+
+    def rows(self):
+        """Per-phase summary rows in PHASES order."""
+        rows = []
+        for phase, histogram in self.histograms.items():
+            tp50, tp90, tp99 = histogram.percentiles([0.50, 0.90, 0.99])
+            rows.append({
+                'phase': phase,
+                'count': histogram.count,
+                'mean_ms': round(histogram.mean(), 2),
+                'tp50_ms': round(tp50, 2),
+                'tp90_ms': round(tp90, 2),
+                'tp99_ms': round(tp99, 2),
+            })
+        return rows
+
+
+def print_phase_rows(rows):
+    """Prints a per-phase table from PhaseLatency.rows()."""
+    print(f"{'Phase':<8} {'Count':>9} {'Mean ms':>9} {'TP50 ms':>9} {'TP90 ms':>9} {'TP99 ms':>9}")
+    for row in rows:
+        print(f"{row['phase']:<8} {row['count']:>9} {row['mean_ms']:>9.2f} "
+              f"{row['tp50_ms']:>9.2f} {row['tp90_ms']:>9.2f} {row['tp99_ms']:>9.2f}")
@@ -0,0 +1,130 @@
+import csv
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+
+from labels import (OUTCOME_CANCELLED, OUTCOME_CONNECT_ERROR, OUTCOME_ERROR, OUTCOME_OVERLOAD, OUTCOME_RESET,
+                    OUTCOME_TIMEOUT)
+
+# --- Per-Request Record Log ---
+
+# A record log is a small header followed by one fixed-width little-endian
+# record per request, in completion order:
+#   intended_time  float64  scheduled send time (Unix seconds)
+#   sent_time      float64  time the request actually started (Unix seconds)
+#   latency_ms     float32  from intended_time to the end of the response
+#   config_index   uint32   config entry (or corpus line) the request came from
+#   status         uint16   HTTP status, 0 when the request raised
+#   worker_id      uint16   supervisor worker that sent it (0 when standalone)
+#   error          uint8    ERROR_CODES entry when status is 0
+# A file cut short by a crash is still readable up to its last whole record.
+RECORD_MAGIC = b"LTREC001"
+# magic, record size in bytes
+RECORD_HEADER = struct.Struct("<8sI")
+RECORD = struct.Struct("<ddfIHHB3x")
+RECORD_FIELDS = ("intended_time", "sent_time", "latency_ms", "config_index", "status", "worker_id", "error")
+
+ERROR_CODES = {None: 0, OUTCOME_TIMEOUT: 1, OUTCOME_CONNECT_ERROR: 2, OUTCOME_RESET: 3, OUTCOME_ERROR: 4,
+               OUTCOME_OVERLOAD: 5, OUTCOME_CANCELLED: 6}
+ERROR_NAMES = {code: name for name, code in ERROR_CODES.items()}
+
+# Records handed to the writer thread at once (256 KiB blocks).
+BLOCK_RECORDS = 8192
+# Blocks queued for the writer before new records are dropped instead of
+# letting a stalled disk grow memory.
+MAX_PENDING_BLOCKS = 64
+
+
+def worker_record_path(path, worker_id):
+    """Per-worker file name: records.bin -> records_1.bin for worker 0."""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{worker_id + 1}{ext}"
+
+
+class RecordWriter:
+    """
+    Appends per-request records to a record log without blocking the event loop.
+
+    append() packs a record into an in-memory block; full blocks (and the
+    partial block on every flush()) are handed to a background thread that
+    writes and flushes them. If the disk falls behind by more than
+    MAX_PENDING_BLOCKS blocks, further records are dropped and counted in
+    dropped_records.
+    """
+
+    def __init__(self, path, worker_id=0, append=False, block_records=BLOCK_RECORDS):
+        self.path = path
+        self.worker_id = worker_id
+        self.dropped_records = 0
+        self.written_records = 0
+        self._block_bytes = block_records * RECORD.size
+        self._buffer = bytearray()
+        self._queue = queue.Queue(maxsize=MAX_PENDING_BLOCKS)
+        self._file = open(path, 'ab' if append else 'wb')
+        if self._file.tell() == 0:
+            self._file.write(RECORD_HEADER.pack(RECORD_MAGIC, RECORD.size))
+        self._thread = threading.Thread(target=self._run, name="record-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def append(self, intended_time, sent_time, latency_ms, config_index, status, error=None):
+        self._buffer += RECORD.pack(intended_time, sent_time, latency_ms, config_index, status,
+                                    self.worker_id, ERROR_CODES[error])
+        if len(self._buffer) >= self._block_bytes:
+            self.flush()
+
+    def flush(self):
+        """Hands the records buffered so far to the writer thread."""
+        if not self._buffer:
+            return
+        block, self._buffer = self._buffer, bytearray()
+        try:
+            self._queue.put_nowait(block)
+        except queue.Full:
+            self.dropped_records += len(block) // RECORD.size
+
+    def close(self, timeout=10.0):
+        """Flushes the remaining records and waits for the writer thread to finish."""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._file.close()
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            self._file.write(block)
+            self._file.flush()
+            self.written_records += len(block) // RECORD.size
+
+
+def read_records(path):
+    """Yields every record of a record log as a tuple in RECORD_FIELDS order."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < RECORD_HEADER.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, record_size = RECORD_HEADER.unpack_from(data)
+            if magic != RECORD_MAGIC or record_size != RECORD.size:
+                raise ValueError(f"{path} is not a record log (or was written by another version)")
+            end = RECORD_HEADER.size + (size - RECORD_HEADER.size) // RECORD.size * RECORD.size
+            with memoryview(data)[RECORD_HEADER.size:end] as records:
+                yield from RECORD.iter_unpack(records)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python recordlog.py <records.bin> [...]  (writes CSV to stdout)")
+        sys.exit(1)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(RECORD_FIELDS)
+    for record_path in sys.argv[1:]:
+        for record in read_records(record_path):
+            writer.writerow(record[:-1] + (ERROR_NAMES[record[-1]] or "",))
@@ -0,0 +1,128 @@
+import json
+import random
+import re
+import time
+
+# --- Request Templates ---
+
+# Placeholders such as {{request_id}} may appear in the url, in header values
+# and anywhere inside string values of the body.
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Request timeout (seconds) when a config entry does not set "timeout".
+DEFAULT_TIMEOUT = 5
+
+_rng = random.Random()
+
+
+def _uuid4():
+    """Random version-4 UUID string; much cheaper than uuid.uuid4() per request."""
+    value = _rng.getrandbits(128) & ~(0xf000 << 64) | (0x4000 << 64)
+    value = value & ~(0xc000 << 48) | (0x8000 << 48)
+    text = '%032x' % value
+    return f"{text[:8]}-{text[8:12]}-{text[12:16]}-{text[16:20]}-{text[20:]}"
+
+
+# Placeholder name -> function(seq) returning the substituted text. Values
+# never contain quotes or backslashes, so they can be spliced into
+# pre-serialised JSON without escaping.
+GENERATORS = {
+    'request_id': lambda seq: _uuid4(),
+    'uuid': lambda seq: _uuid4(),
+    'seq': lambda seq: str(seq),
+    'random_int': lambda seq: str(_rng.getrandbits(31)),
+    'random_hex': lambda seq: '%016x' % _rng.getrandbits(64),
+    'timestamp_ms': lambda seq: str(int(time.time() * 1000)),
+}
+
+
+def _split(text):
+    """
+    Splits a string into alternating literal text and generator functions.
+    Returns None when the string has no placeholders.
+    """
+    parts = []
+    position = 0
+    for match in PLACEHOLDER.finditer(text):
+        name = match.group(1)
+        if name not in GENERATORS:
+            raise ValueError(f"Unknown placeholder {{{{{name}}}}} (expected one of {', '.join(GENERATORS)})")
+        if match.start() > position:
+            parts.append(text[position:match.start()])
+        parts.append(GENERATORS[name])
+        position = match.end()
+    if not parts:
+        return None
+    if position < len(text):
+        parts.append(text[position:])
+    return parts
+
+
+def _header_value(name, value):
+    """Header values may be given as strings or numbers."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"Header {name!r} must be a string or a number, not {type(value).__name__}")
+
+
+def _render(parts, seq):
+    return ''.join(part if isinstance(part, str) else part(seq) for part in parts)
+
+
+class RequestTemplate:
+    """
+    A config entry compiled once at startup into a ready-to-send request.
+
+    The body is serialised to JSON a single time; per request only the
+    placeholder values are generated and spliced in, and static headers are
+    reused as-is.
+    """
+
+    def __init__(self, config, index=0):
+        self.config = config
+        # Position of the entry in the config file (or corpus), for per-request records.
+        self.index = index
+        self.method = config.get("method", "POST" if config.get("body") is not None else "GET").upper()
+        self.timeout = config.get("timeout", DEFAULT_TIMEOUT)
+        self.url = config["url"]
+        # Label used for per-endpoint metrics.
+        self.name = config.get("name") or f"{self.method} {self.url.split('?', 1)[0]}"
+        self._url_parts = _split(self.url)
+
+        if not isinstance(config.get("headers", {}), dict):
+            raise ValueError("headers must be an object")
+        headers = {name: _header_value(name, value) for name, value in config.get("headers", {}).items()}
+        self.body = None
+        self._body_parts = None
+        if config.get("body") is not None:
+            # Header names are case-insensitive: keep a content type given in any case.
+            if not any(name.lower() == "content-type" for name in headers):
+                headers["Content-Type"] = "application/json"
+            text = json.dumps(config["body"], separators=(",", ":"))
+            self._body_parts = _split(text)
+            self.body = text.encode()
+
+        self._dynamic_headers = {}
+        for name, value in headers.items():
+            parts = _split(value)
+            if parts is not None:
+                self._dynamic_headers[name] = parts
+        self.headers = {name: value for name, value in headers.items() if name not in self._dynamic_headers}
+
+    def render(self, seq):
+        """Returns (url, headers, body_bytes) for the request with sequence number `seq`."""
+        url = _render(self._url_parts, seq) if self._url_parts else self.url
+        headers = self.headers
+        if self._dynamic_headers:
+            headers = dict(headers)
+            for name, parts in self._dynamic_headers.items():
+                headers[name] = _render(parts, seq)
+        body = _render(self._body_parts, seq).encode() if self._body_parts else self.body
+        return url, headers, body
+
+
+def compile_configs(configs):
+    """Compiles every config entry into a RequestTemplate."""
+    return [RequestTemplate(config, index) for index, config in enumerate(configs)]
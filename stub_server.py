@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import math
+import random
+import sys
+
+# --- Stub Target Server ---
+
+# A minimal asyncio HTTP/1.1 server used as a local load test target. Every
+# request is answered after an injected latency drawn from a configurable
+# distribution, and a configurable fraction of requests fails with a 503.
+# It runs offline and needs nothing outside the standard library.
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+def latency_sampler(distribution, latency_ms, rng=None):
+    """
+    Returns a function producing injected latencies in ms, all with a mean
+    of `latency_ms`: fixed, uniform on [0, 2 * mean], exponential, or
+    lognormal with sigma 1 (a long right tail).
+    """
+    rng = rng or random.Random()
+    if distribution not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution: {distribution} (expected one of {', '.join(LATENCY_DISTRIBUTIONS)})")
+    if latency_ms <= 0:
+        return lambda: 0.0
+    if distribution == "fixed":
+        return lambda: latency_ms
+    if distribution == "uniform":
+        return lambda: rng.uniform(0.0, 2.0 * latency_ms)
+    if distribution == "exponential":
+        return lambda: rng.expovariate(1.0 / latency_ms)
+    sigma = 1.0
+    mu = math.log(latency_ms) - sigma * sigma / 2
+    return lambda: rng.lognormvariate(mu, sigma)
+
+
+class StubServer:
+    """HTTP/1.1 keep-alive server answering every request with a small JSON body."""
+
+    def __init__(self, latency, error_rate=0.0, body_bytes=16, rng=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = rng or random.Random()
+        body = b'{"ok":true' + b' ' * max(0, body_bytes - 12) + b'}\n'
+        self._ok = self._response(200, "OK", body)
+        self._error = self._response(503, "Service Unavailable", b'{"ok":false}\n')
+        self.requests = 0
+
+    @staticmethod
+    def _response(status, reason, body):
+        return (f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+
+                delay = self.latency()
+                if delay > 0:
+                    await asyncio.sleep(delay / 1000)
+                failed = self.error_rate and self.rng.random() < self.error_rate
+                writer.write(self._error if failed else self._ok)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close" or lines[0].endswith("HTTP/1.0"):
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, ready=None):
+        """Serves forever; calls ready(port) once listening (port 0 picks a free port)."""
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready(port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub HTTP target with latency and error injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 picks a free port")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean injected latency")
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--body-bytes", type=int, default=16, help="size of the success response body")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    stub = StubServer(latency_sampler(args.distribution, args.latency_ms, rng), args.error_rate, args.body_bytes, rng)
+
+    def announce(port):
+        # The first line on stdout announces the port (benchmark.py waits for it).
+        print(f"Stub server listening on {args.host}:{port}", flush=True)
+
+    try:
+        asyncio.run(stub.serve(args.host, args.port, announce))
+    except KeyboardInterrupt:
+        sys.exit(0)
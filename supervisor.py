@@ -0,0 +1,365 @@
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import time
+
+import load_test
+from adaptive import merge_adaptive_results
+from connections import CONNECTION_STATS
+from corpus import ensure_index
+from health import merge_health
+from histogram import LatencyHistogram
+from labels import LabeledLatency
+from phases import PhaseLatency
+from recordlog import worker_record_path
+from traffic_mix import merge_mix_rows
+
+# --- Configuration ---
+
+USAGE = "Usage: python supervisor.py <duration_seconds> <config_file> <total_requests_per_second> [num_workers]"
+
+# Worker log files are named like the ones orchestrate_load_test.sh used to
+# produce, so analyze_logs.py keeps finding them.
+BASE_LOG_NAME = "log"
+# Seconds allowed for workers to spawn and register before the common start.
+STARTUP_GRACE = float(os.environ.get("STARTUP_GRACE", "2.0"))
+# How many times a crashed worker is restarted before it is given up on.
+MAX_RESTARTS = int(os.environ.get("MAX_RESTARTS", "3"))
+# Crashed workers are not restarted with less than this much of the run left.
+MIN_RESTART_SECONDS = 1.0
+# Optional path for the merged result (written when WRITE_LOGS=true).
+MERGED_LOG_FILE = os.environ.get("MERGED_LOG_FILE")
+
+
+# --- Worker Side ---
+
+def split_rate(total_rps, num_workers):
+    """
+    Splits a global target rate across workers.
+    Returns (rps, phase_offset) per worker: every worker runs at the same
+    rate and worker k is shifted by k global inter-arrival gaps, so with
+    constant arrivals the merged stream is evenly spaced instead of N
+    requests landing at the same instant.
+    """
+    per_worker = total_rps / num_workers
+    return [(per_worker, worker_id / total_rps) for worker_id in range(num_workers)]
+
+
+def run_worker(worker_id, num_workers, rps, duration, config_file, start_at, phase_offset, counters, rate_scale, results):
+    """Entry point of a worker process: runs one load_test() and reports its summary."""
+    # The supervisor handles Ctrl+C and terminates workers itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    load_test.configure(duration, f"{BASE_LOG_NAME}_{worker_id + 1}.json", config_file, rps)
+    load_test.WORKER_ID = worker_id
+    load_test.NUM_WORKERS = num_workers
+    load_test.START_AT = start_at
+    load_test.PHASE_OFFSET = phase_offset
+    load_test.SHARED_COUNTERS = counters
+    load_test.RATE_SCALE = rate_scale
+    load_test.QUIET = True
+    # Closed-loop users and explicit search and adaptive rates are global targets too.
+    load_test.VIRTUAL_USERS = load_test.VIRTUAL_USERS // num_workers + (1 if worker_id < load_test.VIRTUAL_USERS % num_workers else 0)
+    load_test.SEARCH_START_RPS /= num_workers
+    load_test.SEARCH_STEP_RPS /= num_workers
+    load_test.SEARCH_MAX_RPS /= num_workers
+    load_test.ADAPTIVE_START_RPS /= num_workers
+    load_test.ADAPTIVE_MIN_RPS /= num_workers
+    load_test.ADAPTIVE_MAX_RPS /= num_workers
+    summary = load_test.run(load_test.load_test())
+    results.put((worker_id, summary))
+
+
+# --- Supervisor Side ---
+
+class Supervisor:
+    """
+    Runs one load_test worker process per core (or a configured number),
+    splits the global target rate between them, prints live totals read from
+    shared memory, restarts crashed workers and merges their results.
+    """
+
+    def __init__(self, duration, config_file, total_rps, num_workers, start_at=None):
+        self.duration = duration
+        self.config_file = config_file
+        self.total_rps = total_rps
+        self.initial_rps = total_rps
+        self.num_workers = num_workers
+        self.context = multiprocessing.get_context("spawn")
+        width = len(load_test.SHARED_COUNTER_FIELDS)
+        self.counters = self.context.Array('q', num_workers * width)
+        # Read by the workers' schedulers on every arrival, so it has no lock;
+        # a single double is written and read atomically.
+        self.rate_scale = self.context.Value('d', 1.0, lock=False)
+        # Counters of crashed worker runs, kept when their slot is reused.
+        self.carried = [[0] * width for _ in range(num_workers)]
+        self.results = self.context.Queue()
+        self.processes = {}
+        self.summaries = []
+        self.restarts = {worker_id: 0 for worker_id in range(num_workers)}
+        self.crashed = []
+        self.failed = set()
+        self.finished = set()
+        self.rates = split_rate(total_rps, num_workers)
+        # Wall-clock start of the schedule; defaults to STARTUP_GRACE after run().
+        self.requested_start_at = start_at
+        self.start_at = None
+
+    def _spawn(self, worker_id, duration, start_at):
+        rps, phase_offset = self.rates[worker_id]
+        process = self.context.Process(
+            target=run_worker,
+            args=(worker_id, self.num_workers, rps, duration, self.config_file, start_at, phase_offset, self.counters,
+                  self.rate_scale, self.results),
+            daemon=True,
+        )
+        process.start()
+        self.processes[worker_id] = process
+
+    def _drain_results(self, wait=0.0):
+        """Collects reported summaries; waits up to `wait` seconds for the first one."""
+        while True:
+            try:
+                worker_id, summary = self.results.get(timeout=wait) if wait else self.results.get_nowait()
+            except queue.Empty:
+                return
+            wait = 0.0
+            if summary is None:
+                print(f"Worker {worker_id} could not start its load test.", flush=True)
+                self.failed.add(worker_id)
+            else:
+                self.summaries.append(summary)
+            self.finished.add(worker_id)
+
+    def _handle_exit(self, worker_id, exitcode):
+        """Restarts or gives up on a worker that exited without reporting a result."""
+        width = len(load_test.SHARED_COUNTER_FIELDS)
+        slot = slice(worker_id * width, (worker_id + 1) * width)
+        self.carried[worker_id] = [a + b for a, b in zip(self.carried[worker_id], self.counters[slot])]
+        self.counters[slot] = [0] * width
+        self.crashed.append({'worker_id': worker_id, 'exitcode': exitcode, 'time': time.time()})
+
+        remaining = self.start_at + self.duration - time.time()
+        if self.restarts[worker_id] >= MAX_RESTARTS or remaining < MIN_RESTART_SECONDS:
+            print(f"Worker {worker_id} crashed (exit code {exitcode}); not restarting.", flush=True)
+            self.failed.add(worker_id)
+            self.finished.add(worker_id)
+            return
+        self.restarts[worker_id] += 1
+        print(f"Worker {worker_id} crashed (exit code {exitcode}); restarting for the remaining {remaining:.1f}s.", flush=True)
+        self._spawn(worker_id, remaining, time.time())
+
+    def set_rate(self, total_rps):
+        """Changes the global target rate of the running open-loop workers."""
+        self.total_rps = total_rps
+        self.rate_scale.value = total_rps / self.initial_rps if total_rps > 0 else 0.0
+
+    def stop(self):
+        """Ends the run early: workers stop scheduling, drain and report as usual."""
+        self.rate_scale.value = 0.0
+
+    def live_totals(self):
+        """Sums the counters all workers have published to shared memory."""
+        width = len(load_test.SHARED_COUNTER_FIELDS)
+        values = self.counters[:]
+        totals = [0] * width
+        for worker_id in range(self.num_workers):
+            for field in range(width):
+                totals[field] += values[worker_id * width + field] + self.carried[worker_id][field]
+        return dict(zip(load_test.SHARED_COUNTER_FIELDS, totals))
+
+    def run(self):
+        print(
+            f"Starting {self.num_workers} worker(s): {self.total_rps:g} RPS total "
+            f"({self.total_rps / self.num_workers:g} RPS each) for {self.duration} seconds.",
+            flush=True
+        )
+        if load_test.CORPUS_FILE:
+            # Index the corpus once here instead of racing to build it in every worker.
+            count = ensure_index(load_test.CORPUS_FILE)
+            print(f"Corpus {load_test.CORPUS_FILE}: {count} requests, sharded across workers.", flush=True)
+        if load_test.RECORD_LOG:
+            # Workers append to their record logs so restarts keep earlier records; start from empty files.
+            for worker_id in range(self.num_workers):
+                path = worker_record_path(load_test.RECORD_LOG, worker_id)
+                if os.path.exists(path):
+                    os.remove(path)
+        self.start_at = self.requested_start_at or time.time() + STARTUP_GRACE
+        for worker_id in range(self.num_workers):
+            self._spawn(worker_id, self.duration, self.start_at)
+
+        previous_total = 0
+        try:
+            while len(self.finished) < self.num_workers:
+                time.sleep(1)
+                exited = [(worker_id, process.exitcode) for worker_id, process in self.processes.items()
+                          if worker_id not in self.finished and process.exitcode is not None]
+                # A worker that just exited may still be flushing its result.
+                self._drain_results(wait=0.5 if exited else 0.0)
+                for worker_id, exitcode in exited:
+                    if worker_id not in self.finished:
+                        self._handle_exit(worker_id, exitcode)
+
+                totals = self.live_totals()
+                if time.time() >= self.start_at:
+                    alive = sum(1 for process in self.processes.values() if process.is_alive())
+                    print(
+                        f"Time: {int(time.time() - self.start_at)}s, "
+                        f"Workers alive: {alive}/{self.num_workers}, "
+                        f"Total Reqs: {totals['total_requests']}, "
+                        f"Success: {totals['success_count']}, "
+                        f"Failure: {totals['failure_count']}, "
+                        f"RPS: {totals['total_requests'] - previous_total}",
+                        flush=True
+                    )
+                previous_total = totals['total_requests']
+        finally:
+            for process in self.processes.values():
+                if process.is_alive():
+                    process.terminate()
+            for process in self.processes.values():
+                process.join(5)
+
+        return self.merged_summary()
+
+    def merged_summary(self):
+        """Merges all worker summaries into one summary with the load_test.build_summary() layout."""
+        latency = LatencyHistogram()
+        labels = LabeledLatency()
+        phases = PhaseLatency()
+        for summary in self.summaries:
+            latency.merge(LatencyHistogram.from_dict(summary['latency_histogram']))
+            labels.merge_list(summary.get('labels', []))
+            phases.merge_dict(summary.get('phases') or {})
+        totals = {field: sum(summary[key] for summary in self.summaries) for field, key in
+                  (('total_requests', 'total_attempted_requests'), ('success_count', 'successful_requests'),
+                   ('failure_count', 'failed_requests'))}
+        # Requests made by crashed runs are only known through their shared counters.
+        for carried in self.carried:
+            for field, value in zip(load_test.SHARED_COUNTER_FIELDS, carried):
+                totals[field] += value
+
+        connection_totals = {key: sum(summary.get(key, 0) for summary in self.summaries) for key in CONNECTION_STATS}
+        overload_totals = {key: sum(summary.get(key, 0) for summary in self.summaries)
+                           for key in ('dropped_requests', 'drain_cancelled')}
+
+        # The longest worker run, not the time until now: that would include
+        # collecting the results and joining the worker processes.
+        durations = [summary['actual_duration_instance'] for summary in self.summaries]
+        total_duration = max(durations) if durations else time.time() - self.start_at
+        actual_rps = totals['success_count'] / total_duration if total_duration > 0 else 0
+        tp50, tp90, tp95, tp99 = latency.percentiles([0.50, 0.90, 0.95, 0.99])
+        merged = {
+            "target_rps_instance": self.total_rps,
+            "load_mode": load_test.LOAD_MODE,
+            "arrival_mode": load_test.ARRIVAL_MODE,
+            "target_duration_instance": self.duration,
+            "actual_duration_instance": float(f"{total_duration:.2f}"),
+            "successful_requests": totals['success_count'],
+            "failed_requests": totals['failure_count'],
+            "total_attempted_requests": totals['total_requests'],
+            "actual_rps_instance": float(f"{actual_rps:.2f}"),
+            "tp50_ms": float(f"{tp50:.2f}"),
+            "tp90_ms": float(f"{tp90:.2f}"),
+            "tp95_ms": float(f"{tp95:.2f}"),
+            "tp99_ms": float(f"{tp99:.2f}"),
+            **connection_totals,
+            # The in-flight limit applies to each worker.
+            "max_in_flight": load_test.MAX_IN_FLIGHT,
+            "overload_policy": load_test.OVERLOAD_POLICY,
+            **overload_totals,
+            "labels": labels.to_list(),
+            "phases": phases.to_dict() if load_test.PHASE_TIMING else None,
+            "health": merge_health([summary.get('health') for summary in self.summaries]),
+            "latency_histogram": latency.to_dict(),
+            "workers": self.num_workers,
+            "failed_workers": sorted(self.failed),
+            "restarts": sum(self.restarts.values()),
+            "crashes": self.crashed,
+        }
+        if load_test.LOAD_MODE == "closed":
+            merged["virtual_users"] = load_test.VIRTUAL_USERS
+            merged["think_time_ms"] = load_test.THINK_TIME_MS
+        searches = [summary["search"] for summary in self.summaries if "search" in summary]
+        if searches:
+            merged["search"] = merge_search_results(searches)
+        adaptives = [summary["adaptive"] for summary in self.summaries if "adaptive" in summary]
+        if adaptives:
+            merged["adaptive"] = merge_adaptive_results(adaptives)
+        mixes = [summary["mix"] for summary in self.summaries if summary.get("mix")]
+        if mixes:
+            merged["mix_mode"] = load_test.MIX_MODE
+            merged["mix"] = merge_mix_rows(mixes, total_duration,
+                                           self.total_rps if load_test.LOAD_MODE == "open" else None)
+        return merged
+
+
+def merge_search_results(searches):
+    """
+    Combines the per-worker saturation searches step by step. Rates and
+    request counts add up; a step passes only if it passed on every worker,
+    and its p50/p99 are the worst worker's values.
+    """
+    steps = []
+    for index in range(max(len(search["steps"]) for search in searches)):
+        worker_steps = [search["steps"][index] for search in searches if index < len(search["steps"])]
+        requests = sum(step["requests"] for step in worker_steps)
+        errors = sum(step["error_rate"] * step["requests"] for step in worker_steps)
+        steps.append({
+            "target_rps": round(sum(step["target_rps"] for step in worker_steps), 2),
+            "achieved_rps": round(sum(step["achieved_rps"] for step in worker_steps), 2),
+            "requests": requests,
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "tp50_ms": max(step["tp50_ms"] for step in worker_steps),
+            "tp99_ms": max(step["tp99_ms"] for step in worker_steps),
+            "passed": len(worker_steps) == len(searches) and all(step["passed"] for step in worker_steps),
+        })
+    passing = [step for step in steps if step["passed"]]
+    reasons = sorted({search["knee_reason"] for search in searches})
+    return {
+        "steps": steps,
+        "max_sustainable_rps": passing[-1]["achieved_rps"] if passing else 0.0,
+        "max_sustainable_target_rps": passing[-1]["target_rps"] if passing else 0.0,
+        "knee_reason": ", ".join(reasons),
+    }
+
+
+def handle_sigterm(signum, frame):
+    """Turns SIGTERM (e.g. /api/stop_test) into a normal exit so workers are cleaned up."""
+    raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print(USAGE)
+        sys.exit(1)
+    duration = int(sys.argv[1])
+    config_file = sys.argv[2]
+    total_rps = float(sys.argv[3])
+    num_workers = int(sys.argv[4]) if len(sys.argv) > 4 else (os.cpu_count() or 1)
+    if total_rps <= 0 or num_workers < 1:
+        print("Error: total_requests_per_second and num_workers must be positive.", flush=True)
+        sys.exit(1)
+
+    # Validates the config once here; an invalid one would otherwise exit every worker on start, over and over.
+    load_test.configure(duration, MERGED_LOG_FILE, config_file, total_rps)
+    total_rps = load_test.mix_rate(total_rps)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    supervisor = Supervisor(duration, config_file, total_rps, num_workers)
+    try:
+        merged = supervisor.run()
+    except KeyboardInterrupt:
+        print("\nLoad test interrupted by user.", flush=True)
+        sys.exit(1)
+
+    load_test.print_summary(merged)
+    print(f"Workers: {merged['workers']}, Restarts: {merged['restarts']}, Failed workers: {merged['failed_workers'] or 'none'}")
+    if merged['failed_workers']:
+        print("Warning: some workers did not finish; latency percentiles only cover completed workers.")
+    if MERGED_LOG_FILE and os.environ.get("WRITE_LOGS", "false").lower() == "true":
+        with open(MERGED_LOG_FILE, "w") as f:
+            json.dump(merged, f, indent=4)
+        print(f"\nMerged log data written in JSON format to {MERGED_LOG_FILE}")
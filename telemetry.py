@@ -0,0 +1,121 @@
+import gzip
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- Telemetry Reporting ---
+
+# Frames kept for retry while the server is unreachable. Older frames are
+# dropped first; the server notices the gap through the sequence numbers.
+MAX_PENDING_FRAMES = 120
+
+
+class TelemetryReporter:
+    """
+    Ships per-interval metric deltas to the dashboard server from a
+    background thread.
+
+    The load generator calls submit() with a small dict describing one
+    interval (counter deltas plus that interval's latency histogram). Frames
+    are numbered, batched, gzip-compressed and POSTed to /api/telemetry over a
+    single pooled keep-alive connection. Frames that fail to send are retried
+    with the next batch, so the payload size depends on the reporting
+    interval and never on how long the test has been running.
+    """
+
+    def __init__(self, server_url, request_id, timeout=2.0, max_pending=MAX_PENDING_FRAMES):
+        self.url = f"{server_url}/api/telemetry"
+        self.request_id = request_id
+        self.timeout = timeout
+        self.sent_frames = 0
+        self.dropped_frames = 0
+        self._seq = 0
+        self._inbox = queue.SimpleQueue()
+        self._pending = deque()
+        self._max_pending = max_pending
+        self._stopping = threading.Event()
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, frame):
+        """Queues one interval's delta for sending. Never blocks."""
+        frame = dict(frame, seq=self._seq)
+        self._seq += 1
+        self._inbox.put(frame)
+
+    def stop(self, timeout=5.0):
+        """Flushes remaining frames (best effort) and stops the sender thread."""
+        self._stopping.set()
+        self._inbox.put(None)
+        self._thread.join(timeout)
+        self._session.close()
+
+    def _collect(self, block):
+        """Moves frames from the inbox into the pending batch."""
+        try:
+            frame = self._inbox.get(block=block)
+            while True:
+                if frame is not None:
+                    self._pending.append(frame)
+                    if len(self._pending) > self._max_pending:
+                        self._pending.popleft()
+                        self.dropped_frames += 1
+                frame = self._inbox.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _send_pending(self):
+        if not self._pending:
+            return True
+        batch = list(self._pending)
+        body = gzip.compress(json.dumps({'request_id': self.request_id, 'frames': batch}).encode())
+        try:
+            response = self._session.post(
+                self.url, data=body, timeout=self.timeout,
+                headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'},
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            # Keep the frames and retry with the next batch.
+            return False
+        for _ in batch:
+            self._pending.popleft()
+        self.sent_frames += len(batch)
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._collect(block=True)
+            if not self._send_pending():
+                # Back off briefly so an unreachable server is not hammered.
+                self._stopping.wait(1.0)
+        # Final flush after stop(): one more attempt for anything left.
+        self._collect(block=False)
+        self._send_pending()
+
+
+class IntervalStats:
+    """Tracks cumulative counters and returns the delta since the previous call."""
+
+    def __init__(self):
+        self._last = {}
+        self._last_time = time.time()
+
+    def delta(self, counters):
+        now = time.time()
+        frame = {key: value - self._last.get(key, 0) for key, value in counters.items()}
+        frame['interval_start'] = self._last_time
+        frame['interval_end'] = now
+        self._last = dict(counters)
+        self._last_time = now
+        return frame
@@ -0,0 +1,174 @@
+import heapq
+import random
+
+# --- Weighted Traffic Mix ---
+
+# Config entries may set either a relative "weight" (default 1) or an
+# absolute "rps" target. When every entry sets "rps", their sum is the
+# run's rate in open-loop mode (see absolute_rate()). Otherwise entries
+# with "rps" get that rate out of the run's total rate and the remaining
+# rate is split between the other entries by weight; "rps" targets adding
+# up to more than the total rate are scaled to fit, with a warning. In the
+# closed-loop, search and adaptive modes the rate is not fixed, so the
+# targets only set the proportions of the traffic.
+#
+# Requests are assigned to entries by one of two O(1) selectors:
+#   "interleave" - deterministic: a cycle of CYCLE_LENGTH slots is
+#                  precomputed at startup by stride scheduling, so every
+#                  entry's requests are spread evenly in time and its share
+#                  is exact over every cycle (equal weights give plain
+#                  round-robin)
+#   "random"     - an independent weighted draw per request from an alias
+#                  table (Vose's method), for mixes without a fixed pattern
+MIX_MODES = ("interleave", "random")
+# Slots in the precomputed interleave cycle; shares are exact to 1 / CYCLE_LENGTH.
+CYCLE_LENGTH = 10000
+
+
+def absolute_rate(configs):
+    """The sum of the "rps" targets when every config entry sets one, otherwise None."""
+    if not configs or any(config.get("rps") is None for config in configs):
+        return None
+    return sum(float(config["rps"]) for config in configs)
+
+
+def mix_shares(configs, total_rps):
+    """
+    Target share of each config entry (summing to 1) from its "weight" or
+    "rps". Returns (shares, warning or None).
+    """
+    absolute = [float(config["rps"]) if config.get("rps") is not None else None for config in configs]
+    weights = [float(config.get("weight", 1.0)) for config in configs]
+    if any(value is not None and value < 0 for value in absolute) or any(weight < 0 for weight in weights):
+        raise ValueError("Config weights and rps targets must not be negative")
+    absolute_total = sum(value for value in absolute if value is not None)
+    weighted = [weight if value is None else 0.0 for value, weight in zip(absolute, weights)]
+    warning = None
+
+    if all(value is not None for value in absolute):
+        # Every entry has a target: the targets themselves give the proportions.
+        absolute_share = 1.0
+    else:
+        absolute_share = absolute_total / total_rps if total_rps > 0 else 1.0
+        if absolute_share > 1:
+            warning = (f"Config rps targets add up to {absolute_total:g} RPS but the run's rate is {total_rps:g} RPS; "
+                       f"they are scaled to fit and entries without one get no requests")
+            absolute_share = 1.0
+    shares = []
+    weighted_total = sum(weighted)
+    for value, weight in zip(absolute, weighted):
+        if value is not None:
+            shares.append(absolute_share * value / absolute_total if absolute_total else 0.0)
+        else:
+            shares.append((1 - absolute_share) * weight / weighted_total if weighted_total else 0.0)
+    if not any(shares):
+        raise ValueError("Every config entry has a zero weight")
+    return shares, warning
+
+
+def interleave_cycle(shares, length=CYCLE_LENGTH):
+    """
+    Precomputes an interleaved cycle of entry indices whose counts match
+    the shares (to 1 / length): every entry is due again 1 / count of the
+    cycle after its previous slot, and the entry due first is taken next.
+    """
+    # Integer slot counts by largest remainder; every entry with a share keeps at least one slot.
+    exact = [share * length for share in shares]
+    counts = [max(1, int(value)) if share > 0 else 0 for value, share in zip(exact, shares)]
+    for index in sorted(range(len(shares)), key=lambda i: exact[i] - int(exact[i]), reverse=True):
+        if sum(counts) >= length:
+            break
+        if shares[index] > 0:
+            counts[index] += 1
+    # Entries start half a stride in so that rare ones are spread over the cycle, not packed at its start.
+    due = [(0.5 / count, index) for index, count in enumerate(counts) if count]
+    heapq.heapify(due)
+    cycle = []
+    for _ in range(sum(counts)):
+        at, index = heapq.heappop(due)
+        cycle.append(index)
+        heapq.heappush(due, (at + 1 / counts[index], index))
+    return cycle
+
+
+class AliasTable:
+    """Vose's alias method: O(1) weighted random draws."""
+
+    def __init__(self, shares, rng=None):
+        self.rng = rng or random.Random()
+        count = len(shares)
+        scaled = [share * count / sum(shares) for share in shares]
+        self.probability = [0.0] * count
+        self.alias = list(range(count))
+        small = [index for index, value in enumerate(scaled) if value < 1]
+        large = [index for index, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1 - scaled[low]
+            (small if scaled[high] < 1 else large).append(high)
+        for index in small + large:
+            self.probability[index] = 1.0
+
+    def draw(self):
+        value = self.rng.random() * len(self.probability)
+        index = int(value)
+        return index if value - index < self.probability[index] else self.alias[index]
+
+
+class TrafficMix:
+    """Chooses the config entry of every request according to the configured shares."""
+
+    def __init__(self, configs, total_rps, mode="interleave", rng=None):
+        if mode not in MIX_MODES:
+            raise ValueError(f"Unknown mix mode: {mode} (expected one of {', '.join(MIX_MODES)})")
+        self.mode = mode
+        self.shares, self.warning = mix_shares(configs, total_rps)
+        if mode == "interleave":
+            self._cycle = interleave_cycle(self.shares)
+            self._alias = None
+        else:
+            self._cycle = None
+            self._alias = AliasTable(self.shares, rng)
+
+    def pick(self, seq):
+        """Index of the config entry for the request with sequence number `seq`."""
+        if self._cycle is not None:
+            return self._cycle[seq % len(self._cycle)]
+        return self._alias.draw()
+
+
+def mix_rows(names, shares, sent, duration, total_rps=None):
+    """
+    Target vs achieved share and rate of every config entry. Without a fixed
+    total rate (closed-loop, search and adaptive modes) the target rates are
+    the shares of the rate actually sent.
+    """
+    total_sent = sum(sent)
+    if total_rps is None:
+        total_rps = total_sent / duration if duration > 0 else 0.0
+    return [{
+        "index": index,
+        "endpoint": name,
+        "target_share": round(share, 4),
+        "target_rps": round(share * total_rps, 2),
+        "sent": count,
+        "achieved_share": round(count / total_sent, 4) if total_sent else 0.0,
+        "achieved_rps": round(count / duration, 2) if duration > 0 else 0.0,
+    } for index, (name, share, count) in enumerate(zip(names, shares, sent))]
+
+
+def merge_mix_rows(row_lists, duration, total_rps=None):
+    """Combines the per-worker mix rows of a supervisor run (request counts add up)."""
+    first = row_lists[0]
+    sent = [sum(rows[index]["sent"] for rows in row_lists) for index in range(len(first))]
+    return mix_rows([row["endpoint"] for row in first], [row["target_share"] for row in first], sent, duration, total_rps)
+
+
+def print_mix_rows(rows):
+    print("\n--- Traffic Mix ---")
+    print(f"{'Endpoint':<40} {'Target %':>9} {'Actual %':>9} {'Target RPS':>11} {'Actual RPS':>11} {'Sent':>9}")
+    for row in rows:
+        print(f"{row['endpoint'][:40]:<40} {row['target_share'] * 100:>8.2f}% {row['achieved_share'] * 100:>8.2f}% "
+              f"{row['target_rps']:>11.2f} {row['achieved_rps']:>11.2f} {row['sent']:>9}")
@@ -0,0 +1,250 @@
+import queue
+import time
+from collections import deque
+
+from histogram import LatencyHistogram
+from labels import LabeledLatency
+from phases import PhaseLatency
+
+# --- Incremental Metrics Aggregation ---
+
+# Closed one-second windows kept globally (5 minutes) and per client (1 minute).
+WINDOW_HISTORY = 300
+CLIENT_WINDOW_HISTORY = 60
+
+COUNTERS = ('total_requests', 'success_count', 'failure_count', 'dropped_count')
+
+
+def new_window(start):
+    # 'labels' maps (endpoint, outcome) to the number of requests in the window.
+    return {'start': start, 'total_requests': 0, 'success_count': 0, 'failure_count': 0, 'dropped_count': 0,
+            'latency': LatencyHistogram(), 'labels': {}, 'phases': PhaseLatency()}
+
+
+class ClientState:
+    """Per-generator state: sequence tracking, totals and a ring buffer of windows."""
+
+    def __init__(self, now):
+        self.last_seq = -1
+        self.lost_frames = 0
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.window = new_window(now)
+        self.windows = deque(maxlen=CLIENT_WINDOW_HISTORY)
+        # Older clients send cumulative snapshots; only the latest one is kept.
+        self.legacy_latency = None
+        # Latest generator self-health sample (health.GeneratorHealth.sample()).
+        self.health = None
+
+
+class MetricsAggregator:
+    """
+    Aggregates generator telemetry into per-second windows without a global lock.
+
+    Request handlers only parse their payload and put it on a queue
+    (submit_*), so ingestion never waits for aggregation. The aggregator
+    thread calls tick() once per second: it drains the queue, applies each
+    delta to its client and to the global totals incrementally, closes the
+    current window into the ring buffers and publishes a new snapshot.
+    The first window of a run starts when the run starts, and when the run
+    ends (its last client shut down) the data drained after the shutdown is
+    closed into one final window and published with test_running false.
+    Percentiles come from merging the window's latency histograms; nothing
+    is re-summed or sorted across the whole run.
+    """
+
+    def __init__(self):
+        self._inbox = queue.SimpleQueue()
+        self.clients = {}
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.lost_frames = 0
+        self.labels = LabeledLatency()
+        self.saturated_windows = 0
+        self.window = new_window(time.time())
+        self.windows = deque(maxlen=WINDOW_HISTORY)
+        self.latest_snapshot = {}
+        # Whether the previous tick saw a running test.
+        self._running = False
+
+    # Called from request handler threads; never block on aggregation.
+
+    def submit_frames(self, request_id, frames):
+        """Queues delta frames whose latency histograms were already decoded."""
+        self._inbox.put(('frames', request_id, frames))
+
+    def submit_snapshot(self, request_id, counters, latency):
+        """Queues a cumulative snapshot from an older client."""
+        self._inbox.put(('snapshot', request_id, (counters, latency)))
+
+    def register(self, request_id):
+        self._inbox.put(('register', request_id, None))
+
+    def reset(self):
+        """Drops all clients and windows (processed in order with pending data)."""
+        self.latest_snapshot = {}
+        self._inbox.put(('reset', None, None))
+
+    # Aggregator thread only.
+
+    def _client(self, request_id):
+        client = self.clients.get(request_id)
+        if client is None:
+            client = self.clients[request_id] = ClientState(self.window['start'])
+        return client
+
+    def _add(self, client, counts, latency):
+        for key in COUNTERS:
+            value = counts.get(key, 0)
+            client.totals[key] += value
+            client.window[key] += value
+            self.totals[key] += value
+            self.window[key] += value
+        if latency is not None and latency.count:
+            client.window['latency'].merge(latency)
+            self.window['latency'].merge(latency)
+
+    def _apply_frames(self, client, frames):
+        """Frames are numbered by the client: duplicates (retries) are ignored and gaps counted as lost."""
+        for frame in sorted(frames, key=lambda frame: frame['seq']):
+            seq = frame['seq']
+            if seq <= client.last_seq:
+                continue
+            lost = seq - client.last_seq - 1
+            client.lost_frames += lost
+            self.lost_frames += lost
+            client.last_seq = seq
+            self._add(client, frame, frame.get('latency_histogram'))
+            self._add_labels(frame.get('labels', []))
+            self.window['phases'].merge_dict(frame.get('phases', {}))
+            if frame.get('health'):
+                client.health = frame['health']
+
+    def _add_labels(self, entries):
+        self.labels.merge_list(entries)
+        window_labels = self.window['labels']
+        for entry in entries:
+            key = (entry['endpoint'], entry['outcome'])
+            window_labels[key] = window_labels.get(key, 0) + entry['latency_histogram'].count
+
+    def _apply_snapshot(self, client, counters, latency):
+        delta = {key: counters.get(key, 0) - client.totals[key] for key in COUNTERS}
+        self._add(client, delta, None)
+        client.legacy_latency = latency
+
+    def _drain(self):
+        while True:
+            try:
+                kind, request_id, payload = self._inbox.get_nowait()
+            except queue.Empty:
+                return
+            if kind == 'reset':
+                self.clients = {}
+                self.totals = dict.fromkeys(COUNTERS, 0)
+                self.lost_frames = 0
+                self.labels = LabeledLatency()
+                self.saturated_windows = 0
+                self.window = new_window(time.time())
+                self.windows.clear()
+                self._running = False
+            elif kind == 'register':
+                self._client(request_id)
+            elif kind == 'frames':
+                self._apply_frames(self._client(request_id), payload)
+            elif kind == 'snapshot':
+                self._apply_snapshot(self._client(request_id), *payload)
+
+    def _generator_health(self):
+        """Worst-case health across generators; in-flight and RSS are summed."""
+        samples = [client.health for client in self.clients.values() if client.health]
+        if not samples:
+            return None
+        reasons = sorted({reason for sample in samples for reason in sample['reasons']})
+        return {
+            'loop_lag_p99_ms': max(sample['loop_lag_p99_ms'] for sample in samples),
+            'send_skew_p99_ms': max(sample['send_skew_p99_ms'] for sample in samples),
+            'cpu_percent': max(sample['cpu_percent'] for sample in samples),
+            'in_flight': sum(sample['in_flight'] for sample in samples),
+            'rss_mb': round(sum(sample['rss_mb'] for sample in samples), 1),
+            'saturated_generators': sum(1 for sample in samples if sample['saturated']),
+            'saturated': bool(reasons),
+            'reasons': reasons,
+        }
+
+    def _close_window(self, now):
+        for client in self.clients.values():
+            if client.legacy_latency is not None:
+                self.window['latency'].merge(client.legacy_latency)
+                client.legacy_latency = None
+            client.window['end'] = now
+            # Closed client windows keep only the non-empty buckets.
+            client.window['latency'] = client.window['latency'].to_dict()
+            del client.window['phases']
+            client.windows.append(client.window)
+            client.window = new_window(now)
+        closed = self.window
+        closed['end'] = now
+        self.windows.append(closed)
+        self.window = new_window(now)
+        return closed
+
+    def _start_window(self, start):
+        if self.window['start'] < start:
+            self.window['start'] = start
+        for client in self.clients.values():
+            if client.window['start'] < start:
+                client.window['start'] = start
+
+    def tick(self, test_config):
+        """
+        Applies queued data, closes the current window and publishes a
+        snapshot. Returns None while no test runs, except for the final
+        snapshot of the tick that sees a run end.
+        """
+        self._drain()
+        was_running, self._running = self._running, test_config['test_running']
+        if not self._running and not was_running:
+            return None
+        if self._running and not was_running and test_config['start_time'] is not None:
+            # The idle time since the previous run (or reset) is not part of this run's first window.
+            self._start_window(test_config['start_time'])
+        now = time.time()
+        window = self._close_window(now)
+
+        if test_config['start_time'] is not None:
+            elapsed_time = now - test_config['start_time']
+            avg_rps = self.totals['total_requests'] / elapsed_time if elapsed_time > 0 else 0
+        else:
+            avg_rps = 0
+        tp50, tp95, tp99 = window['latency'].percentiles([0.50, 0.95, 0.99])
+        # Cumulative per-label percentiles plus this window's per-label rate.
+        labels = self.labels.rows()
+        for row in labels:
+            row['rps'] = window['labels'].get((row['endpoint'], row['outcome']), 0)
+        generator = self._generator_health()
+        if generator and generator['saturated']:
+            self.saturated_windows += 1
+
+        self.latest_snapshot = {
+            'test_config': test_config,
+            'metrics': {
+                'total_requests': self.totals['total_requests'],
+                'success_count': self.totals['success_count'],
+                'failure_count': self.totals['failure_count'],
+                'dropped_count': self.totals['dropped_count'],
+                'avg_rps': round(avg_rps, 2),
+                'tp50': round(tp50, 2),
+                'tp95': round(tp95, 2),
+                'tp99': round(tp99, 2),
+                'total_rps': round(window['total_requests'], 2),
+                'success_rps': round(window['success_count'], 2),
+                'failure_rps': round(window['failure_count'], 2),
+                'dropped_rps': round(window['dropped_count'], 2),
+                'telemetry_lost_frames': self.lost_frames,
+                'labels': labels,
+                'phases': window['phases'].rows(),
+                'generator': generator,
+                'generator_saturated_windows': self.saturated_windows,
+                'clients': len(self.clients),
+                'window_end': now,
+            }
+        }
+        return self.latest_snapshot
@@ -1,94 +1,74 @@
 import sys
+import json
 import time
 import threading
 import uuid
 import subprocess
 import os
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from aggregator import MetricsAggregator
+from controller import DEFAULT_START_LEAD, AgentController, ControllerError
+from history import RESOLUTIONS, RunHistory
+from ingest import PayloadError, parse_snapshot_body, parse_telemetry
+from stream import SnapshotBroadcaster
 
 app = Flask(__name__)
 
 # --- Global State Management ---
+# Only the test lifecycle lives under state_lock; metrics are owned by the
+# aggregator thread and fed through its queue.
 state = {
     'test_config': {'start_time': None, 'duration': None, 'test_running': False},
-    'metrics': {},
     'running_requests': {}
 }
-latest_snapshot = {}
 state_lock = threading.Lock()
+aggregator = MetricsAggregator()
+broadcaster = SnapshotBroadcaster()
+controller = AgentController()
 active_process = None
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# SQLite run history (see history.py); set HISTORY_DB to an empty string to disable it.
+HISTORY_DB = os.environ.get('HISTORY_DB', os.path.join(ROOT_DIR, 'history.db'))
+history = RunHistory(HISTORY_DB) if HISTORY_DB else None
 
 # --- Business Logic ---
-def calculate_percentile(latencies, percentile):
-    if not latencies: return 0
-    sorted_latencies = sorted(latencies)
-    index = int(len(sorted_latencies) * percentile)
-    index = max(0, min(index, len(sorted_latencies) - 1))
-    return sorted_latencies[index]
-
 def aggregate_metrics_periodically():
-    """Periodically calculates metrics and stores them in a snapshot."""
-    global latest_snapshot
+    """Ticks the aggregator once per second, aligned to wall-clock seconds."""
+    next_tick = time.time()
     while True:
-        time.sleep(1)
+        next_tick += 1
+        time.sleep(max(0.0, next_tick - time.time()))
         with state_lock:
             if not state['running_requests']:
                 state['test_config']['test_running'] = False
-                
-
-            if not state['test_config']['test_running']:
-                continue
-
-            total_requests = sum(m['total_requests'] for m in state['metrics'].values())
-            success_count = sum(m['success_count'] for m in state['metrics'].values())
-            failure_count = sum(m['failure_count'] for m in state['metrics'].values())
-            latencies = []
-            for m in state['metrics'].values():
-                latencies.extend(m['latencies'])
-
-            prev_total = sum(m['prev_total'] for m in state['metrics'].values())
-            prev_success = sum(m['prev_success'] for m in state['metrics'].values())
-            prev_failure = sum(m['prev_failure'] for m in state['metrics'].values())
-
-            # Calculate per-second rates
-            total_rate = total_requests - prev_total
-            success_rate = success_count - prev_success
-            failure_rate = failure_count - prev_failure
-
-            for request_id in state['metrics']:
-                state['metrics'][request_id]['prev_total'] = state['metrics'][request_id]['total_requests']
-                state['metrics'][request_id]['prev_success'] = state['metrics'][request_id]['success_count']
-                state['metrics'][request_id]['prev_failure'] = state['metrics'][request_id]['failure_count']
-
-            # Calculate average RPS
-            if state['test_config']['start_time'] is not None:
-                elapsed_time = time.time() - state['test_config']['start_time']
-                avg_rps = total_requests / elapsed_time   # Prevent division by zero
-            else:
-                avg_rps = 0
-
-            # Calculate percentiles
-            tp50 = calculate_percentile(latencies, 0.50)
-            tp95 = calculate_percentile(latencies, 0.95)
-            tp99 = calculate_percentile(latencies, 0.99)
-            
-            latest_snapshot = {
-                'test_config': state['test_config'],
-                'metrics': {
-                    'total_requests': total_requests,
-                    'success_count': success_count,
-                    'failure_count': failure_count,
-                    'avg_rps': round(avg_rps, 2),
-                    'tp50': round(tp50, 2), 
-                    'tp95': round(tp95, 2), 
-                    'tp99': round(tp99, 2),
-                    'total_rps': round(total_rate, 2), 
-                    'success_rps': round(success_rate, 2), 
-                    'failure_rps': round(failure_rate, 2),
-                }
-            }
-            for request_id in state['metrics']:
-                state['metrics'][request_id]['latencies'] = []
+            test_config = dict(state['test_config'])
+        snapshot = aggregator.tick(test_config)
+        if snapshot:
+            broadcaster.publish(snapshot)
+        if history is not None:
+            record_history(snapshot)
+
+def record_history(snapshot):
+    """Stores the window just closed; a run ends with the final window after its clients are gone."""
+    if snapshot:
+        if history.run_id is None:
+            # Clients started outside the dashboard (load_test.py, supervisor.py).
+            history.begin_run({'mode': 'external'})
+        history.record_window(aggregator.windows[-1])
+        if not snapshot['test_config']['test_running']:
+            history.end_run()
+    elif history.run_id is not None and history.has_windows():
+        history.end_run()
+
+def reset_test_state():
+    """Clears the test lifecycle and all aggregated metrics."""
+    with state_lock:
+        state['running_requests'] = {}
+        state['test_config'] = {'start_time': None, 'duration': None, 'test_running': False}
+    aggregator.reset()
+    broadcaster.reset()
 
 # --- API Endpoints ---
 @app.route('/')
@@ -100,12 +80,9 @@ def index():
 @app.route('/api/register', methods=['POST'])
 def register():
     """Registers a new load test client and returns a unique ID."""
+    request_id = str(uuid.uuid4())
+    aggregator.register(request_id)
     with state_lock:
-        request_id = str(uuid.uuid4())
-        state['metrics'][request_id] = {
-            'total_requests': 0, 'success_count': 0, 'failure_count': 0,
-            'latencies': [], 'prev_total': 0, 'prev_success': 0, 'prev_failure': 0,
-        }
         state['running_requests'][request_id] = True
         if not state['test_config']['test_running'] or state['running_requests'][request_id] == False:
             state['test_config']['start_time'] = time.time()
@@ -121,55 +98,64 @@ def shutdown():
             del state['running_requests'][request_id]
     return jsonify({"status": "ok"})
 
+@app.route('/api/telemetry', methods=['POST'])
+@app.route('/api/ingest', methods=['POST'])
+def telemetry():
+    """Receives per-interval delta frames from one or (batched) many load test clients."""
+    # Decode histograms here, in the request thread, so the aggregator only merges.
+    try:
+        batches = parse_telemetry(request.get_data(), request.mimetype, request.headers.get('Content-Encoding'))
+    except PayloadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    for request_id, frames in batches:
+        aggregator.submit_frames(request_id, frames)
+    return jsonify({"status": "ok"})
+
 @app.route('/api/test_data', methods=['POST'])
 def test_data():
-    """Receives data from a load test client."""
-    with state_lock:
-        data = request.json
-        request_id = data['request_id']
-        if request_id not in state['metrics']:
-            state['metrics'][request_id] = {
-                'total_requests': 0, 'success_count': 0, 'failure_count': 0,
-                'latencies': [], 'prev_total': 0, 'prev_success': 0, 'prev_failure': 0,
-            }
-        
-        state['metrics'][request_id]['total_requests'] = data['total_requests']
-        state['metrics'][request_id]['success_count'] = data['success_count']
-        state['metrics'][request_id]['failure_count'] = data['failure_count']
-        if data.get('latency'):
-            state['metrics'][request_id]['latencies'] = data['latency']
+    """Receives a cumulative snapshot from an older load test client."""
+    try:
+        data, latency = parse_snapshot_body(request.get_data())
+    except PayloadError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    aggregator.submit_snapshot(data['request_id'], data, latency)
     return jsonify({"status": "ok"})
 
 @app.route('/api/data')
 def get_data():
     """Provides the latest data snapshot to the frontend."""
-    return jsonify(latest_snapshot)
+    return jsonify(aggregator.latest_snapshot)
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events stream: a backfill of recent windows, then one delta per window."""
+    return Response(broadcaster.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/start_test', methods=['POST'])
 def start_test():
     """Starts the load test."""
     global active_process
-    with state_lock:
-        # Reset metrics
-        state['metrics'] = {}
-        state['running_requests'] = {}
-        state['test_config'] = {'start_time': None, 'duration': None, 'test_running': False}
-        global latest_snapshot
-        latest_snapshot = {}
+    # Reset metrics
+    reset_test_state()
 
     data = request.get_json()
     rps = data.get('rps')
     duration = data.get('duration')
+    # One worker per core unless the caller asks for a specific number.
+    workers = data.get('workers') or os.cpu_count() or 1
     if not rps:
         return jsonify({"status": "error", "message": "RPS value is required"}), 400
     if not duration:
         return jsonify({"status": "error", "message": "Duration value is required"}), 400
 
-    command = f"./orchestrate_load_test.sh 1 {duration} ./config.json {rps}"
+    command = [sys.executable, "supervisor.py", str(duration), "./config.json", str(rps), str(workers)]
     try:
         # Using Popen for non-blocking execution
-        active_process = subprocess.Popen(command, shell=True)
-        return jsonify({"status": "ok", "message": f"Load test started with {rps} RPS for {duration} seconds."})
+        active_process = subprocess.Popen(command, cwd=ROOT_DIR)
+        if history is not None:
+            history.begin_run({'mode': 'local', 'rps': rps, 'duration': duration, 'workers': workers})
+        return jsonify({"status": "ok", "message": f"Load test started with {rps} RPS across {workers} workers for {duration} seconds."})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -179,24 +165,141 @@ def stop_test():
     global active_process
     with state_lock:
         state['test_config']['test_running'] = False
-        if active_process:
-            try:
-                active_process.terminate()
-                active_process = None
-                state['metrics'] = {}
-                state['running_requests'] = {}
-                state['test_config'] = {'start_time': None, 'duration': None, 'test_running': False}
-                global latest_snapshot
-                latest_snapshot = {}
-            except Exception as e:
-                return jsonify({"status": "error", "message": str(e)}), 500
-        
+    if history is not None:
+        history.end_run()
+    if active_process:
+        try:
+            active_process.terminate()
+            active_process = None
+            reset_test_state()
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
 
     return jsonify({"status": "ok", "message": "Test stopped"})
 
+# --- Run History ---
+@app.route('/api/runs')
+def list_runs():
+    """Lists recorded runs, newest first, with their whole-run summaries."""
+    if history is None:
+        return jsonify({"status": "error", "message": "Run history is disabled (HISTORY_DB)"}), 404
+    return jsonify({"runs": history.runs(request.args.get('limit', 100, type=int))})
+
+@app.route('/api/runs/compare')
+def compare_runs():
+    """Whole-run summaries of several runs (?ids=a,b,...) and their change against the first."""
+    if history is None:
+        return jsonify({"status": "error", "message": "Run history is disabled (HISTORY_DB)"}), 404
+    run_ids = [run_id for run_id in request.args.get('ids', '').split(',') if run_id]
+    if not run_ids:
+        return jsonify({"status": "error", "message": "ids is required"}), 400
+    return jsonify({"runs": history.compare(run_ids)})
+
+@app.route('/api/runs/<run_id>')
+def get_run(run_id):
+    """A run with its summary, optionally restricted to ?start=&end= (Unix seconds)."""
+    if history is None:
+        return jsonify({"status": "error", "message": "Run history is disabled (HISTORY_DB)"}), 404
+    run = history.run(run_id)
+    if run is None:
+        return jsonify({"status": "error", "message": "Unknown run"}), 404
+    start, end = request.args.get('start', type=float), request.args.get('end', type=float)
+    if start is not None or end is not None or run['in_progress']:
+        run['summary'] = history.summary(run_id, start, end)
+    return jsonify(run)
+
+@app.route('/api/runs/<run_id>/series')
+def get_run_series(run_id):
+    """Time series of a run at ?resolution=1|10|60|auto seconds, optionally within ?start=&end=."""
+    if history is None:
+        return jsonify({"status": "error", "message": "Run history is disabled (HISTORY_DB)"}), 404
+    resolution = request.args.get('resolution', 'auto')
+    if resolution != 'auto':
+        if not resolution.isdigit() or int(resolution) not in RESOLUTIONS:
+            return jsonify({"status": "error", "message": f"resolution must be auto or one of {RESOLUTIONS}"}), 400
+        resolution = int(resolution)
+    resolution, points = history.series(run_id, resolution, request.args.get('start', type=float),
+                                        request.args.get('end', type=float))
+    return jsonify({"run_id": run_id, "resolution": resolution, "points": points})
+
+# --- Distributed Agents ---
+@app.route('/api/agents/register', methods=['POST'])
+def register_agent():
+    """Registers a long-lived load generator agent (agent.py) and its capacity."""
+    data = request.get_json() or {}
+    agent_id = controller.register(data.get('hostname', request.remote_addr), data.get('capacity_rps', 0),
+                                   data.get('workers', 1))
+    return jsonify({"agent_id": agent_id, "server_time": time.time()})
+
+@app.route('/api/agents/<agent_id>/heartbeat', methods=['POST'])
+def agent_heartbeat(agent_id):
+    """Receives an agent's status and answers with its desired state and the server clock."""
+    data = request.get_json() or {}
+    desired = controller.heartbeat(agent_id, data.get('status', 'idle'), data.get('run_id'), data.get('result'))
+    if desired is None:
+        return jsonify({"status": "error", "message": "Unknown agent, register again"}), 404
+    # server_time lets the agent estimate its clock offset for the synchronized start.
+    return jsonify({"desired": desired, "server_time": time.time()})
+
+@app.route('/api/agents')
+def list_agents():
+    """Lists the agents and the current distributed run."""
+    return jsonify(controller.status())
+
+@app.route('/api/distributed/start', methods=['POST'])
+def start_distributed():
+    """Splits a target rate across the connected agents and starts them at a common time."""
+    data = request.get_json() or {}
+    rps = data.get('rps')
+    duration = data.get('duration')
+    if not rps:
+        return jsonify({"status": "error", "message": "RPS value is required"}), 400
+    if not duration:
+        return jsonify({"status": "error", "message": "Duration value is required"}), 400
+    config = data.get('config')
+    if config is None:
+        with open(os.path.join(ROOT_DIR, "config.json")) as f:
+            config = json.load(f)
+    reset_test_state()
+    try:
+        run = controller.start(float(rps), float(duration), config, data.get('workers'),
+                               float(data.get('lead_seconds', DEFAULT_START_LEAD)))
+    except ControllerError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    with state_lock:
+        state['test_config'] = {'start_time': run['start_at'], 'duration': run['duration'], 'test_running': True}
+    if history is not None:
+        history.begin_run({'mode': 'distributed', 'rps': run['rps'], 'duration': run['duration'],
+                           'agents': len(run['assignments']), 'controller_run_id': run['run_id']})
+    return jsonify({"status": "ok", "run": run,
+                    "message": f"Distributed test starting in {run['start_at'] - time.time():.1f}s with {rps} RPS "
+                               f"across {len(run['assignments'])} agents for {duration} seconds."})
+
+@app.route('/api/distributed/rate', methods=['POST'])
+def set_distributed_rate():
+    """Changes the global target rate of the running distributed test."""
+    rps = (request.get_json() or {}).get('rps')
+    if not rps:
+        return jsonify({"status": "error", "message": "RPS value is required"}), 400
+    try:
+        run = controller.set_rate(float(rps))
+    except ControllerError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "ok", "run": run})
+
+@app.route('/api/distributed/stop', methods=['POST'])
+def stop_distributed():
+    """Stops every agent of the distributed test; their workers drain and report as usual."""
+    try:
+        run = controller.stop()
+    except ControllerError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "ok", "run": run})
+
 if __name__ == '__main__':
     # Start the background thread for metric aggregation
     aggregator_thread = threading.Thread(target=aggregate_metrics_periodically, daemon=True)
     aggregator_thread.start()
     # Run the Flask app
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # threaded: each open dashboard stream holds one request thread
+    app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
@@ -0,0 +1,172 @@
+import threading
+import time
+import uuid
+
+# --- Distributed Controller ---
+
+# Long-lived agents (agent.py) register here with their capacity and then
+# poll /api/agents/<id>/heartbeat. Every heartbeat answer carries the
+# agent's desired state; its `version` changes whenever the controller
+# starts a run, changes its rate or stops it, so an agent only has to
+# compare versions to know it has something to apply. Desired states, not
+# one-shot commands, are sent so that a lost answer is simply repeated.
+
+# Agents missing heartbeats for this long are dropped from new plans.
+AGENT_TIMEOUT = 10.0
+# Seconds between a start request and the synchronized start, long enough
+# for every agent to see the plan on its next poll and spawn its workers.
+DEFAULT_START_LEAD = 5.0
+
+
+class ControllerError(Exception):
+    """A controller request that cannot be carried out (reported as HTTP 400)."""
+
+
+def split_rate_by_capacity(total_rps, agents):
+    """
+    Splits a global target rate across agents: in proportion to their
+    declared capacity when every agent declared one, otherwise in proportion
+    to their worker count. Returns {agent_id: rps}.
+    """
+    if not agents:
+        raise ControllerError("No agents to split the rate across")
+    if all(agent['capacity_rps'] > 0 for agent in agents):
+        weights = {agent['agent_id']: agent['capacity_rps'] for agent in agents}
+    else:
+        weights = {agent['agent_id']: agent['workers'] for agent in agents}
+    total_weight = sum(weights.values())
+    return {agent_id: total_rps * weight / total_weight for agent_id, weight in weights.items()}
+
+
+class AgentController:
+    """Registry of the connected agents and the distributed run they are driving."""
+
+    def __init__(self, timeout=AGENT_TIMEOUT):
+        self.timeout = timeout
+        self.agents = {}
+        self.run = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def register(self, hostname, capacity_rps, workers):
+        agent_id = str(uuid.uuid4())
+        with self._lock:
+            self.agents[agent_id] = {
+                'agent_id': agent_id,
+                'hostname': hostname,
+                'capacity_rps': float(capacity_rps or 0),
+                'workers': int(workers or 1),
+                'registered_at': time.time(),
+                'last_seen': time.time(),
+                'status': 'idle',
+                'result': None,
+                'desired': {'version': 0, 'action': 'idle'},
+            }
+        return agent_id
+
+    def heartbeat(self, agent_id, status, run_id=None, result=None):
+        """Records an agent's status; returns its desired state, or None if the agent is unknown."""
+        with self._lock:
+            agent = self.agents.get(agent_id)
+            if agent is None:
+                return None
+            agent['last_seen'] = time.time()
+            agent['status'] = status
+            if result is not None and self.run is not None and run_id == self.run['run_id']:
+                agent['result'] = result
+            return agent['desired']
+
+    def live_agents(self):
+        now = time.time()
+        return [agent for agent in self.agents.values() if now - agent['last_seen'] <= self.timeout]
+
+    def start(self, rps, duration, config, workers=None, lead=DEFAULT_START_LEAD):
+        """
+        Splits `rps` over the live agents and gives each one a plan starting at
+        the same wall-clock time. Returns the run description.
+        """
+        with self._lock:
+            if self.run is not None and self.run['state'] == 'running' and time.time() < self.run['end_at']:
+                raise ControllerError("A distributed run is already in progress")
+            agents = self.live_agents()
+            if not agents:
+                raise ControllerError("No agents are connected")
+            capacity = sum(agent['capacity_rps'] for agent in agents)
+            if all(agent['capacity_rps'] > 0 for agent in agents) and rps > capacity:
+                raise ControllerError(f"Target {rps:g} RPS exceeds the agents' declared capacity of {capacity:g} RPS")
+            self._version += 1
+            start_at = time.time() + lead
+            shares = split_rate_by_capacity(rps, agents)
+            self.run = {
+                'run_id': str(uuid.uuid4()),
+                'state': 'running',
+                'rps': rps,
+                'duration': duration,
+                'start_at': start_at,
+                'end_at': start_at + duration,
+                'assignments': {},
+            }
+            for agent in self.agents.values():
+                agent['result'] = None
+                if agent['agent_id'] not in shares:
+                    continue
+                plan = {
+                    'version': self._version,
+                    'action': 'run',
+                    'run_id': self.run['run_id'],
+                    'rps': shares[agent['agent_id']],
+                    'duration': duration,
+                    'start_at': start_at,
+                    'workers': workers or agent['workers'],
+                    'config': config,
+                }
+                agent['desired'] = plan
+                self.run['assignments'][agent['agent_id']] = plan['rps']
+            return dict(self.run)
+
+    def set_rate(self, rps):
+        """Re-splits a new global rate over the agents of the current run."""
+        with self._lock:
+            if self.run is None or self.run['state'] != 'running':
+                raise ControllerError("No distributed run is in progress")
+            # Agents that stopped sending heartbeats no longer get a share.
+            live = {agent['agent_id'] for agent in self.live_agents()}
+            agents = [self.agents[agent_id] for agent_id in self.run['assignments'] if agent_id in live]
+            if not agents:
+                raise ControllerError("None of the run's agents are connected")
+            shares = split_rate_by_capacity(rps, agents)
+            self._version += 1
+            for agent_id, share in shares.items():
+                self.agents[agent_id]['desired'] = dict(self.agents[agent_id]['desired'], version=self._version, rps=share)
+            self.run['rps'] = rps
+            self.run['assignments'] = shares
+            return dict(self.run)
+
+    def stop(self):
+        """Tells every agent of the current run to stop early (they still report results)."""
+        with self._lock:
+            if self.run is None:
+                raise ControllerError("No distributed run to stop")
+            self._version += 1
+            for agent_id in self.run['assignments']:
+                if agent_id in self.agents:
+                    self.agents[agent_id]['desired'] = {'version': self._version, 'action': 'stop',
+                                                        'run_id': self.run['run_id']}
+            self.run['state'] = 'stopped'
+            return dict(self.run)
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            agents = [{
+                'agent_id': agent['agent_id'],
+                'hostname': agent['hostname'],
+                'capacity_rps': agent['capacity_rps'],
+                'workers': agent['workers'],
+                'status': agent['status'],
+                'alive': now - agent['last_seen'] <= self.timeout,
+                'last_seen_seconds': round(now - agent['last_seen'], 1),
+                'assigned_rps': (self.run or {}).get('assignments', {}).get(agent['agent_id']),
+                'result': agent['result'],
+            } for agent in self.agents.values()]
+            return {'run': dict(self.run) if self.run else None, 'agents': agents, 'server_time': now}
@@ -0,0 +1,272 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from histogram import LatencyHistogram
+
+# --- Run History Store ---
+
+# Every run the dashboard sees is kept in a SQLite database: one row per
+# run, and for each run its aggregate windows at three resolutions. The
+# one-second windows are the ones the aggregator closes; the 10 second and
+# 1 minute rollups are merged as the run goes, so a query over a multi-hour
+# run reads a few hundred rows instead of every second. Each window keeps
+# its counters, precomputed percentiles and its sparse latency histogram,
+# so percentiles over any range (or a whole run) are exact merges of
+# histograms, not averages of percentiles.
+
+RESOLUTIONS = (1, 10, 60)
+# Points returned by a series query with resolution "auto".
+MAX_SERIES_POINTS = 1000
+WINDOW_COUNTERS = ('total_requests', 'success_count', 'failure_count', 'dropped_count')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    info TEXT NOT NULL,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS windows (
+    run_id TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    start REAL NOT NULL,
+    seconds REAL NOT NULL,
+    total_requests INTEGER NOT NULL,
+    success_count INTEGER NOT NULL,
+    failure_count INTEGER NOT NULL,
+    dropped_count INTEGER NOT NULL,
+    tp50 REAL NOT NULL,
+    tp90 REAL NOT NULL,
+    tp99 REAL NOT NULL,
+    latency_histogram TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    PRIMARY KEY (run_id, resolution, start)
+);
+"""
+
+
+def run_row(row):
+    run_id, started_at, ended_at, info, summary = row
+    return {'run_id': run_id, 'started_at': started_at, 'ended_at': ended_at, 'info': json.loads(info),
+            'summary': json.loads(summary) if summary else None, 'in_progress': ended_at is None}
+
+
+class Rollup:
+    """A window being merged from one-second windows (one per coarser resolution)."""
+
+    def __init__(self, start):
+        self.start = start
+        self.seconds = 0.0
+        self.counters = dict.fromkeys(WINDOW_COUNTERS, 0)
+        self.latency = LatencyHistogram()
+        self.labels = {}
+
+    def add(self, seconds, counters, latency, labels):
+        self.seconds += seconds
+        for key in WINDOW_COUNTERS:
+            self.counters[key] += counters.get(key, 0)
+        self.latency.merge(latency)
+        for key, count in labels.items():
+            self.labels[key] = self.labels.get(key, 0) + count
+
+
+class RunHistory:
+    """
+    SQLite store of past runs. record_window() is called by the aggregator
+    thread for every closed window; the query methods are called from
+    request threads, so the single connection is shared under a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.run_id = None
+        self._rollups = {}
+        # Runs left open by a server that was stopped mid-run.
+        with self._lock, self._db:
+            for (run_id,) in self._db.execute("SELECT run_id FROM runs WHERE ended_at IS NULL").fetchall():
+                self._finish(run_id)
+
+    # Writing (aggregator thread, start/stop endpoints).
+
+    def begin_run(self, info):
+        """Starts recording a new run (ending the previous one); returns its id."""
+        with self._lock, self._db:
+            if self.run_id is not None:
+                self._end_locked()
+            self.run_id = str(uuid.uuid4())
+            self._rollups = {}
+            self._db.execute("INSERT INTO runs (run_id, started_at, info) VALUES (?, ?, ?)",
+                             (self.run_id, time.time(), json.dumps(info)))
+            return self.run_id
+
+    def record_window(self, window):
+        """Stores a closed aggregator window and folds it into the rollups."""
+        with self._lock, self._db:
+            if self.run_id is None:
+                return
+            seconds = window['end'] - window['start']
+            self._insert(1, window['start'], seconds, window, window['latency'], window['labels'])
+            for resolution in RESOLUTIONS[1:]:
+                start = window['start'] // resolution * resolution
+                rollup = self._rollups.get(resolution)
+                if rollup is not None and rollup.start != start:
+                    self._flush(resolution, rollup)
+                    rollup = None
+                if rollup is None:
+                    rollup = self._rollups[resolution] = Rollup(start)
+                rollup.add(seconds, window, window['latency'], window['labels'])
+
+    def end_run(self):
+        """Flushes the partial rollups and stores the run's summary."""
+        with self._lock, self._db:
+            if self.run_id is not None:
+                self._end_locked()
+
+    def has_windows(self):
+        with self._lock:
+            return self.run_id is not None and self._db.execute(
+                "SELECT 1 FROM windows WHERE run_id = ? LIMIT 1", (self.run_id,)).fetchone() is not None
+
+    def _end_locked(self):
+        for resolution, rollup in self._rollups.items():
+            self._flush(resolution, rollup)
+        self._rollups = {}
+        self._finish(self.run_id)
+        self.run_id = None
+
+    def _flush(self, resolution, rollup):
+        self._insert(resolution, rollup.start, rollup.seconds, rollup.counters, rollup.latency, rollup.labels)
+
+    def _insert(self, resolution, start, seconds, counters, latency, labels):
+        tp50, tp90, tp99 = latency.percentiles([0.50, 0.90, 0.99])
+        self._db.execute(
+            "INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.run_id, resolution, start, seconds, *(counters.get(key, 0) for key in WINDOW_COUNTERS),
+             tp50, tp90, tp99, json.dumps(latency.to_dict()),
+             json.dumps([[endpoint, outcome, count] for (endpoint, outcome), count in labels.items()])))
+
+    def _finish(self, run_id):
+        """Computes the whole-run summary from the 1 minute rollups (or the 1 second windows)."""
+        summary = self._summarize(run_id, 0, float('inf'))
+        ended_at = self._db.execute("SELECT MAX(start + seconds) FROM windows WHERE run_id = ?", (run_id,)).fetchone()[0]
+        self._db.execute("UPDATE runs SET ended_at = ?, summary = ? WHERE run_id = ?",
+                         (ended_at or time.time(), json.dumps(summary), run_id))
+
+    def _summarize(self, run_id, start, end):
+        resolution = self._coarsest(run_id, start, end)
+        latency = LatencyHistogram()
+        totals = dict.fromkeys(WINDOW_COUNTERS, 0)
+        seconds = 0.0
+        rows = self._db.execute(
+            f"SELECT seconds, {', '.join(WINDOW_COUNTERS)}, latency_histogram FROM windows "
+            "WHERE run_id = ? AND resolution = ? AND start >= ? AND start < ?", (run_id, resolution, start, end))
+        for row in rows:
+            seconds += row[0]
+            for key, value in zip(WINDOW_COUNTERS, row[1:-1]):
+                totals[key] += value
+            latency.merge(LatencyHistogram.from_dict(json.loads(row[-1])))
+        tp50, tp90, tp95, tp99 = latency.percentiles([0.50, 0.90, 0.95, 0.99])
+        return {
+            **totals,
+            'seconds': round(seconds, 2),
+            'avg_rps': round(totals['total_requests'] / seconds, 2) if seconds else 0.0,
+            'error_rate': round(totals['failure_count'] / totals['total_requests'], 4) if totals['total_requests'] else 0.0,
+            'tp50_ms': round(tp50, 2),
+            'tp90_ms': round(tp90, 2),
+            'tp95_ms': round(tp95, 2),
+            'tp99_ms': round(tp99, 2),
+            'max_ms': round(latency.max if latency.count else 0.0, 2),
+        }
+
+    def _coarsest(self, run_id, start, end):
+        """
+        Coarsest resolution that covers [start, end) exactly. Rollups are only
+        used for whole-run ranges, and only when they hold every second of the
+        run (a run cut off by a server restart lost its partial rollups).
+        """
+        bounds = self._db.execute("SELECT MIN(start), MAX(start + seconds) FROM windows WHERE run_id = ? AND resolution = 1",
+                                  (run_id,)).fetchone()
+        if bounds[0] is None or start > bounds[0] - RESOLUTIONS[-1] or end < bounds[1]:
+            return 1
+        seconds = dict(self._db.execute("SELECT resolution, SUM(seconds) FROM windows WHERE run_id = ? GROUP BY resolution",
+                                        (run_id,)).fetchall())
+        return next((resolution for resolution in reversed(RESOLUTIONS)
+                     if abs(seconds.get(resolution, 0.0) - seconds[1]) < 1e-6), 1)
+
+    # Queries (request threads).
+
+    def runs(self, limit=100):
+        """The most recent runs, newest first."""
+        with self._lock:
+            rows = self._db.execute("SELECT run_id, started_at, ended_at, info, summary FROM runs "
+                                    "ORDER BY started_at DESC LIMIT ?", (limit,)).fetchall()
+        return [run_row(row) for row in rows]
+
+    def run(self, run_id):
+        with self._lock:
+            row = self._db.execute("SELECT run_id, started_at, ended_at, info, summary FROM runs WHERE run_id = ?",
+                                   (run_id,)).fetchone()
+        return run_row(row) if row else None
+
+    def series(self, run_id, resolution="auto", start=None, end=None):
+        """
+        Windows of a run between `start` and `end` (Unix seconds) at 1, 10 or
+        60 seconds; "auto" picks the finest one returning at most
+        MAX_SERIES_POINTS points. Returns (resolution, points).
+        """
+        start = start if start is not None else 0
+        end = end if end is not None else float('inf')
+        with self._lock:
+            if resolution == "auto":
+                bounds = self._db.execute(
+                    "SELECT MIN(start), MAX(start + seconds) FROM windows WHERE run_id = ? AND resolution = 1 "
+                    "AND start >= ? AND start < ?", (run_id, start, end)).fetchone()
+                span = (bounds[1] - bounds[0]) if bounds[0] is not None else 0
+                resolution = next((r for r in RESOLUTIONS if span / r <= MAX_SERIES_POINTS), RESOLUTIONS[-1])
+            rows = self._db.execute(
+                f"SELECT start, seconds, {', '.join(WINDOW_COUNTERS)}, tp50, tp90, tp99 FROM windows "
+                "WHERE run_id = ? AND resolution = ? AND start >= ? AND start < ? ORDER BY start",
+                (run_id, resolution, start, end)).fetchall()
+        points = []
+        for window_start, seconds, total, success, failure, dropped, tp50, tp90, tp99 in rows:
+            points.append({
+                'start': window_start,
+                'total_rps': round(total / seconds, 2) if seconds else 0.0,
+                'success_rps': round(success / seconds, 2) if seconds else 0.0,
+                'failure_rps': round(failure / seconds, 2) if seconds else 0.0,
+                'dropped_rps': round(dropped / seconds, 2) if seconds else 0.0,
+                'tp50': round(tp50, 2),
+                'tp90': round(tp90, 2),
+                'tp99': round(tp99, 2),
+            })
+        return resolution, points
+
+    def summary(self, run_id, start=None, end=None):
+        """Totals and exact percentiles of a run, or of a time range of it."""
+        with self._lock:
+            return self._summarize(run_id, start if start is not None else 0, end if end is not None else float('inf'))
+
+    def compare(self, run_ids):
+        """Whole-run summaries of several runs side by side, plus each run's change against the first."""
+        runs = [(run_id, self.summary(run_id)) for run_id in run_ids]
+        baseline = runs[0][1] if runs else None
+        result = []
+        for run_id, summary in runs:
+            changes = {}
+            for key in ('avg_rps', 'error_rate', 'tp50_ms', 'tp90_ms', 'tp99_ms'):
+                if baseline[key]:
+                    changes[key] = round((summary[key] - baseline[key]) / baseline[key] * 100, 2)
+            result.append({'run_id': run_id, 'summary': summary, 'change_percent': changes})
+        return result
+
+    def close(self):
+        with self._lock:
+            self._db.close()
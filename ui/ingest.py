@@ -0,0 +1,172 @@
+import gzip
+import json
+import struct
+import threading
+import time
+import zlib
+
+from histogram import LatencyHistogram
+
+# --- Telemetry Payload Parsing ---
+
+# Parsing is kept free of server state so that it can run anywhere: in a
+# Flask request thread (app.py) or in the parser processes of the async
+# ingestion server (ingest_server.py). Both hand the decoded frames to the
+# aggregator, which then only merges.
+#
+# Accepted telemetry payloads, optionally gzip or deflate compressed
+# (Content-Encoding):
+#   application/json                {"request_id": ..., "frames": [...]} as sent by
+#                                   telemetry.TelemetryReporter, or
+#                                   {"batches": [{"request_id": ..., "frames": [...]}, ...]}
+#                                   carrying many generators in one request
+#   application/x-telemetry-batch   binary: a sequence of records, each a
+#                                   little-endian uint32 length followed by one
+#                                   gzip-compressed {"request_id", "frames"}
+#                                   document, so a relay can concatenate the
+#                                   compressed bodies of many generators as is
+BATCH_CONTENT_TYPE = "application/x-telemetry-batch"
+BATCH_LENGTH = struct.Struct("<I")
+
+
+class PayloadError(ValueError):
+    """A telemetry payload that cannot be decoded (reported as HTTP 400)."""
+
+
+def decompress(body, encoding):
+    if not encoding or encoding == "identity":
+        return body
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        return zlib.decompress(body)
+    raise PayloadError(f"Unsupported Content-Encoding: {encoding}")
+
+
+def decode_frames(frames):
+    """Replaces the histograms of telemetry frames (sparse dicts) with LatencyHistograms, in place."""
+    for frame in frames:
+        if frame.get('latency_histogram'):
+            frame['latency_histogram'] = LatencyHistogram.from_dict(frame['latency_histogram'])
+        for entry in frame.get('labels', []):
+            entry['latency_histogram'] = LatencyHistogram.from_dict(entry['latency_histogram'])
+        for phase, histogram in frame.get('phases', {}).items():
+            frame['phases'][phase] = LatencyHistogram.from_dict(histogram)
+    return frames
+
+
+def iter_binary_batches(body):
+    offset = 0
+    while offset < len(body):
+        if offset + BATCH_LENGTH.size > len(body):
+            raise PayloadError("Truncated batch record header")
+        (length,) = BATCH_LENGTH.unpack_from(body, offset)
+        offset += BATCH_LENGTH.size
+        if offset + length > len(body):
+            raise PayloadError("Truncated batch record")
+        yield json.loads(gzip.decompress(body[offset:offset + length]))
+        offset += length
+
+
+def parse_telemetry(body, content_type="application/json", encoding=None):
+    """
+    Decodes a telemetry payload into [(request_id, frames), ...] with the
+    frames' histograms decoded.
+    """
+    try:
+        body = decompress(body, encoding)
+        if content_type == BATCH_CONTENT_TYPE:
+            batches = list(iter_binary_batches(body))
+        else:
+            data = json.loads(body)
+            batches = data['batches'] if 'batches' in data else [data]
+        return [(batch['request_id'], decode_frames(batch.get('frames', []))) for batch in batches]
+    except (OSError, EOFError, zlib.error, ValueError, KeyError, TypeError) as e:
+        if isinstance(e, PayloadError):
+            raise
+        raise PayloadError(f"Invalid telemetry payload: {e}") from e
+
+
+def parse_snapshot(data):
+    """Decodes the latency of a cumulative /api/test_data snapshot from an older client."""
+    if data.get('latency_histogram'):
+        return LatencyHistogram.from_dict(data['latency_histogram'])
+    if data.get('latency'):
+        # Older clients send the raw list of latencies (ms).
+        return LatencyHistogram.from_values(data['latency'])
+    return None
+
+
+def parse_snapshot_body(body):
+    """Parses a /api/test_data body; returns (data, latency)."""
+    try:
+        data = json.loads(body)
+        if not isinstance(data, dict) or 'request_id' not in data:
+            raise PayloadError("Snapshot has no request_id")
+        return data, parse_snapshot(data)
+    except (ValueError, KeyError, TypeError) as e:
+        if isinstance(e, PayloadError):
+            raise
+        raise PayloadError(f"Invalid snapshot payload: {e}") from e
+
+
+def encode_binary_batch(documents):
+    """Builds an application/x-telemetry-batch body from {"request_id", "frames"} documents."""
+    parts = []
+    for document in documents:
+        compressed = gzip.compress(json.dumps(document).encode())
+        parts.append(BATCH_LENGTH.pack(len(compressed)))
+        parts.append(compressed)
+    return b"".join(parts)
+
+
+class IngestStats:
+    """Ingestion counters and parse/handling times, reported by /api/ingest/stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.rejected = 0
+        self.frames = 0
+        self.bytes = 0
+        self.parse_ms = LatencyHistogram()
+        self.handle_ms = LatencyHistogram()
+        self._mark = (self.started, 0, 0, 0)
+
+    def record(self, body_bytes, frames, parse_ms, handle_ms):
+        with self._lock:
+            self.requests += 1
+            self.frames += frames
+            self.bytes += body_bytes
+            self.parse_ms.record(parse_ms)
+            self.handle_ms.record(handle_ms)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        """Totals since start, rates since the previous call, and parse/handling percentiles."""
+        now = time.time()
+        with self._lock:
+            mark_time, mark_requests, mark_frames, mark_bytes = self._mark
+            elapsed = max(now - mark_time, 1e-9)
+            parse_p50, parse_p99 = self.parse_ms.percentiles([0.50, 0.99])
+            handle_p50, handle_p99 = self.handle_ms.percentiles([0.50, 0.99])
+            snapshot = {
+                'uptime_s': round(now - self.started, 1),
+                'requests': self.requests,
+                'rejected': self.rejected,
+                'frames': self.frames,
+                'bytes': self.bytes,
+                'requests_per_s': round((self.requests - mark_requests) / elapsed, 1),
+                'frames_per_s': round((self.frames - mark_frames) / elapsed, 1),
+                'mb_per_s': round((self.bytes - mark_bytes) / elapsed / (1024 * 1024), 3),
+                'parse_p50_ms': round(parse_p50, 3),
+                'parse_p99_ms': round(parse_p99, 3),
+                'handle_p50_ms': round(handle_p50, 3),
+                'handle_p99_ms': round(handle_p99, 3),
+            }
+            self._mark = (now, self.requests, self.frames, self.bytes)
+            return snapshot
@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+import aiohttp
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from histogram import LatencyHistogram
+from telemetry import TelemetryReporter
+
+# --- Ingest Capacity Benchmark ---
+
+# Simulates many load generators reporting to a running dashboard server
+# (app.py or ingest_server.py): every simulated generator registers, then
+# POSTs one gzip-compressed telemetry frame per interval, shaped like the
+# frames load_test.py sends (counters, a latency histogram, per-label and
+# per-phase histograms). The generator count is raised step by step and for
+# each step the report shows the frames the server accepted per second and
+# the response times it gave. The highest step where every frame was
+# accepted on time is the server's ingest capacity on that machine.
+
+DEFAULT_GENERATORS = "10,50,100,200,400"
+# A step is sustained when this fraction of the expected frames was accepted.
+SUSTAINED_RATIO = 0.99
+
+
+def sample_frame(rng, labels, requests_per_frame):
+    """One telemetry frame with histograms of a realistic spread."""
+    def histogram():
+        return LatencyHistogram.from_values(rng.lognormvariate(3, 1) for _ in range(requests_per_frame)).to_dict()
+    return {
+        'total_requests': requests_per_frame,
+        'success_count': requests_per_frame,
+        'failure_count': 0,
+        'latency_histogram': histogram(),
+        'labels': [{'endpoint': f"endpoint-{index}", 'outcome': "200", 'latency_histogram': histogram()}
+                   for index in range(labels)],
+        'phases': {phase: histogram() for phase in ("connect", "ttfb", "body")},
+    }
+
+
+def check_reporter_frame(url, frame):
+    """
+    Sends one frame through a real TelemetryReporter (gzip-compressed JSON)
+    and returns whether the server accepted it, so that a server rejecting
+    generator frames is caught before the steps report zero throughput.
+    """
+    request_id = requests.post(f"{url}/api/register", timeout=5).json()['request_id']
+    reporter = TelemetryReporter(url, request_id)
+    reporter.start()
+    reporter.submit(frame)
+    reporter.stop()
+    requests.post(f"{url}/api/shutdown", json={'request_id': request_id}, timeout=5)
+    return reporter.sent_frames == 1
+
+
+async def generator(session, url, frame, interval, deadline, results):
+    async with session.post(f"{url}/api/register") as response:
+        request_id = (await response.json())['request_id']
+    seq = 0
+    next_send = time.monotonic() + random.random() * interval
+    while next_send < deadline:
+        await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+        body = gzip.compress(json.dumps({'request_id': request_id, 'frames': [dict(frame, seq=seq)]}).encode())
+        started = time.monotonic()
+        try:
+            async with session.post(f"{url}/api/telemetry", data=body,
+                                    headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}) as response:
+                await response.read()
+                ok = response.status == 200
+        except aiohttp.ClientError:
+            ok = False
+        results['latency'].record((time.monotonic() - started) * 1000)
+        results['accepted' if ok else 'failed'] += 1
+        seq += 1
+        next_send += interval
+    async with session.post(f"{url}/api/shutdown", json={'request_id': request_id}) as response:
+        await response.read()
+
+
+async def run_step(url, generators, frame, interval, duration):
+    results = {'accepted': 0, 'failed': 0, 'latency': LatencyHistogram()}
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(generator(session, url, frame, interval, deadline, results) for _ in range(generators)))
+    expected = generators * duration / interval
+    p50, p99 = results['latency'].percentiles([0.50, 0.99])
+    return {
+        'generators': generators,
+        'frames_per_s': round(results['accepted'] / duration, 1),
+        'expected_frames_per_s': round(expected / duration, 1),
+        'failed': results['failed'],
+        'response_p50_ms': round(p50, 2),
+        'response_p99_ms': round(p99, 2),
+        'sustained': results['accepted'] >= SUSTAINED_RATIO * expected and p99 < interval * 1000,
+    }
+
+
+async def main(args):
+    rng = random.Random(1)
+    frame = sample_frame(rng, args.labels, args.requests_per_frame)
+    size = len(gzip.compress(json.dumps({'request_id': 'x', 'frames': [frame]}).encode()))
+    print(f"Frame: {args.labels} labels, {size} bytes compressed; one frame per {args.interval:g}s per generator.")
+    if not await asyncio.get_running_loop().run_in_executor(None, check_reporter_frame, args.url.rstrip("/"), frame):
+        print("Error: the server did not accept a gzip frame sent by TelemetryReporter.", flush=True)
+        sys.exit(1)
+    print(f"{'Generators':>10} {'Frames/s':>9} {'Expected':>9} {'Failed':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    sustained = 0
+    for generators in (int(value) for value in args.generators.split(",")):
+        step = await run_step(args.url.rstrip("/"), generators, frame, args.interval, args.duration)
+        print(f"{step['generators']:>10} {step['frames_per_s']:>9.1f} {step['expected_frames_per_s']:>9.1f} "
+              f"{step['failed']:>7} {step['response_p50_ms']:>8.2f} {step['response_p99_ms']:>8.2f}"
+              f"{'' if step['sustained'] else '  (not sustained)'}", flush=True)
+        if step['sustained']:
+            sustained = generators
+    print(f"Highest sustained generator count: {sustained}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures how many telemetry-reporting generators a dashboard server sustains.")
+    parser.add_argument("url", nargs="?", default="http://localhost:5000")
+    parser.add_argument("--generators", default=DEFAULT_GENERATORS, help="comma-separated generator counts")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per step")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between frames (TELEMETRY_INTERVAL)")
+    parser.add_argument("--labels", type=int, default=5, help="(endpoint, outcome) histograms per frame")
+    parser.add_argument("--requests-per-frame", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
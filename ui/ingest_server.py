@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import io
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from ingest import IngestStats, PayloadError, parse_snapshot_body, parse_telemetry
+from stream import KEEPALIVE_INTERVAL
+
+# --- Async Ingestion Server ---
+
+# Production server for the dashboard. The hot paths are served natively on
+# an asyncio event loop:
+#   POST /api/telemetry, /api/ingest   telemetry from one or many generators
+#                                      (JSON, gzip/deflate, or binary batches;
+#                                      see ingest.py)
+#   POST /api/test_data                cumulative snapshots of older clients
+#   GET  /api/stream                   the dashboard's Server-Sent Events
+#   GET  /api/ingest/stats             ingest rates and parse/handling times
+# Payloads are decompressed, parsed and their histograms decoded in a pool of
+# parser processes, so neither the event loop nor the aggregator thread ever
+# parses, and parsing scales past one core. Every other route (the dashboard
+# page, test control, agents, run history) is passed to the Flask app in
+# app.py through a small WSGI bridge running on a thread pool, so both
+# servers share one aggregator, broadcaster, controller and history.
+#
+# app.py is only imported when the server starts (not at module level):
+# the spawned parser processes import this module and must not open the
+# history database or start a second dashboard.
+
+# Parser processes (0 parses on a thread of this process instead).
+PARSE_WORKERS = int(os.environ.get("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Threads running Flask routes, and threads waiting on dashboard streams.
+WSGI_THREADS = int(os.environ.get("INGEST_WSGI_THREADS", "16"))
+STREAM_THREADS = int(os.environ.get("INGEST_STREAM_THREADS", "64"))
+# Largest accepted request body.
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class IngestServer:
+    def __init__(self, dashboard, parse_workers=PARSE_WORKERS):
+        # The app.py module: its Flask app, aggregator and broadcaster.
+        self.dashboard = dashboard
+        if parse_workers:
+            # Spawned, not forked: the parent already runs the aggregator thread.
+            self.parsers = ProcessPoolExecutor(parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.parsers = ThreadPoolExecutor(1, thread_name_prefix="ingest-parse")
+        self.wsgi = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="ingest-wsgi")
+        self.streams = ThreadPoolExecutor(STREAM_THREADS, thread_name_prefix="ingest-stream")
+        self.stats = IngestStats()
+
+    def make_app(self):
+        application = web.Application(client_max_size=MAX_BODY_BYTES)
+        application.router.add_post('/api/telemetry', self.telemetry)
+        application.router.add_post('/api/ingest', self.telemetry)
+        application.router.add_post('/api/test_data', self.test_data)
+        application.router.add_get('/api/stream', self.stream)
+        application.router.add_get('/api/ingest/stats', self.ingest_stats)
+        application.router.add_route('*', '/{tail:.*}', self.wsgi_bridge)
+        application.on_cleanup.append(self.close)
+        return application
+
+    async def close(self, application):
+        self.parsers.shutdown(cancel_futures=True)
+        self.wsgi.shutdown(wait=False)
+        self.streams.shutdown(wait=False, cancel_futures=True)
+
+    async def telemetry(self, request):
+        received = time.perf_counter()
+        # aiohttp has already undone any gzip/deflate Content-Encoding of the body.
+        body = await request.read()
+        loop = asyncio.get_running_loop()
+        try:
+            parse_start = time.perf_counter()
+            batches = await loop.run_in_executor(self.parsers, parse_telemetry, body, request.content_type, None)
+            parsed = time.perf_counter()
+        except PayloadError as e:
+            self.stats.reject()
+            return web.json_response({"status": "error", "message": str(e)}, status=400)
+        frames = 0
+        for request_id, batch_frames in batches:
+            self.dashboard.aggregator.submit_frames(request_id, batch_frames)
+            frames += len(batch_frames)
+        self.stats.record(len(body), frames, (parsed - parse_start) * 1000, (time.perf_counter() - received) * 1000)
+        return web.json_response({"status": "ok", "frames": frames})
+
+    async def test_data(self, request):
+        body = await request.read()
+        try:
+            data, latency = await asyncio.get_running_loop().run_in_executor(self.parsers, parse_snapshot_body, body)
+        except PayloadError as e:
+            self.stats.reject()
+            return web.json_response({"status": "error", "message": str(e)}, status=400)
+        self.dashboard.aggregator.submit_snapshot(data['request_id'], data, latency)
+        return web.json_response({"status": "ok"})
+
+    async def ingest_stats(self, request):
+        return web.json_response(self.stats.snapshot())
+
+    async def stream(self, request):
+        """Server-Sent Events from the broadcaster; blocking queue reads wait on the stream thread pool."""
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                               'X-Accel-Buffering': 'no'})
+        await response.prepare(request)
+        broadcaster = self.dashboard.broadcaster
+        subscriber = broadcaster.subscribe()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    event = await loop.run_in_executor(self.streams, subscriber.get, True, KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    event = ": keep-alive\n\n"
+                await response.write(event.encode())
+        except ConnectionResetError:
+            pass
+        finally:
+            broadcaster.unsubscribe(subscriber)
+        return response
+
+    async def wsgi_bridge(self, request):
+        """Runs any other route on the Flask app, in the WSGI thread pool."""
+        body = await request.read()
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': request.path,
+            'QUERY_STRING': request.query_string,
+            'SERVER_NAME': request.host.split(':')[0],
+            'SERVER_PORT': str(request.url.port or 80),
+            'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+            'REMOTE_ADDR': request.remote or '',
+            'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': request.scheme,
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+        def call():
+            started = {}
+
+            def start_response(status, headers, exc_info=None):
+                started['status'], started['headers'] = status, headers
+
+            result = self.dashboard.app.wsgi_app(environ, start_response)
+            try:
+                content = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            return started['status'], started['headers'], content
+
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(self.wsgi, call)
+        headers = [(name, value) for name, value in headers if name.lower() not in ('content-length', 'transfer-encoding')]
+        return web.Response(status=int(status.split()[0]), headers=headers, body=content)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Async ingestion server for the load test dashboard.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    import app as dashboard
+
+    server = IngestServer(dashboard)
+    aggregator_thread = threading.Thread(target=dashboard.aggregate_metrics_periodically, daemon=True)
+    aggregator_thread.start()
+    print(f"Ingestion server on {args.host}:{args.port} ({PARSE_WORKERS or 'no'} parser processes)", flush=True)
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None, backlog=1024)
@@ -0,0 +1,103 @@
+import json
+import queue
+import threading
+from collections import deque
+
+# --- Live Dashboard Stream (Server-Sent Events) ---
+
+# Snapshots replayed to a dashboard that connects mid-test (5 minutes).
+BACKFILL_WINDOWS = 300
+# Events buffered per viewer before it is considered too slow and resynced.
+SUBSCRIBER_BUFFER = 30
+# Seconds between keep-alive comments on an idle stream.
+KEEPALIVE_INTERVAL = 15
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def snapshot_delta(previous, snapshot):
+    """Fields of `snapshot` that differ from `previous` (test_config only when it changed)."""
+    metrics = {key: value for key, value in snapshot['metrics'].items()
+               if previous is None or previous['metrics'].get(key) != value}
+    delta = {'metrics': metrics}
+    if previous is None or previous['test_config'] != snapshot['test_config']:
+        delta['test_config'] = snapshot['test_config']
+    return delta
+
+
+class SnapshotBroadcaster:
+    """
+    Pushes every aggregate window once to all connected dashboards.
+
+    publish() is called by the aggregator thread; it encodes one compact
+    delta event and puts it on each viewer's bounded queue, so the cost of a
+    window does not depend on how often viewers would otherwise poll. A new
+    viewer first receives a backfill of the recent snapshots. A viewer whose
+    queue overflows is resynced with a fresh backfill instead of blocking
+    the publisher.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=BACKFILL_WINDOWS)
+
+    def _backfill_event(self):
+        snapshots = list(self._history)
+        return sse_event('backfill', {
+            'test_config': snapshots[-1]['test_config'] if snapshots else None,
+            'metrics': [snapshot['metrics'] for snapshot in snapshots],
+        })
+
+    def _offer(self, subscriber, event):
+        try:
+            subscriber.put_nowait(event)
+        except queue.Full:
+            while True:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    break
+            subscriber.put_nowait(self._backfill_event())
+
+    def publish(self, snapshot):
+        with self._lock:
+            previous = self._history[-1] if self._history else None
+            self._history.append(snapshot)
+            event = sse_event('delta', snapshot_delta(previous, snapshot))
+            for subscriber in self._subscribers:
+                self._offer(subscriber, event)
+
+    def reset(self):
+        """Tells viewers that the test state was cleared and drops the backfill."""
+        with self._lock:
+            self._history.clear()
+            event = sse_event('reset', {})
+            for subscriber in self._subscribers:
+                self._offer(subscriber, event)
+
+    def subscribe(self):
+        """Returns a new viewer's event queue, starting with the backfill."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+        with self._lock:
+            subscriber.put_nowait(self._backfill_event())
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self):
+        """Generator of SSE text for one viewer; use as a streaming response body."""
+        subscriber = self.subscribe()
+        try:
+            while True:
+                try:
+                    yield subscriber.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscriber)